@@ -0,0 +1,206 @@
+"""
+Сравнение университетов и агрегированная статистика по каталогу
+
+Все расчеты - группировки pandas над колоночным представлением каталога.
+Результаты запоминаются до смены версии данных, поэтому повторные
+перезапуски страницы не пересчитывают агрегаты. При обновлении каталога
+сравнения, в которых не участвует ни одна измененная запись, сохраняются,
+агрегаты по всему каталогу сбрасываются.
+"""
+
+import inspect
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dataset_versions import ChangeSet, subscribe
+
+
+# Строки таблицы сравнения: поле -> подпись
+COMPARISON_FIELDS = {
+    'city': 'Город',
+    'type': 'Тип',
+    'rating': 'Рейтинг',
+    'founding_year': 'Год основания',
+    'students_count': 'Студентов',
+    'budget_places': 'Бюджетных мест',
+    'specialties': 'Специальности',
+    'features': 'Особенности',
+    'website': 'Сайт',
+}
+
+# Сколько результатов держать на версию данных (наборы id сравнения разные у каждого)
+MEMO_SIZE = 256
+
+_memo: "OrderedDict[Tuple[str, Tuple[Any, ...]], pd.DataFrame]" = OrderedDict()
+_memo_version = None
+_memo_lock = threading.Lock()
+
+# Функция -> номер аргумента university_ids: результат зависит только от этих записей
+_ids_argument: Dict[str, int] = {}
+
+
+@subscribe
+def _carry_memo(changes: ChangeSet):
+    """Переносит на новую версию результаты, не затронутые изменениями"""
+    global _memo_version
+    with _memo_lock:
+        if _memo_version == changes.old_version:
+            changed = {event.university_id for event in changes.events()}
+            for key in list(_memo):
+                name, args = key
+                argument = _ids_argument.get(name)
+                if argument is None or not changed.isdisjoint(args[argument]):
+                    del _memo[key]
+        else:
+            _memo.clear()
+        _memo_version = changes.new_version
+
+
+def memoize_per_version(func):
+    """Запоминает результат функции от версии данных и аргументов
+
+    Функция получает текущий каталог первым аргументом, вызывающий код его
+    не передает. Аргументы приводятся к полному списку с учетом значений по
+    умолчанию, списки - к кортежам. В кэше не больше MEMO_SIZE результатов,
+    вытесняются давно не использованные. Возвращается копия, чтобы изменения
+    у вызывающего кода не портили кэш.
+    """
+    signature = inspect.signature(func)
+    arguments = list(signature.parameters)[1:]
+    if 'university_ids' in arguments:
+        _ids_argument[func.__name__] = arguments.index('university_ids')
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        global _memo_version
+        from universities_data import get_catalog
+
+        bound = signature.bind(None, *args, **kwargs)
+        bound.apply_defaults()
+        args = tuple(tuple(arg) if isinstance(arg, list) else arg
+                     for arg in list(bound.arguments.values())[1:])
+        catalog = get_catalog()
+        key = (func.__name__, args)
+        with _memo_lock:
+            if _memo_version is None or catalog.version > _memo_version:
+                _memo.clear()
+                _memo_version = catalog.version
+            result = _memo.get(key) if _memo_version == catalog.version else None
+            if result is not None:
+                _memo.move_to_end(key)
+        if result is None:
+            result = func(catalog, *args)
+            with _memo_lock:
+                if _memo_version == catalog.version:
+                    _memo[key] = result
+                    while len(_memo) > MEMO_SIZE:
+                        _memo.popitem(last=False)
+        return result.copy()
+
+    return wrapper
+
+
+@memoize_per_version
+def compare_universities(catalog, university_ids: Tuple[str, ...]) -> pd.DataFrame:
+    """Таблица сравнения: строки - показатели, колонки - выбранные университеты"""
+    positions = [catalog.position(university_id) for university_id in university_ids]
+    positions = [position for position in positions if position is not None]
+
+    frame = catalog.columns.frame.iloc[positions]
+    table = frame[list(COMPARISON_FIELDS)].astype(str)
+    table.index = frame['name']
+    table = table.T
+    table.index = [COMPARISON_FIELDS[name] for name in table.index]
+    return table
+
+
+@memoize_per_version
+def comparison_leaders(catalog, university_ids: Tuple[str, ...]) -> pd.DataFrame:
+    """Лидер по каждому числовому показателю среди выбранных университетов"""
+    positions = [catalog.position(university_id) for university_id in university_ids]
+    positions = [position for position in positions if position is not None]
+    frame = catalog.columns.frame.iloc[positions]
+    if frame.empty:
+        return pd.DataFrame(columns=['Показатель', 'Лидер', 'Значение'])
+
+    numeric = ['rating', 'students_count', 'budget_places']
+    best = frame[numeric].to_numpy().argmax(axis=0)
+    oldest = int(frame['founding_year'].to_numpy().argmin())
+    # Значения приводятся к строке по отдельности: в общей колонке целые
+    # показатели иначе превратились бы в float ("20000.0")
+    rows = [(COMPARISON_FIELDS[name], frame['name'].iloc[i], str(frame[name].iloc[i]))
+            for name, i in zip(numeric, best)]
+    rows.append(('Самый старый', frame['name'].iloc[oldest], str(frame['founding_year'].iloc[oldest])))
+    return pd.DataFrame(rows, columns=['Показатель', 'Лидер', 'Значение'])
+
+
+@memoize_per_version
+def common_specialties(catalog, university_ids: Tuple[str, ...]) -> pd.DataFrame:
+    """Специальности с числом выбранных университетов, где они есть"""
+    positions = [catalog.position(university_id) for university_id in university_ids]
+    table = catalog.columns.specialties
+    selected = table[table['position'].isin([p for p in positions if p is not None])]
+    counts = selected.groupby('specialty', observed=True).size()
+    return (counts.rename('universities').sort_values(ascending=False)
+            .reset_index())
+
+
+@memoize_per_version
+def stats_by_city(catalog) -> pd.DataFrame:
+    """Число университетов, средний рейтинг, студенты и бюджетные места по городам"""
+    frame = catalog.columns.frame
+    return (frame.groupby('city', observed=True)
+            .agg(universities=('id', 'size'), avg_rating=('rating', 'mean'),
+                 students=('students_count', 'sum'), budget_places=('budget_places', 'sum'))
+            .sort_values(['avg_rating', 'universities'], ascending=False)
+            .reset_index())
+
+
+@memoize_per_version
+def stats_by_type(catalog) -> pd.DataFrame:
+    """Те же показатели по типам университетов"""
+    frame = catalog.columns.frame
+    return (frame.groupby('type', observed=True)
+            .agg(universities=('id', 'size'), avg_rating=('rating', 'mean'),
+                 students=('students_count', 'sum'), budget_places=('budget_places', 'sum'),
+                 oldest_year=('founding_year', 'min'))
+            .sort_values('universities', ascending=False)
+            .reset_index())
+
+
+@memoize_per_version
+def budget_places_by_specialty(catalog) -> pd.DataFrame:
+    """Бюджетные места университетов, где есть специальность, и их средний рейтинг
+
+    Места в каталоге указаны на университет целиком, поэтому это суммарная
+    емкость вузов с этой специальностью, а не места на саму специальность.
+    """
+    columns = catalog.columns
+    table = columns.specialties
+    positions = table['position'].to_numpy()
+    exploded = pd.DataFrame({
+        'specialty': table['specialty'],
+        'budget_places': columns.budget_places[positions],
+        'rating': columns.rating[positions],
+    })
+    return (exploded.groupby('specialty', observed=True)
+            .agg(universities=('budget_places', 'size'), budget_places=('budget_places', 'sum'),
+                 avg_rating=('rating', 'mean'))
+            .sort_values('budget_places', ascending=False)
+            .reset_index())
+
+
+@memoize_per_version
+def oldest_by_type(catalog, n: int = 1) -> pd.DataFrame:
+    """n самых старых университетов каждого типа"""
+    frame = catalog.columns.frame
+    order = np.lexsort((np.arange(len(frame)), frame['founding_year'].to_numpy()))
+    return (frame.iloc[order].groupby('type', observed=True).head(n)
+            [['type', 'name', 'city', 'founding_year']]
+            .sort_values(['type', 'founding_year'])
+            .reset_index(drop=True))
@@ -0,0 +1,399 @@
+"""
+HTTP API каталога университетов для внешних сервисов (без Streamlit)
+
+Асинхронный сервер на aiohttp. Каждый процесс-обработчик держит свой каталог
+и индексы в памяти (строятся при запуске), процессы принимают соединения с
+одного общего сокета. С UNIVERSITIES_SHARED=1 процессы вместо этого
+подключаются к общему каталогу в памяти хоста (shared_catalog.py). Ответы - JSON; ETag - отпечаток содержимого каталога,
+одинаковый во всех процессах, поэтому If-None-Match отдает 304 без
+повторного поиска, пока данные не изменились.
+
+Цикл событий не выполняет тяжелой работы: новую версию данных проверяет и
+готовит (индексы, ETag) фоновая задача в пуле потоков, обработчики берут
+готовый снимок, а фильтрация и сборка ответа поиска тоже идут в пуле.
+
+    GET /universities/{id}                  - запись по id
+    GET /universities?query=&city=&type=&rating_min=&rating_max=&specialties=IT,Физика
+                     &match_all=1&sort_by=rating&descending=1&limit=20&offset=0
+    GET /search/semantic?q=&k=10            - поиск по смыслу
+    GET /health                             - версия данных и готовность модели
+
+Запуск: python api.py --port 8080 --workers 4
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from aiohttp import web
+
+from catalog_store import RELOAD_CHECK_INTERVAL
+from columnar import COLUMNS
+from dataset_versions import ChangeSet, subscribe
+from filters import SORT_FIELDS, UniversityFilter, filter_mask, rank_positions
+
+if TYPE_CHECKING:
+    from catalog import UniversityCatalog
+    from universities_data import University
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 1000
+SEMANTIC_MAX_K = 100
+
+JSON_TYPE = "application/json"
+
+
+def university_json(university: "University") -> Dict[str, Any]:
+    """Запись для API: все поля, списки остаются списками"""
+    data = {column: getattr(university, column) for column in COLUMNS}
+    data['specialties'] = list(university.specialties)
+    data['features'] = list(university.features)
+    return data
+
+
+def dataset_fingerprint(catalog: "UniversityCatalog") -> str:
+    """Отпечаток содержимого каталога; не зависит от процесса и порядка загрузки"""
+    shared = getattr(catalog, "fingerprint", None)
+    if shared is not None:
+        # Общий каталог (shared_catalog.py): отпечаток посчитан при публикации
+        return shared
+    hashes = pd.util.hash_pandas_object(catalog.columns.frame, index=False).to_numpy()
+    return hashlib.sha1(hashes.tobytes()).hexdigest()[:16]
+
+
+class CatalogSnapshot:
+    """Данные ответов для одной версии каталога: ETag и готовый JSON записей"""
+
+    def __init__(self, catalog: "UniversityCatalog", previous: Optional["CatalogSnapshot"] = None):
+        self.catalog = catalog
+        self.version = catalog.version
+        self.etag = f'"{dataset_fingerprint(catalog)}"'
+        self._records: Dict[int, bytes] = {}  # позиция -> JSON записи
+
+        changes = catalog.changes
+        if previous is not None and changes is not None and changes.old_version == previous.version:
+            # JSON неизмененных записей переносим из прошлой версии на новые позиции
+            cached = previous._records.copy()
+            positions = np.fromiter(cached, dtype=np.int64, count=len(cached))
+            kept = positions[~changes.stale[positions]]
+            self._records = dict(zip(changes.position_map[kept].tolist(),
+                                     (cached[position] for position in kept.tolist())))
+
+    def record(self, position: int) -> bytes:
+        encoded = self._records.get(position)
+        if encoded is None:
+            encoded = json.dumps(university_json(self.catalog.universities[position]),
+                                 ensure_ascii=False).encode("utf-8")
+            self._records[position] = encoded
+        return encoded
+
+    def records(self, positions: Sequence[int]) -> bytes:
+        return b"[" + b",".join(self.record(position) for position in positions) + b"]"
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+
+def _prepare(catalog: "UniversityCatalog"):
+    """Строит индексы каталога заранее, чтобы запросы их не ждали"""
+    catalog.search_index
+    catalog.columns
+    catalog.get("")  # словари по id
+
+
+def get_snapshot() -> CatalogSnapshot:
+    """Снимок текущей версии каталога; пересоздается при смене версии
+
+    Может перечитать данные и обновить индексы, поэтому в обработчиках не
+    вызывается: его выполняет фоновая задача _refresh_snapshots.
+    """
+    global _snapshot
+    from universities_data import get_catalog
+
+    catalog = get_catalog()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != catalog.version:
+        with _snapshot_lock:
+            if _snapshot is None or _snapshot.version != catalog.version:
+                # Новый снимок становится виден запросам уже с готовыми индексами
+                _prepare(catalog)
+                _snapshot = CatalogSnapshot(catalog, _snapshot)
+            snapshot = _snapshot
+    return snapshot
+
+
+@subscribe
+def _publish_changes(changes: ChangeSet):
+    """Публикует снимок новой версии сразу после обновления каталога
+
+    Вызывается в потоке, обновившем каталог (фоновая задача или пул), а не в
+    цикле событий. JSON неизмененных записей переносится по changes.
+    """
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == changes.old_version:
+        get_snapshot()
+
+
+def current_snapshot() -> CatalogSnapshot:
+    """Последний подготовленный снимок, без проверки данных"""
+    snapshot = _snapshot
+    return snapshot if snapshot is not None else get_snapshot()
+
+
+def error_response(status: int, message: str, **headers: str) -> web.Response:
+    return web.Response(status=status, content_type=JSON_TYPE, headers=headers,
+                        text=json.dumps({"error": message}, ensure_ascii=False))
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Есть ли etag в списке If-None-Match (через запятую; "*" и слабые W/ тоже совпадают)"""
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def conditional(handler: Callable) -> Callable:
+    """ETag по версии данных: при совпадении If-None-Match ответ 304 без тела"""
+    async def wrapper(request: web.Request) -> web.StreamResponse:
+        snapshot = current_snapshot()
+        if etag_matches(request.headers.get("If-None-Match", ""), snapshot.etag):
+            return web.Response(status=304, headers={"ETag": snapshot.etag})
+        response = await handler(request, snapshot)
+        if response.status == 200:
+            response.headers["ETag"] = snapshot.etag
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    return wrapper
+
+
+def _json_body(*parts: bytes) -> web.Response:
+    return web.Response(body=b"".join(parts), content_type=JSON_TYPE, charset="utf-8")
+
+
+@conditional
+async def get_university(request: web.Request, snapshot: CatalogSnapshot) -> web.Response:
+    position = snapshot.catalog.position(request.match_info["university_id"])
+    if position is None:
+        return error_response(404, "Университет не найден")
+    return _json_body(snapshot.record(position))
+
+
+def _bound(query, key: str) -> Optional[float]:
+    value = query.get(key)
+    if not value:
+        return None
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"{key}: нужно конечное число")
+    return number
+
+
+def _range(query, name: str):
+    low, high = query.get(f"{name}_min"), query.get(f"{name}_max")
+    if low is None and high is None:
+        return None
+    return (_bound(query, f"{name}_min"), _bound(query, f"{name}_max"))
+
+
+def parse_filter(query) -> UniversityFilter:
+    """Критерии поиска из параметров запроса; ValueError при неверных значениях"""
+    sort_by = query.get("sort_by") or None
+    if sort_by is not None and sort_by not in SORT_FIELDS:
+        raise ValueError(f"sort_by: одно из {', '.join(SORT_FIELDS)}")
+    specialties = [item.strip() for value in query.getall("specialties", [])
+                   for item in value.split(",") if item.strip()]
+    return UniversityFilter(
+        query=query.get("query", ""),
+        city=query.get("city", ""),
+        uni_type=query.get("type", ""),
+        rating=_range(query, "rating"),
+        founding_year=_range(query, "founding_year"),
+        students_count=_range(query, "students_count"),
+        budget_places=_range(query, "budget_places"),
+        specialties=specialties,
+        match_all_specialties=query.get("match_all", "0") in ("1", "true"),
+        sort_by=sort_by,
+        descending=query.get("descending", "1") in ("1", "true"),
+    )
+
+
+def _page(query) -> tuple:
+    limit = int(query.get("limit", DEFAULT_LIMIT))
+    offset = int(query.get("offset", 0))
+    if not 0 <= limit <= MAX_LIMIT or offset < 0:
+        raise ValueError(f"limit: от 0 до {MAX_LIMIT}, offset: не меньше 0")
+    return limit, offset
+
+
+@conditional
+async def search(request: web.Request, snapshot: CatalogSnapshot) -> web.Response:
+    try:
+        criteria = parse_filter(request.query)
+        limit, offset = _page(request.query)
+    except ValueError as error:
+        return error_response(400, f"Неверный параметр: {error}")
+
+    loop = asyncio.get_running_loop()
+    body = await loop.run_in_executor(None, _search_page, snapshot, criteria, limit, offset)
+    return _json_body(body)
+
+
+def _search_page(snapshot: CatalogSnapshot, criteria: UniversityFilter, limit: int,
+                 offset: int) -> bytes:
+    """Тело ответа поиска; выполняется в пуле потоков"""
+    catalog = snapshot.catalog
+    positions = np.flatnonzero(filter_mask(catalog, criteria))
+    total = len(positions)
+    if criteria.sort_by:
+        positions = rank_positions(catalog, positions, criteria.sort_by, criteria.descending,
+                                   offset + limit)
+    page = positions[offset:offset + limit].tolist()
+    return b"".join((f'{{"total":{total},"offset":{offset},"items":'.encode(),
+                     snapshot.records(page), b"}"))
+
+
+@conditional
+async def semantic(request: web.Request, snapshot: CatalogSnapshot) -> web.Response:
+    from resources import FAILED, READY, get_semantic_index, semantic_index_resource
+
+    query = request.query.get("q", "").strip()
+    try:
+        k = int(request.query.get("k", 10))
+    except ValueError:
+        k = 0
+    if not query or not 1 <= k <= SEMANTIC_MAX_K:
+        return error_response(400, f"Нужны параметры q и k (от 1 до {SEMANTIC_MAX_K})")
+
+    if semantic_index_resource.state == FAILED:
+        return error_response(503, "Семантический поиск недоступен")
+    if semantic_index_resource.state != READY:
+        # Модель грузится в фоне, запрос не ждет загрузки
+        semantic_index_resource.start_background()
+        return error_response(503, "Семантический поиск еще загружается", **{"Retry-After": "5"})
+
+    # Кодирование запроса моделью - тяжелая операция, выполняется вне цикла событий
+    loop = asyncio.get_running_loop()
+    found = await loop.run_in_executor(None, lambda: get_semantic_index().search(query, k))
+    positions = [(snapshot.catalog.position(uni.id), score) for uni, score in found]
+    items = [b'{"score":%.4f,"university":%s}' % (score, snapshot.record(position))
+             for position, score in positions if position is not None]
+    return _json_body(b'{"items":[', b",".join(items), b"]}")
+
+
+async def health(request: web.Request) -> web.Response:
+    from resources import warmup_status
+
+    snapshot = current_snapshot()
+    return web.json_response({
+        "status": "ok",
+        "pid": os.getpid(),
+        "dataset_version": snapshot.version,
+        "etag": snapshot.etag,
+        "universities": len(snapshot.catalog),
+        "semantic": warmup_status()["state"],
+    })
+
+
+async def _warm_up(app: web.Application):
+    """Строит каталог и индексы процесса до приема запросов"""
+    get_snapshot()
+
+
+async def _refresh_snapshots():
+    """Проверяет данные раз в RELOAD_CHECK_INTERVAL и готовит снимок новой версии в потоке"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(RELOAD_CHECK_INTERVAL)
+        try:
+            await loop.run_in_executor(None, get_snapshot)
+        except Exception:
+            logger.exception("Не удалось обновить каталог, отдается прежняя версия")
+
+
+async def _snapshot_refresher(app: web.Application):
+    task = asyncio.create_task(_refresh_snapshots())
+    yield
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get("/universities/{university_id}", get_university)
+    app.router.add_get("/universities", search)
+    app.router.add_get("/search/semantic", semantic)
+    app.router.add_get("/health", health)
+    app.on_startup.append(_warm_up)
+    app.cleanup_ctx.append(_snapshot_refresher)
+    return app
+
+
+def _run_worker(sock: socket.socket):
+    web.run_app(create_app(), sock=sock, print=None, handle_signals=True)
+
+
+def serve(host: str = "127.0.0.1", port: int = 8080, workers: int = 1):
+    """Запускает workers процессов, принимающих соединения с одного сокета"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+    print(f"API: http://{host}:{port}, процессов: {workers}")
+
+    if workers <= 1:
+        _run_worker(sock)
+        return
+
+    context = multiprocessing.get_context("fork")
+    processes: List[multiprocessing.Process] = [
+        context.Process(target=_run_worker, args=(sock,), name=f"api-worker-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    # SIGTERM главному процессу останавливает и обработчики
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for process in processes:
+            process.join()
+    except (KeyboardInterrupt, SystemExit):
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API каталога университетов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="число процессов-обработчиков")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Бенчмарк обновления каталога по изменениям против полной пересборки
+
+Каталог с построенными словарями, колонками и поисковым индексом получает
+новую версию, где изменено k записей, и обновляется через
+UniversityCatalog.apply. Время раскладывается на этапы: снимок (хэши всех
+записей), сравнение версий, словари, поисковый индекс, колонки. Для каждого k
+результат сверяется с каталогом, собранным с нуля.
+
+Линейными по размеру каталога остаются снимок (хэшируется каждая запись,
+иначе не обнаружить правку "на месте") и копирование массивов новой версии.
+Поэтому проверяются две границы, и при нарушении любой бенчмарк завершается
+с кодом 1:
+    - обновление без изменений (k = 0) не дороже --max-fixed от полной сборки;
+    - наклон прямой "время от k" не больше --max-per-change от цены одной
+      записи при полной сборке.
+
+Запуск: python benchmarks/bench_incremental.py --size 20000 --changes 0 1 10 100 1000
+"""
+
+import argparse
+import dataclasses
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from catalog import UniversityCatalog, build_maps, next_maps  # noqa: E402
+from dataset_versions import DatasetSnapshot, diff_snapshots  # noqa: E402
+from synthetic import make_universities  # noqa: E402
+
+QUERIES = ["университет", "мед", "алматы", "информационные технологии", "ит", "обновлено"]
+
+STAGES = ("snapshot", "diff", "maps", "index", "columns")
+
+
+def edit(universities: List, count: int, seed: int) -> List:
+    """Новая версия списка: count записей изменено, добавлено или удалено (8:1:1)"""
+    rng = random.Random(seed)
+    edited = list(universities)
+    removed = count // 10
+    added = count // 10
+    for position in rng.sample(range(len(edited)), count - removed - added):
+        uni = edited[position]
+        edited[position] = dataclasses.replace(
+            uni, name=f"{uni.name} (обновлено)", rating=round(rng.uniform(5, 10), 1),
+            specialties=list(uni.specialties[1:]) + ["Новая специальность"])
+    for position in sorted(rng.sample(range(len(edited)), removed), reverse=True):
+        del edited[position]
+    edited += [dataclasses.replace(uni, id=f"added_{seed}_{i}")
+               for i, uni in enumerate(make_universities(added, seed=seed + 1))]
+    return edited
+
+
+def same_results(updated: UniversityCatalog, rebuilt: UniversityCatalog) -> bool:
+    """Словари, индекс и колонки после обновления совпадают с собранными с нуля"""
+    if updated.maps != build_maps(rebuilt.universities):
+        return False
+    if any(updated.search_index.search_positions(query) != rebuilt.search_index.search_positions(query)
+           for query in QUERIES):
+        return False
+    return all(getattr(updated.columns, name).equals(getattr(rebuilt.columns, name))
+               for name in ("frame", "specialties", "features"))
+
+
+def measure(catalog: UniversityCatalog, universities: List, repeat: int) -> Dict[str, float]:
+    """Лучшее время этапов обновления в миллисекундах"""
+    best: Dict[str, float] = {}
+    for _ in range(repeat):
+        timings = {}
+        start = time.perf_counter()
+        snapshot = DatasetSnapshot(universities, catalog.version + 1)
+        timings["snapshot"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        changes = diff_snapshots(catalog.snapshot, snapshot)
+        timings["diff"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if next_maps(catalog.maps, universities, changes) is None:
+            # Позиции сдвинулись: словари строятся заново при первом обращении
+            build_maps(universities)
+        timings["maps"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        catalog.search_index.apply(universities, changes)
+        timings["index"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        catalog.columns.apply(universities, changes)
+        timings["columns"] = time.perf_counter() - start
+
+        timings["total"] = sum(timings.values())
+        for name, seconds in timings.items():
+            best[name] = min(best.get(name, float("inf")), seconds * 1000)
+    return best
+
+
+def check(counts: List[int], totals: List[float], full_ms: float, size: int,
+          max_fixed: float, max_per_change: float) -> bool:
+    """Печатает аппроксимацию времени от числа изменений; True, если границы соблюдены"""
+    ok = True
+    per_record_ms = full_ms / size
+    if 0 in counts:
+        fixed = totals[counts.index(0)]
+        worse = fixed > max_fixed * full_ms
+        ok = ok and not worse
+        print(f"\nБез изменений: {fixed:.1f} мс, {fixed / full_ms:.2%} полной сборки "
+              f"(граница {max_fixed:.1%}, {fixed * 1000 / size:.2f} мкс на запись каталога)"
+              f"{'  <- регрессия' if worse else ''}")
+    if len(set(counts)) > 1:
+        slope, intercept = np.polyfit(counts, totals, 1)
+        worse = slope > max_per_change * per_record_ms
+        ok = ok and not worse
+        print(f"Время ~ {intercept:.1f} мс + {slope * 1000:.0f} мкс на измененную запись "
+              f"(полная сборка: {per_record_ms * 1000:.0f} мкс на запись, граница "
+              f"x{max_per_change}){'  <- регрессия' if worse else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--changes", type=int, nargs="+", default=[0, 1, 10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-fixed", type=float, default=0.03,
+                        help="доля полной сборки, которую может занять обновление без изменений")
+    parser.add_argument("--max-per-change", type=float, default=1.5,
+                        help="во сколько раз измененная запись может быть дороже записи "
+                             "при полной сборке")
+    args = parser.parse_args()
+
+    universities = make_universities(args.size)
+    start = time.perf_counter()
+    catalog = UniversityCatalog(universities, 1)
+    catalog.maps
+    catalog.search_index
+    catalog.columns
+    full_ms = (time.perf_counter() - start) * 1000
+
+    print(f"Каталог: {args.size} записей, полная сборка: {full_ms:.0f} мс\n")
+    print(f"{'изменений':>10}{'снимок':>9}{'сравнение':>11}{'словари':>9}{'индекс':>9}"
+          f"{'колонки':>9}{'всего, мс':>11}{'быстрее':>9}  совпадает")
+    ok = True
+    counts, totals = [], []
+    for count in args.changes:
+        edited = edit(universities, count, seed=count)
+        timings = measure(catalog, edited, args.repeat)
+        updated = catalog.apply(edited, 2)
+        matches = same_results(updated, UniversityCatalog(edited, 2))
+        ok = ok and matches
+        counts.append(len(updated.changes))
+        totals.append(timings["total"])
+        print(f"{len(updated.changes):>10}"
+              + "".join(f"{timings[stage]:>{width}.1f}"
+                        for stage, width in zip(STAGES, (9, 11, 9, 9, 9)))
+              + f"{timings['total']:>11.1f}{full_ms / timings['total']:>8.0f}x"
+              f"  {'да' if matches else 'НЕТ'}")
+
+    ok = check(counts, totals, full_ms, args.size, args.max_fixed, args.max_per_change) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Бенчмарк памяти: University (dataclass) против CompactUniversity (__slots__)
+
+Запуск: python benchmarks/bench_memory.py --sizes 10000 100000
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compact_records import CompactUniversity  # noqa: E402
+from universities_data import UNIVERSITIES, University  # noqa: E402
+
+
+def _fresh(text: str) -> str:
+    """Новый объект строки, как при чтении из файла (без общего объекта)"""
+    return text.encode("utf-8").decode("utf-8")
+
+
+def make_records(size: int, factory: Callable, seed: int = 0) -> List:
+    """Создает size записей с уникальными именами и повторяющимися категориями"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(size):
+        base = UNIVERSITIES[i % len(UNIVERSITIES)]
+        donor = rng.choice(UNIVERSITIES)
+        records.append(factory(
+            id=f"{base.id}_{i}",
+            name=f"{base.name} (программа {i})",
+            name_eng=f"{base.name_eng} (program {i})",
+            city=_fresh(donor.city),
+            description=_fresh(base.description),
+            type=_fresh(donor.type),
+            rating=round(rng.uniform(5, 10), 1),
+            founding_year=rng.randint(1920, 2020),
+            students_count=rng.randint(500, 30000),
+            budget_places=rng.randint(50, 5000),
+            contact_email=f"info{i}@{base.id}.kz",
+            website=f"https://{base.id}.kz/{i}",
+            address=_fresh(base.address),
+            phone=_fresh(base.phone),
+            specialties=[_fresh(item) for item in base.specialties],
+            photo_filename=f"{base.id}.jpg",
+            features=[_fresh(item) for item in donor.features],
+        ))
+    return records
+
+
+def measure(size: int, factory: Callable) -> int:
+    """Память, занятая списком записей, в байтах"""
+    gc.collect()
+    tracemalloc.start()
+    records = make_records(size, factory)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'записей':>10}{'University, МБ':>18}{'Compact, МБ':>16}{'экономия':>12}")
+    for size in args.sizes:
+        regular = measure(size, University)
+        compact = measure(size, CompactUniversity)
+        print(f"{size:>10}{regular / 2**20:>18.1f}{compact / 2**20:>16.1f}"
+              f"{1 - compact / regular:>11.0%}")
+
+
+if __name__ == "__main__":
+    main()
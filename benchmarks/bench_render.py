@@ -0,0 +1,63 @@
+"""
+Бенчмарк отрисовки результатов: все карточки сразу против постраничного списка
+
+Время перезапуска скрипта Streamlit измеряется через AppTest.
+Запуск: python benchmarks/bench_render.py --counts 10 100 500
+"""
+
+import argparse
+import os
+import time
+
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = f"""
+import sys
+sys.path.insert(0, {ROOT!r})
+sys.path.insert(0, {os.path.join(ROOT, "benchmarks")!r})
+
+import streamlit as st
+from bench_search import make_catalog
+from utils import display_university_card, display_university_list
+
+results = make_catalog({{count}})
+if "{{mode}}" == "all":
+    for university in results:
+        display_university_card(university)
+        st.divider()
+else:
+    display_university_list(results)
+"""
+
+
+def rerun_time(count: int, mode: str, repeat: int) -> float:
+    """Лучшее время перезапуска скрипта в миллисекундах"""
+    app = AppTest.from_string(SCRIPT.format(count=count, mode=mode), default_timeout=600)
+    app.run()  # первый запуск прогревает импорты и кэши
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        app.run()
+        best = min(best, time.perf_counter() - start)
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'результатов':>12}{'все карточки, мс':>20}{'постранично, мс':>20}")
+    for count in args.counts:
+        full = rerun_time(count, "all", args.repeat)
+        paged = rerun_time(count, "paged", args.repeat)
+        print(f"{count:>12}{full:>20.0f}{paged:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Бенчмарк памяти процессов: своя копия каталога против общего сегмента
+
+Запускается N процессов, каждый загружает каталог (локально или подключаясь
+к сегменту shared_catalog.py) и выполняет одинаковую нагрузку, как у api.py:
+поиск и фильтры со страницей результатов, записи по id, сводные таблицы.
+Когда все процессы готовы, у каждого снимается /proc/<pid>/smaps_rollup:
+    RSS  - резидентная память процесса, включая отображенные общие страницы
+    USS  - только собственные страницы процесса
+    PSS  - общие страницы поделены между процессами; сумма PSS - реальный
+           расход памяти хоста
+
+Запуск: python benchmarks/bench_shared.py --size 100000 --workers 1 2 4 8
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+QUERIES = ["университет", "мед", "информационные технологии", "алматы", "инженер"]
+
+PAGE_SIZE = 20
+
+
+def smaps_rollup() -> Dict[str, int]:
+    """RSS, USS и PSS текущего процесса в байтах"""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return {
+        "rss": values["Rss"],
+        "uss": values["Private_Clean"] + values["Private_Dirty"],
+        "pss": values["Pss"],
+    }
+
+
+def _workload():
+    import analytics
+    import universities_data
+    from filters import UniversityFilter, filter_positions
+
+    catalog = universities_data.get_catalog()
+    for query in QUERIES:
+        positions = filter_positions(catalog, UniversityFilter(query=query))
+        catalog.records(positions[:PAGE_SIZE].tolist())
+    positions = filter_positions(catalog, UniversityFilter(
+        city="Алматы", specialties=["IT"], rating=(7, None), sort_by="rating", limit=PAGE_SIZE))
+    catalog.records(positions.tolist())
+    for position in range(0, len(catalog), max(1, len(catalog) // 1000)):
+        universities_data.get_university_by_id(f"uni_{position}")
+    analytics.stats_by_city()
+    analytics.budget_places_by_specialty()
+
+
+def _worker(barrier, results):
+    try:
+        _workload()
+        measured = smaps_rollup()
+    except BaseException as error:
+        measured = error
+    barrier.wait()  # снимаем память, когда живы все процессы
+    results.put(measured)
+    barrier.wait()
+
+
+def run(workers: int) -> List[Dict[str, int]]:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    barrier.wait()
+    measured = [results.get() for _ in range(workers)]
+    barrier.wait()
+    for process in processes:
+        process.join()
+    for item in measured:
+        if isinstance(item, BaseException):
+            raise RuntimeError("Процесс нагрузки завершился с ошибкой") from item
+    return measured
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=100000, help="записей в синтетическом каталоге")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    from catalog_store import write_catalog
+    from synthetic import make_universities
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "universities.arrow")
+        write_catalog(make_universities(args.size), path)
+        os.environ.update(UNIVERSITIES_DATA_PATH=path, AI_WARMUP="0",
+                          SHARED_CATALOG_DIR=os.path.join(tmp, "shared"))
+
+        print(f"Каталог: {args.size} записей, память в МБ на процесс (RSS / USS) "
+              f"и всего по PSS\n")
+        print(f"{'режим':>8}{'процессов':>11}{'RSS':>9}{'USS':>9}{'PSS всего':>12}")
+        for mode in ("local", "shared"):
+            os.environ["UNIVERSITIES_SHARED"] = "1" if mode == "shared" else "0"
+            if mode == "shared":
+                # Сегмент публикует отдельный загрузчик; в нагрузку не входит
+                import shared_catalog
+                from catalog_store import CatalogFile
+                from universities_data import University
+                shared_catalog.publish(CatalogFile(path, University).load(),
+                                       os.environ["SHARED_CATALOG_DIR"])
+            for workers in args.workers:
+                measured = run(workers)
+                rss = sum(item["rss"] for item in measured) / workers / 2**20
+                uss = sum(item["uss"] for item in measured) / workers / 2**20
+                pss = sum(item["pss"] for item in measured) / 2**20
+                print(f"{mode:>8}{workers:>11}{rss:>9.0f}{uss:>9.0f}{pss:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Набор бенчмарков поиска и отрисовки на синтетических каталогах
+
+Для каждого размера каталога измеряются задержки search_universities,
+search_universities_advanced, get_university_by_id, get_universities_dataframe
+и отрисовки страницы карточек (через AppTest): p50/p95/p99 в миллисекундах,
+время прогрева индексов и память процесса. Каждый размер измеряется в
+отдельном процессе: каталог и индексы строятся с нуля, а не обновляются по
+изменениям от прошлого размера, и память не включает прошлые каталоги.
+Результаты сохраняются в JSON; с --compare печатается сравнение с прошлым
+запуском.
+
+Запуск: python benchmarks/bench_suite.py --sizes 100 10000 100000
+        python benchmarks/bench_suite.py --compare benchmarks/results/<коммит>.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+# До импорта utils: resources читает AI_WARMUP при импорте, а фоновая загрузка
+# модели исказила бы замеры
+os.environ.setdefault("AI_WARMUP", "0")
+
+import universities_data  # noqa: E402
+from synthetic import make_universities  # noqa: E402
+from utils import search_universities_advanced  # noqa: E402
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+QUERIES = ["IT", "мед", "Алматы", "университет", "Қарағанды", "атындағы", "нефтегаз",
+           "Кибербезопасность", "xyz"]
+
+# Наборы параметров расширенного поиска
+ADVANCED_CASES: List[Dict[str, Any]] = [
+    {"query": "", "city": "Алматы"},
+    {"query": "университет", "uni_type": "технический", "rating": (7.0, 10.0)},
+    {"query": "", "specialties": ["IT", "Математика"], "sort_by": "rating", "limit": 20},
+    {"query": "мед", "city": "Шымкент", "budget_places": (500, 6000), "sort_by": "founding_year"},
+    {"query": "", "students_count": (1000, 5000), "founding_year": (1990, 2020), "limit": 50},
+    {"query": "Қарағанды", "specialties": ["Экономика", "Финансы"], "match_all_specialties": True},
+]
+
+RENDER_SCRIPT = f"""
+import sys
+sys.path.insert(0, {ROOT!r})
+
+from universities_data import get_all_universities
+from utils import display_university_list
+
+display_university_list(get_all_universities()[:{{count}}], key="bench")
+"""
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Сводка задержек в миллисекундах"""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "n": int(len(values)),
+        "mean_ms": round(float(values.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(values.max()), 4),
+    }
+
+
+def measure(calls: List[Callable[[], Any]], iterations: int, budget: float) -> Dict[str, float]:
+    """Вызывает функции по кругу iterations раз или пока не истечет budget секунд"""
+    samples = []
+    deadline = time.perf_counter() + budget
+    for i in range(iterations):
+        call = calls[i % len(calls)]
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+        if time.perf_counter() > deadline and len(samples) >= len(calls):
+            break
+    return percentiles(samples)
+
+
+def rss_mb() -> Optional[float]:
+    """Текущая резидентная память процесса (только Linux)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+
+
+def peak_rss_mb() -> float:
+    """Пиковая резидентная память процесса"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+
+def render_samples(count: int, iterations: int) -> Dict[str, float]:
+    """Задержка перезапуска страницы с count карточками через AppTest"""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_string(RENDER_SCRIPT.format(count=count), default_timeout=600)
+    app.run()  # прогрев импортов и кэша разметки карточек
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        app.run()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def bench_size(size: int, args) -> Dict[str, Any]:
+    """Все измерения для каталога одного размера"""
+    rng = random.Random(args.seed)
+    result: Dict[str, Any] = {"size": size}
+
+    gc.collect()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    catalog = make_universities(size, seed=args.seed)
+    result["generate_s"] = round(time.perf_counter() - start, 3)
+
+    universities_data.set_universities(catalog)
+    rss_records = rss_mb()
+
+    # Первый вызов каждой функции строит соответствующий индекс
+    warmup = {}
+    for name, call in [
+        ("catalog", universities_data.get_catalog),
+        # Индекс строится в фоне с момента создания каталога; ждем его готовности,
+        # иначе первые замеры поиска попали бы на линейный проход
+        ("search_index", lambda: universities_data.get_catalog().search_index),
+        ("columns", universities_data.get_universities_dataframe),
+    ]:
+        start = time.perf_counter()
+        call()
+        warmup[name] = round((time.perf_counter() - start) * 1000, 2)
+    result["warmup_ms"] = warmup
+
+    ids = [uni.id for uni in rng.sample(catalog, k=min(size, 1000))] + ["missing_id"]
+    operations = {
+        "search_universities": measure(
+            [lambda q=q: universities_data.search_universities(q) for q in QUERIES],
+            args.iterations, args.budget),
+        "search_universities_advanced": measure(
+            [lambda case=case: search_universities_advanced(**case) for case in ADVANCED_CASES],
+            args.iterations, args.budget),
+        "get_university_by_id": measure(
+            [lambda i=i: universities_data.get_university_by_id(i) for i in ids],
+            max(args.iterations, len(ids)), args.budget),
+        "get_universities_dataframe": measure(
+            [universities_data.get_universities_dataframe], args.iterations, args.budget),
+    }
+    if not args.skip_render:
+        operations["render_cards"] = render_samples(args.render_count, args.render_iterations)
+    result["operations"] = operations
+
+    rss_after = rss_mb()
+    result["memory_mb"] = {
+        "records": round(rss_records - rss_before, 1) if rss_before is not None else None,
+        "indexes": round(rss_after - rss_records, 1) if rss_after is not None else None,
+        "rss": rss_after,
+        "peak_rss": peak_rss_mb(),
+    }
+    return result
+
+
+def bench_size_isolated(size: int) -> Dict[str, Any]:
+    """bench_size в отдельном процессе с теми же параметрами"""
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "result.json")
+        subprocess.run([sys.executable, os.path.abspath(__file__), *sys.argv[1:],
+                        "--sizes", str(size), "--worker-output", output], check=True)
+        with open(output, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(report: Dict[str, Any]):
+    for result in report["results"]:
+        memory = result["memory_mb"]
+        print(f"\nКаталог: {result['size']} записей, генерация {result['generate_s']} с, "
+              f"прогрев {result['warmup_ms']} мс, память {memory} МБ")
+        print(f"{'операция':<32}{'n':>6}{'p50, мс':>11}{'p95, мс':>11}{'p99, мс':>11}")
+        for name, stats in result["operations"].items():
+            print(f"{name:<32}{stats['n']:>6}{stats['p50_ms']:>11.3f}"
+                  f"{stats['p95_ms']:>11.3f}{stats['p99_ms']:>11.3f}")
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """Печатает изменения p50/p95 относительно baseline; True, если нет регрессий"""
+    base = {(r["size"], name): stats for r in baseline["results"]
+            for name, stats in r["operations"].items()}
+    ok = True
+    print(f"\nСравнение с {baseline['meta'].get('commit')} (допуск x{tolerance}):")
+    print(f"{'размер':>8}  {'операция':<32}{'p50':>10}{'p95':>10}")
+    for result in report["results"]:
+        for name, stats in result["operations"].items():
+            old = base.get((result["size"], name))
+            if old is None:
+                continue
+            ratios = [stats[key] / max(old[key], 1e-9) for key in ("p50_ms", "p95_ms")]
+            worse = any(ratio > tolerance for ratio in ratios)
+            ok = ok and not worse
+            print(f"{result['size']:>8}  {name:<32}{ratios[0]:>9.2f}x{ratios[1]:>9.2f}x"
+                  f"{'  <- регрессия' if worse else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000],
+                        help="размеры каталогов (до 1000000)")
+    parser.add_argument("--iterations", type=int, default=200, help="вызовов на операцию")
+    parser.add_argument("--budget", type=float, default=5.0,
+                        help="не больше стольких секунд на операцию")
+    parser.add_argument("--render-count", type=int, default=10, help="карточек на странице")
+    parser.add_argument("--render-iterations", type=int, default=20)
+    parser.add_argument("--skip-render", action="store_true", help="не измерять отрисовку")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл JSON (по умолчанию results/<коммит>.json)")
+    parser.add_argument("--compare", help="JSON прошлого запуска для сравнения")
+    parser.add_argument("--tolerance", type=float, default=1.2,
+                        help="во сколько раз p50/p95 может вырасти без регрессии")
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_output:
+        # Дочерний процесс bench_size_isolated: один размер, результат в файл
+        result = bench_size(args.sizes[-1], args)
+        with open(args.worker_output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+        return
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "iterations": args.iterations,
+        },
+        "results": [bench_size_isolated(size) for size in args.sizes],
+    }
+    print_results(report)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Нагрузочный тест HTTP API: запросов в секунду при разном числе процессов сервера
+
+Сервер (api.py) запускается отдельным процессом, нагрузку дают несколько
+клиентских процессов с асинхронными соединениями. Смесь запросов: запись по
+id, поиск с фильтрами и повторная проверка по ETag (ответ 304).
+
+Запуск: python benchmarks/load_test.py --server-workers 1 4 --size 10000 --duration 10
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import aiohttp
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+SEARCHES = [
+    "/universities?city=Алматы&limit=10",
+    "/universities?query=университет&sort_by=rating&limit=20",
+    "/universities?specialties=IT,Математика&rating_min=7&limit=10",
+    "/universities?type=технический&budget_places_min=1000&sort_by=budget_places&limit=5",
+    "/universities?query=мед&offset=10&limit=10",
+]
+
+
+def request_mix(ids: List[str], seed: int) -> List[Tuple[str, bool]]:
+    """Пары (путь, условный запрос): 50% по id, 30% поиск, 20% проверка ETag"""
+    rng = random.Random(seed)
+    mix = []
+    for _ in range(1000):
+        roll = rng.random()
+        if roll < 0.5:
+            mix.append((f"/universities/{rng.choice(ids)}", False))
+        elif roll < 0.8:
+            mix.append((rng.choice(SEARCHES), False))
+        else:
+            mix.append((rng.choice(SEARCHES), True))
+    return mix
+
+
+async def _client(base_url: str, mix: List[Tuple[str, bool]], concurrency: int,
+                  duration: float) -> Tuple[List[float], Counter]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    etags: Dict[str, str] = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset: int, session: aiohttp.ClientSession):
+        i = offset
+        while time.perf_counter() < deadline:
+            path, conditional = mix[i % len(mix)]
+            i += concurrency
+            headers = {"If-None-Match": etags[path]} if conditional and path in etags else {}
+            start = time.perf_counter()
+            async with session.get(base_url + path, headers=headers) as response:
+                await response.read()
+                if "ETag" in response.headers:
+                    etags[path] = response.headers["ETag"]
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status] += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(worker(i, session) for i in range(concurrency)))
+    return latencies, statuses
+
+
+def _client_process(args):
+    base_url, ids, seed, concurrency, duration = args
+    return asyncio.run(_client(base_url, request_mix(ids, seed), concurrency, duration))
+
+
+def wait_ready(base_url: str, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + "/health", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Сервер не запустился")
+
+
+def run(server_workers: int, args, ids: List[str], env: Dict[str, str]) -> Dict[str, float]:
+    """Один прогон: сервер с server_workers процессами под нагрузкой клиентов"""
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "api.py"), "--port", str(args.port),
+                               "--workers", str(server_workers)],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_ready(base_url)
+        # Каждый процесс сервера строит индексы при запуске; даем всем подняться
+        time.sleep(1.0 + 0.2 * server_workers)
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            results = pool.map(_client_process, [
+                (base_url, ids, seed, args.concurrency, args.duration) for seed in range(args.clients)
+            ])
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = np.concatenate([np.asarray(latency) for latency, _ in results]) * 1000
+    statuses = sum((status for _, status in results), Counter())
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return {"rps": len(latencies) / args.duration, "p50": p50, "p99": p99,
+            "statuses": dict(sorted(statuses.items()))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--server-workers", type=int, nargs="+",
+                        default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="клиентских процессов")
+    parser.add_argument("--concurrency", type=int, default=32, help="соединений на клиента")
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд на прогон")
+    parser.add_argument("--size", type=int, default=0,
+                        help="синтетический каталог такого размера (0 - текущий каталог)")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    env = dict(os.environ, AI_WARMUP="0")
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.size:
+            from catalog_store import write_catalog
+            from synthetic import make_universities
+
+            universities = make_universities(args.size)
+            path = os.path.join(tmp, "universities.arrow")
+            write_catalog(universities, path)
+            env["UNIVERSITIES_DATA_PATH"] = path
+        else:
+            from universities_data import get_all_universities
+            universities = get_all_universities()
+        ids = [uni.id for uni in universities[:10000]]
+
+        print(f"Каталог: {len(universities)} записей, клиентов: {args.clients} x {args.concurrency} "
+              f"соединений, {args.duration:.0f} с на прогон\n")
+        print(f"{'процессов':>10}{'запросов/с':>14}{'p50, мс':>10}{'p99, мс':>10}  ответы")
+        for server_workers in args.server_workers:
+            result = run(server_workers, args, ids, env)
+            print(f"{server_workers:>10}{result['rps']:>14.0f}{result['p50']:>10.1f}"
+                  f"{result['p99']:>10.1f}  {result['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Синтетические каталоги университетов для бенчмарков
+
+Записи собираются из словарей реальных названий, городов, специальностей и
+особенностей, на русском и казахском языках, поэтому распределение слов и
+длина текстов похожи на настоящий каталог. Генерация детерминирована по seed.
+"""
+
+import os
+import random
+import sys
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from universities_data import University  # noqa: E402
+from universities_seed import SEED_UNIVERSITIES  # noqa: E402
+
+
+# Город -> (название по-казахски, код телефона)
+CITIES = {
+    'Астана': ('Астана', '7172'),
+    'Алматы': ('Алматы', '727'),
+    'Шымкент': ('Шымкент', '7252'),
+    'Караганда': ('Қарағанды', '7212'),
+    'Актобе': ('Ақтөбе', '7132'),
+    'Тараз': ('Тараз', '7262'),
+    'Павлодар': ('Павлодар', '7182'),
+    'Усть-Каменогорск': ('Өскемен', '7232'),
+    'Семей': ('Семей', '7222'),
+    'Атырау': ('Атырау', '7122'),
+    'Костанай': ('Қостанай', '7142'),
+    'Кызылорда': ('Қызылорда', '7242'),
+    'Уральск': ('Орал', '7112'),
+    'Петропавловск': ('Петропавл', '7152'),
+    'Актау': ('Ақтау', '7292'),
+    'Туркестан': ('Түркістан', '72533'),
+    'Кокшетау': ('Көкшетау', '7162'),
+    'Талдыкорган': ('Талдықорған', '7282'),
+}
+
+# Тип -> (прилагательное в названии по-русски, по-казахски, по-английски)
+TYPES = {
+    'национальный': ('национальный', 'ұлттық', 'National'),
+    'технический': ('технический', 'техникалық', 'Technical'),
+    'медицинский': ('медицинский', 'медицина', 'Medical'),
+    'экономический': ('экономический', 'экономикалық', 'Economic'),
+    'гуманитарный': ('гуманитарный', 'гуманитарлық', 'Humanitarian'),
+    'аграрный': ('аграрный', 'аграрлық', 'Agrarian'),
+    'педагогический': ('педагогический', 'педагогикалық', 'Pedagogical'),
+    'международный': ('международный', 'халықаралық', 'International'),
+    'универсальный': ('государственный', 'мемлекеттік', 'State'),
+}
+
+PERSONS = [
+    ('Аль-Фараби', 'Әл-Фараби', 'Al-Farabi'),
+    ('Л.Н. Гумилева', 'Л.Н. Гумилев', 'L.N. Gumilyov'),
+    ('К.И. Сатпаева', 'Қ.И. Сәтбаев', 'K.I. Satpayev'),
+    ('Абая', 'Абай', 'Abai'),
+    ('М. Ауэзова', 'М. Әуезов', 'M. Auezov'),
+    ('Ш. Уалиханова', 'Ш. Уәлиханов', 'Sh. Ualikhanov'),
+    ('Х.А. Ясави', 'Қ.А. Ясауи', 'Kh.A. Yasawi'),
+    ('С. Сейфуллина', 'С. Сейфуллин', 'S. Seifullin'),
+    ('Е.А. Букетова', 'Е.А. Бөкетов', 'E.A. Buketov'),
+    ('К. Жубанова', 'Қ. Жұбанов', 'K. Zhubanov'),
+    ('Абылай хана', 'Абылай хан', 'Abylai Khan'),
+    ('И. Жансугурова', 'І. Жансүгіров', 'I. Zhansugurov'),
+    ('Коркыт Ата', 'Қорқыт Ата', 'Korkyt Ata'),
+    ('А. Байтурсынова', 'А. Байтұрсынұлы', 'A. Baitursynov'),
+]
+
+SPECIALTIES = sorted({item for uni in SEED_UNIVERSITIES for item in uni.specialties} | {
+    'Архитектура', 'Физика', 'Журналистика', 'Психология', 'Социология', 'Туризм',
+    'Логистика', 'Горное дело', 'Металлургия', 'Энергетика', 'Транспорт',
+    'Дизайн', 'Казахский язык и литература', 'Вычислительная техника', 'Кибербезопасность',
+    'Архитектура и строительство', 'Геология', 'Биотехнология', 'Аудит', 'Статистика',
+})
+
+FEATURES = sorted({item for uni in SEED_UNIVERSITIES for item in uni.features} | {
+    'Трехъязычное обучение', 'Общежитие для всех первокурсников', 'Программы двойного диплома',
+    'Гранты акимата', 'Технопарк', 'Спортивный комплекс', 'Академическая мобильность',
+})
+
+DESCRIPTION_RU = [
+    "{name} основан в {year} году и готовит специалистов для экономики региона.",
+    "Университет известен сильными программами по направлениям {spec_a} и {spec_b}.",
+    "Студенты проходят практику на предприятиях города {city} и за рубежом.",
+    "В вузе работают исследовательские центры и современные лаборатории.",
+    "Обучение ведется на казахском, русском и английском языках.",
+    "Выпускники востребованы у работодателей по всему Казахстану.",
+    "При университете действует бизнес-инкубатор и центр карьеры.",
+]
+
+DESCRIPTION_KZ = [
+    "Университет {year} жылы құрылған және өңірдің жетекші жоғары оқу орны болып табылады.",
+    "Білім қазақ, орыс және ағылшын тілдерінде беріледі.",
+    "Студенттер {city_kz} қаласының кәсіпорындарында тәжірибеден өтеді.",
+    "Түлектер Қазақстанның барлық өңірлерінде сұранысқа ие.",
+    "Университетте ғылыми зертханалар мен инновациялық орталықтар жұмыс істейді.",
+]
+
+STREETS = ['пр. Абая', 'ул. Сатпаева', 'пр. Республики', 'ул. Толе би', 'пр. Назарбаева',
+           'ул. Жамбыла', 'ул. Кабанбай батыра', 'пр. аль-Фараби', 'ул. Пушкина']
+
+
+def make_university(i: int, rng: random.Random) -> University:
+    """Одна синтетическая запись с номером i"""
+    city = rng.choice(list(CITIES))
+    city_kz, phone_code = CITIES[city]
+    uni_type = rng.choice(list(TYPES))
+    type_ru, type_kz, type_en = TYPES[uni_type]
+    person_ru, person_kz, person_en = rng.choice(PERSONS)
+
+    if rng.random() < 0.3:
+        # Название на казахском языке
+        name = f"{person_kz} атындағы {city_kz} {type_kz} университеті №{i}"
+    else:
+        name = f"{city} {type_ru} университет имени {person_ru} №{i}"
+    name_eng = f"{person_en} {city} {type_en} University No. {i}"
+
+    specialties = rng.sample(SPECIALTIES, k=rng.randint(3, 7))
+    year = rng.randint(1928, 2020)
+    sentences = rng.sample(DESCRIPTION_RU, k=3) + rng.sample(DESCRIPTION_KZ, k=rng.randint(0, 2))
+    description = " ".join(sentence.format(
+        name=name, year=year, city=city, city_kz=city_kz,
+        spec_a=specialties[0], spec_b=specialties[1],
+    ) for sentence in sentences)
+
+    domain = f"uni{i}.edu.kz"
+    return University(
+        id=f"uni_{i}",
+        name=name,
+        name_eng=name_eng,
+        city=city,
+        description=description,
+        type=uni_type,
+        rating=round(rng.uniform(5.0, 9.9), 1),
+        founding_year=year,
+        students_count=rng.randint(300, 30000),
+        budget_places=rng.randint(50, 6000),
+        contact_email=f"info@{domain}",
+        website=f"https://{domain}",
+        address=f"г. {city}, {rng.choice(STREETS)}, {rng.randint(1, 200)}",
+        phone=f"+7 ({phone_code}) {rng.randint(20, 99)}-{rng.randint(10, 99)}-{rng.randint(10, 99)}",
+        specialties=specialties,
+        photo_filename=f"uni_{i}.jpg",
+        features=rng.sample(FEATURES, k=rng.randint(2, 4)),
+    )
+
+
+def make_universities(size: int, seed: int = 0) -> List[University]:
+    """Синтетический каталог из size записей"""
+    rng = random.Random(seed)
+    return [make_university(i, rng) for i in range(size)]
@@ -0,0 +1,91 @@
+"""
+Индекс BM25 по тем же полям, что и поиск по подстроке
+"""
+
+import math
+import re
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from search_index import normalize_text
+
+if TYPE_CHECKING:
+    from universities_data import University
+
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Грубый стемминг для русского: слова обрезаются до первых STEM_LENGTH букв,
+# чтобы "медицинский" и "медицина" давали один терм
+STEM_LENGTH = 6
+
+
+def tokenize(text: str) -> List[str]:
+    """Разбивает текст на нормализованные термы"""
+    return [token[:STEM_LENGTH] for token in TOKEN_RE.findall(normalize_text(text))]
+
+
+def bm25_text(university: "University") -> str:
+    """Текст записи для BM25: name, description, city и specialties"""
+    return " ".join((university.name, university.description, university.city,
+                     " ".join(university.specialties)))
+
+
+class Bm25Index:
+    """Классический Okapi BM25 с постинг-листами в массивах NumPy"""
+
+    def __init__(self, universities: Sequence["University"], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(universities)
+
+        positions: Dict[str, List[int]] = {}
+        frequencies: Dict[str, List[int]] = {}
+        lengths = np.zeros(self.size, dtype=np.float64)
+        for position, uni in enumerate(universities):
+            tokens = tokenize(bm25_text(uni))
+            lengths[position] = len(tokens)
+            for term, count in Counter(tokens).items():
+                positions.setdefault(term, []).append(position)
+                frequencies.setdefault(term, []).append(count)
+
+        average = lengths.mean() if self.size else 0.0
+        # Знаменатель BM25 без tf зависит только от длины документа
+        self._length_norm = k1 * (1 - b + b * lengths / average) if average else lengths
+
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray, float]] = {}
+        for term, term_positions in positions.items():
+            df = len(term_positions)
+            idf = math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+            self._postings[term] = (np.asarray(term_positions, dtype=np.int64),
+                                    np.asarray(frequencies[term], dtype=np.float64), idf)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def scores(self, query: str) -> np.ndarray:
+        """Возвращает оценку BM25 каждого документа для запроса"""
+        scores = np.zeros(self.size, dtype=np.float64)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            term_positions, tf, idf = posting
+            scores[term_positions] += idf * tf * (self.k1 + 1) / (tf + self._length_norm[term_positions])
+        return scores
+
+    def top(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Возвращает до k пар (позиция, оценка) с ненулевой оценкой по убыванию"""
+        if k <= 0:
+            return []
+        scores = self.scores(query)
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        order = matched[np.lexsort((matched, -scores[matched]))]
+        return [(position, float(scores[position])) for position in order.tolist()]
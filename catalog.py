@@ -0,0 +1,285 @@
+"""
+Индексированный каталог университетов с доступом по ключам за O(1)
+"""
+
+import threading
+from bisect import bisect_left, insort
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from bm25 import Bm25Index
+from columnar import UniversityColumns
+from dataset_versions import DatasetSnapshot, diff_snapshots
+from fuzzy_search import FuzzySearchIndex
+from search_index import SearchIndex, scan_positions
+
+if TYPE_CHECKING:
+    from dataset_versions import ChangeSet
+    from universities_data import University
+
+
+class TrackedList(list):
+    """Список, увеличивающий номер версии при каждом изменении"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.version = 0
+
+
+def _tracking(name: str):
+    """Оборачивает изменяющий метод list так, чтобы он увеличивал версию"""
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self.version += 1
+        return result
+
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+for _name in ("__setitem__", "__delitem__", "__iadd__", "__imul__", "append", "extend",
+              "insert", "pop", "remove", "clear", "sort", "reverse"):
+    setattr(TrackedList, _name, _tracking(_name))
+
+
+class CatalogMaps(NamedTuple):
+    """Словари каталога по позициям записей"""
+    positions: Dict[str, int]  # id -> позиция; при повторе id - первая запись
+    by_city: Dict[str, List[int]]  # город в нижнем регистре -> позиции по возрастанию
+    by_type: Dict[str, List[int]]  # тип в нижнем регистре -> позиции по возрастанию
+
+
+def build_maps(universities: Sequence["University"]) -> CatalogMaps:
+    """Строит словари каталога проходом по всем записям"""
+    positions: Dict[str, int] = {}
+    by_city: Dict[str, List[int]] = {}
+    by_type: Dict[str, List[int]] = {}
+    for position, uni in enumerate(universities):
+        # При повторе id побеждает первая запись, как при линейном поиске
+        positions.setdefault(uni.id, position)
+        by_city.setdefault(uni.city.lower(), []).append(position)
+        by_type.setdefault(uni.type.lower(), []).append(position)
+    return CatalogMaps(positions, by_city, by_type)
+
+
+def _group_of(groups: Dict[str, List[int]], position: int) -> Optional[str]:
+    """Группа, в которой лежит позиция; групп немного, внутри - бинарный поиск"""
+    for key, bucket in groups.items():
+        slot = bisect_left(bucket, position)
+        if slot < len(bucket) and bucket[slot] == position:
+            return key
+    return None
+
+
+def _regroup(groups: Dict[str, List[int]], positions: Sequence[int],
+             keys: Sequence[str]) -> Dict[str, List[int]]:
+    """Группы следующей версии: записи на позициях positions получают ключи keys
+
+    Копируются только затронутые группы. Старая группа записи ищется по
+    позиции, а не по полю записи: запись могла быть изменена "на месте".
+    """
+    groups = dict(groups)
+    copied = set()
+    for position, key in zip(positions, keys):
+        old_key = _group_of(groups, position)
+        if old_key == key:
+            continue
+        if old_key is not None:
+            bucket = groups[old_key] = [item for item in groups[old_key] if item != position]
+            copied.add(old_key)
+            if not bucket:
+                del groups[old_key]
+        if key not in copied:
+            groups[key] = list(groups.get(key, ()))
+            copied.add(key)
+        insort(groups[key], position)
+    if copied:
+        # Порядок групп - по первому появлению, как при полной сборке
+        groups = dict(sorted(groups.items(), key=lambda item: item[1][0]))
+    return groups
+
+
+def next_maps(maps: CatalogMaps, universities: Sequence["University"],
+              changes: "ChangeSet") -> Optional[CatalogMaps]:
+    """Словари следующей версии по изменениям или None, если нужна полная сборка
+
+    Без полной сборки обходятся версии, где старые записи остались на своих
+    позициях (правки и добавления в конец). Удаление или перестановка сдвигает
+    позиции, и словари строятся заново при первом обращении.
+    """
+    if not changes.positions_kept:
+        return None
+    positions = maps.positions
+    if len(changes.added):
+        positions = dict(positions)
+        for position in changes.added.tolist():
+            positions.setdefault(universities[position].id, position)
+    changed = changes.changed.tolist()
+    records = [universities[position] for position in changed]
+    return CatalogMaps(
+        positions,
+        _regroup(maps.by_city, changed, [uni.city.lower() for uni in records]),
+        _regroup(maps.by_type, changed, [uni.type.lower() for uni in records]),
+    )
+
+
+class UniversityCatalog:
+    """Снимок списка университетов со словарем по id и группами по городу и типу
+
+    Каталог неизменяем: при изменении данных строится новый экземпляр
+    с увеличенным номером версии.
+    """
+
+    def __init__(self, universities: Iterable["University"], version: int = 0):
+        self.universities: List["University"] = list(universities)
+        self.version = version
+        # Изменения относительно предыдущей версии, если каталог получен через apply
+        self.changes: Optional["ChangeSet"] = None
+        # Снимок снимается сразу: правки записей "на месте" после сборки каталога
+        # должны попасть в изменения относительно него
+        self._snapshot: Optional[DatasetSnapshot] = DatasetSnapshot(self.universities, version)
+
+        self._maps: Optional[CatalogMaps] = None
+        self._search_index: Optional[SearchIndex] = None
+        self._search_index_lock = threading.Lock()
+        self._search_index_thread: Optional[threading.Thread] = None
+        self._columns: Optional[UniversityColumns] = None
+        self._bm25_index: Optional[Bm25Index] = None
+        self._fuzzy_index: Optional[FuzzySearchIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.universities)
+
+    @property
+    def snapshot(self) -> DatasetSnapshot:
+        """Снимок версии (id и хэши записей) для сравнения со следующей версией"""
+        if self._snapshot is None:
+            self._snapshot = DatasetSnapshot(self.universities, self.version)
+        return self._snapshot
+
+    def apply(self, universities: Iterable["University"], version: int) -> "UniversityCatalog":
+        """Каталог следующей версии, обновленный по изменениям относительно этой
+
+        Уже построенные словари, колонки и поисковый индекс обновляются только
+        для добавленных, удаленных и измененных записей. Индексы BM25 и
+        нечеткого поиска, как и прежде, строятся при первом обращении.
+
+        Линейными по размеру каталога остаются хэширование всех записей в
+        снимке (правку "на месте" иначе не обнаружить) и копирование массивов
+        новой версии; и то и другое выполняется без разбора записей на Python.
+        """
+        catalog = UniversityCatalog(universities, version)
+        changes = diff_snapshots(self.snapshot, catalog.snapshot)
+        catalog.changes = changes
+        if self._maps is not None:
+            catalog._maps = next_maps(self._maps, catalog.universities, changes)
+        if self._search_index is not None:
+            catalog._search_index = self._search_index.apply(catalog.universities, changes)
+        elif self._search_index_thread is not None:
+            # Индекс прошлой версии еще строится: новую версию собираем заново в фоне
+            catalog.start_search_index()
+        if self._columns is not None:
+            catalog._columns = self._columns.apply(catalog.universities, changes)
+        return catalog
+
+    @property
+    def maps(self) -> CatalogMaps:
+        """Словари по id, городу и типу, строятся при первом обращении"""
+        if self._maps is None:
+            self._maps = build_maps(self.universities)
+        return self._maps
+
+    def get(self, university_id: str) -> Optional["University"]:
+        """Находит университет по ID"""
+        position = self.position(university_id)
+        return None if position is None else self.universities[position]
+
+    def position(self, university_id: str) -> Optional[int]:
+        """Возвращает позицию университета в каталоге"""
+        return self.maps.positions.get(university_id)
+
+    def records(self, positions: Iterable[int]) -> List["University"]:
+        """Возвращает университеты по позициям в каталоге"""
+        universities = self.universities
+        return [universities[i] for i in positions]
+
+    def by_city(self, city: str) -> List["University"]:
+        """Возвращает университеты в указанном городе"""
+        return self.records(self.maps.by_city.get(city.lower(), ()))
+
+    def by_type(self, uni_type: str) -> List["University"]:
+        """Возвращает университеты указанного типа"""
+        return self.records(self.maps.by_type.get(uni_type.lower(), ()))
+
+    @property
+    def cities(self) -> List[str]:
+        """Список городов в порядке появления в каталоге"""
+        return [self.universities[bucket[0]].city for bucket in self.maps.by_city.values()]
+
+    @property
+    def types(self) -> List[str]:
+        """Список типов университетов в порядке появления в каталоге"""
+        return [self.universities[bucket[0]].type for bucket in self.maps.by_type.values()]
+
+    @property
+    def search_index(self) -> SearchIndex:
+        """Поисковый индекс; если он еще не построен, строится (или дожидается фоновой сборки)"""
+        if self._search_index is None:
+            with self._search_index_lock:
+                if self._search_index is None:
+                    self._search_index = SearchIndex(self.universities)
+        return self._search_index
+
+    def start_search_index(self):
+        """Запускает сборку поискового индекса в фоновом потоке, если его еще нет"""
+        if self._search_index is not None or self._search_index_thread is not None:
+            return
+        with self._search_index_lock:
+            if self._search_index is None and self._search_index_thread is None:
+                self._search_index_thread = threading.Thread(
+                    target=lambda: self.search_index, name="search-index", daemon=True)
+                self._search_index_thread.start()
+
+    def search_positions(self, query: str) -> List[int]:
+        """Позиции университетов, содержащих запрос
+
+        Сборка индекса на десятках тысяч записей занимает секунды, поэтому
+        запрос ее не ждет: индекс строится в фоне, а до готовности поиск идет
+        линейным проходом по записям.
+        """
+        index = self._search_index
+        if index is not None:
+            return index.search_positions(query)
+        self.start_search_index()
+        return scan_positions(self.universities, query)
+
+    def filter_positions(self, query: str, positions: Sequence[int]) -> List[int]:
+        """Оставляет из переданных позиций те, что содержат запрос"""
+        index = self._search_index
+        if index is not None:
+            return index.filter_positions(query, positions)
+        self.start_search_index()
+        return scan_positions(self.universities, query, positions)
+
+    @property
+    def columns(self) -> UniversityColumns:
+        """Колоночное представление, строится при первом обращении"""
+        if self._columns is None:
+            self._columns = UniversityColumns(self.universities)
+        return self._columns
+
+    @property
+    def bm25_index(self) -> Bm25Index:
+        """Индекс BM25, строится при первом обращении"""
+        if self._bm25_index is None:
+            self._bm25_index = Bm25Index(self.universities)
+        return self._bm25_index
+
+    @property
+    def fuzzy_index(self) -> FuzzySearchIndex:
+        """Триграммный индекс нечеткого поиска, строится при первом обращении"""
+        if self._fuzzy_index is None:
+            self._fuzzy_index = FuzzySearchIndex(self.universities)
+        return self._fuzzy_index
@@ -0,0 +1,147 @@
+"""
+Хранение каталога университетов в файле Arrow IPC, отображаемом в память
+
+Файл читается через mmap без копирования буферов, city и type хранятся
+словарным кодированием, специальности и особенности - списками строк.
+
+Пересобрать файл из исходных данных:
+    python catalog_store.py export [--path data/universities.arrow]
+"""
+
+import argparse
+import dataclasses
+import os
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+
+
+# Как часто проверять, не изменился ли файл на диске (секунды)
+RELOAD_CHECK_INTERVAL = 1.0
+
+SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('name', pa.string()),
+    ('name_eng', pa.string()),
+    ('city', pa.dictionary(pa.int32(), pa.string())),
+    ('description', pa.string()),
+    ('type', pa.dictionary(pa.int32(), pa.string())),
+    ('rating', pa.float64()),
+    ('founding_year', pa.int32()),
+    ('students_count', pa.int32()),
+    ('budget_places', pa.int32()),
+    ('contact_email', pa.string()),
+    ('website', pa.string()),
+    ('address', pa.string()),
+    ('phone', pa.string()),
+    ('specialties', pa.list_(pa.string())),
+    ('photo_filename', pa.string()),
+    ('features', pa.list_(pa.string())),
+])
+
+
+def universities_to_table(universities: Sequence[Any]) -> pa.Table:
+    """Собирает таблицу Arrow из списка университетов"""
+    columns = []
+    for schema_field in SCHEMA:
+        values = [getattr(uni, schema_field.name) for uni in universities]
+        if pa.types.is_dictionary(schema_field.type):
+            columns.append(pa.array(values, type=pa.string()).dictionary_encode())
+        elif pa.types.is_list(schema_field.type):
+            columns.append(pa.array([list(items) for items in values], type=schema_field.type))
+        else:
+            columns.append(pa.array(values, type=schema_field.type))
+    return pa.Table.from_arrays(columns, schema=SCHEMA)
+
+
+def write_catalog(universities: Sequence[Any], path: str):
+    """Записывает каталог в файл; замена атомарная, читатели видят старую или новую версию"""
+    table = universities_to_table(universities)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    temp_path = f"{path}.tmp"
+    with pa.OSFile(temp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temp_path, path)
+
+
+def read_table(path: str) -> pa.Table:
+    """Открывает файл каталога через mmap; буферы таблицы ссылаются на отображение"""
+    source = pa.memory_map(path, "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def table_to_records(table: pa.Table, record_type) -> List[Any]:
+    """Создает записи record_type из таблицы, проходя по колонкам, а не по строкам"""
+    names = [record_field.name for record_field in dataclasses.fields(record_type)]
+    columns = []
+    for name in names:
+        column = table.column(name)
+        if pa.types.is_dictionary(column.type):
+            # Декодируем словарь один раз: одинаковые значения - один объект str
+            column = column.combine_chunks()
+            dictionary = column.dictionary.to_pylist()
+            columns.append([dictionary[index] for index in column.indices.to_pylist()])
+        else:
+            columns.append(column.to_pylist())
+    return [record_type(*row) for row in zip(*columns)]
+
+
+class CatalogFile:
+    """Файл каталога с отслеживанием изменений для горячей перезагрузки"""
+
+    def __init__(self, path: str, record_type):
+        self.path = path
+        self.record_type = record_type
+        self.table: Optional[pa.Table] = None
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._checked_at = 0.0
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def load(self) -> List[Any]:
+        """Читает файл и запоминает его состояние"""
+        self._signature = self._stat()
+        self._checked_at = time.monotonic()
+        self.table = read_table(self.path)
+        return table_to_records(self.table, self.record_type)
+
+    def changed(self) -> bool:
+        """Изменился ли файл с последней загрузки (проверка не чаще RELOAD_CHECK_INTERVAL)"""
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return False
+        self._checked_at = now
+        signature = self._stat()
+        return signature is not None and signature != self._signature
+
+
+def main():
+    from universities_data import DATA_PATH
+
+    parser = argparse.ArgumentParser(description="Работа с файлом каталога университетов")
+    parser.add_argument("command", choices=["export", "info"],
+                        help="export - записать исходные данные в файл, info - показать содержимое")
+    parser.add_argument("--path", default=DATA_PATH, help="путь к файлу каталога")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        from universities_seed import SEED_UNIVERSITIES
+        write_catalog(SEED_UNIVERSITIES, args.path)
+        print(f"Записано {len(SEED_UNIVERSITIES)} университетов в {args.path}")
+    else:
+        table = read_table(args.path)
+        print(f"{args.path}: {table.num_rows} записей, {os.path.getsize(args.path)} байт")
+        print(table.schema)
+
+
+if __name__ == "__main__":
+    main()
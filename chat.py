@@ -0,0 +1,242 @@
+"""
+Чат-консультант по университетам: поиск контекста (RAG) и потоковый ответ
+
+Бэкенд генерации подключаемый: локальная модель через langchain-community
+(Ollama, LlamaCpp) или офлайн-заглушка, которая собирает ответ из найденных
+записей и не требует модели (используется по умолчанию и в тестах).
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from resources import SharedResource
+from search_index import normalize_text
+
+if TYPE_CHECKING:
+    from universities_data import University
+
+
+# Сколько университетов передавать модели как контекст
+CONTEXT_SIZE = 4
+
+# Окно истории: не больше HISTORY_MESSAGES последних сообщений и HISTORY_CHARS символов
+HISTORY_MESSAGES = 6
+HISTORY_CHARS = 4000
+
+RETRIEVAL_CACHE_SIZE = 512
+
+SYSTEM_PROMPT = (
+    "Ты консультант абитуриентов по университетам Казахстана. Отвечай по-русски, "
+    "кратко и только на основе сведений об университетах ниже. Если сведений "
+    "недостаточно, так и скажи."
+)
+
+# Роли сообщений, как в st.session_state.chat_history
+USER = "user"
+ASSISTANT = "assistant"
+
+Message = Dict[str, str]
+
+
+class OfflineStubBackend:
+    """Офлайн-бэкенд без модели: перечисляет найденные университеты"""
+
+    name = "stub"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay  # пауза между токенами, чтобы имитировать генерацию
+
+    def stream(self, prompt: str, context: Sequence["University"]) -> Iterator[str]:
+        if context:
+            lines = ["Вот что удалось найти:"]
+            for uni in context:
+                lines.append(f"- **{uni.name}** ({uni.city}, рейтинг {uni.rating}/10): "
+                             f"{', '.join(uni.specialties)}")
+            text = "\n".join(lines)
+        else:
+            text = "К сожалению, в каталоге не нашлось подходящих университетов."
+
+        for token in re.findall(r"\S+\s*", text):
+            if self.delay:
+                time.sleep(self.delay)
+            yield token
+
+
+class LangChainBackend:
+    """Бэкенд на LLM из langchain-community с потоковой генерацией"""
+
+    def __init__(self, llm, name: str = "langchain"):
+        self.llm = llm
+        self.name = name
+
+    def stream(self, prompt: str, context: Sequence["University"]) -> Iterator[str]:
+        for chunk in self.llm.stream(prompt):
+            # LLM возвращает строки, чат-модели - сообщения с полем content
+            yield chunk if isinstance(chunk, str) else getattr(chunk, "content", str(chunk))
+
+
+def create_backend(kind: Optional[str] = None):
+    """Создает бэкенд по имени; по умолчанию - из переменной CHAT_BACKEND
+
+    stub - офлайн-заглушка, ollama - модель OLLAMA_MODEL на локальном сервере
+    Ollama, llamacpp - файл модели LLAMACPP_MODEL_PATH.
+    """
+    kind = (kind or os.environ.get("CHAT_BACKEND", "stub")).lower()
+    if kind == "stub":
+        return OfflineStubBackend()
+    if kind == "ollama":
+        from langchain_community.llms import Ollama
+        return LangChainBackend(Ollama(model=os.environ.get("OLLAMA_MODEL", "llama3"),
+                                       temperature=0.2), name="ollama")
+    if kind == "llamacpp":
+        from langchain_community.llms import LlamaCpp
+        return LangChainBackend(LlamaCpp(model_path=os.environ["LLAMACPP_MODEL_PATH"],
+                                         temperature=0.2, n_ctx=4096, streaming=True),
+                                name="llamacpp")
+    raise ValueError(f"Неизвестный бэкенд чата {kind!r}: доступны stub, ollama, llamacpp")
+
+
+# Бэкенд загружается один раз на процесс, как и модель эмбеддингов
+chat_backend_resource = SharedResource("chat_backend", create_backend)
+
+
+def normalize_question(question: str) -> str:
+    """Ключ кэша: регистр, ё/е, пунктуация и лишние пробелы не важны"""
+    return " ".join(re.findall(r"\w+", normalize_text(question)))
+
+
+class RetrievalCache:
+    """LRU-кэш найденного контекста по нормализованному вопросу и версии данных"""
+
+    def __init__(self, size: int = RETRIEVAL_CACHE_SIZE):
+        self.size = size
+        self._items: "OrderedDict[Tuple[str, int], List[University]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, question: str, version: int, compute) -> List["University"]:
+        key = (normalize_question(question), version)
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+
+        result = compute()
+        with self._lock:
+            self._items[key] = result
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        return result
+
+
+retrieval_cache = RetrievalCache()
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="chat-retrieval")
+
+
+def retrieve_context(question: str, k: int = CONTEXT_SIZE) -> List["University"]:
+    """Находит университеты для контекста (гибридный поиск), с кэшем"""
+    from hybrid_search import hybrid_search
+    from universities_data import get_catalog
+
+    catalog = get_catalog()
+    return retrieval_cache.get_or_compute(
+        question, catalog.version,
+        lambda: hybrid_search(question, k=k, catalog=catalog).universities,
+    )
+
+
+def history_window(history: Sequence[Message], max_messages: int = HISTORY_MESSAGES,
+                   max_chars: int = HISTORY_CHARS) -> List[Message]:
+    """Последние сообщения истории, укладывающиеся в ограничения"""
+    window: List[Message] = []
+    total = 0
+    for message in reversed(history[-max_messages:] if max_messages else []):
+        total += len(message["content"])
+        if total > max_chars:
+            break
+        window.append(message)
+    window.reverse()
+    return window
+
+
+def format_context(universities: Sequence["University"]) -> str:
+    """Описание университетов для промпта"""
+    blocks = []
+    for uni in universities:
+        blocks.append(
+            f"{uni.name} ({uni.name_eng}), {uni.city}. Тип: {uni.type}. Рейтинг: {uni.rating}/10. "
+            f"Основан в {uni.founding_year}. Студентов: {uni.students_count}, "
+            f"бюджетных мест: {uni.budget_places}. Специальности: {', '.join(uni.specialties)}. "
+            f"Особенности: {', '.join(uni.features)}. {uni.description} Сайт: {uni.website}"
+        )
+    return "\n".join(f"[{i}] {block}" for i, block in enumerate(blocks, start=1))
+
+
+def format_history(window: Sequence[Message]) -> str:
+    names = {USER: "Абитуриент", ASSISTANT: "Консультант"}
+    return "\n".join(f"{names.get(m['role'], m['role'])}: {m['content']}" for m in window)
+
+
+@dataclass
+class ChatTurn:
+    """Статистика одного ответа (время в миллисекундах)"""
+    question: str
+    context: List["University"] = field(default_factory=list)
+    retrieval_ms: float = 0.0
+    time_to_first_token_ms: Optional[float] = None
+    total_ms: float = 0.0
+    answer: str = ""
+
+
+def stream_answer(question: str, history: Sequence[Message] = (), backend=None,
+                  turn: Optional[ChatTurn] = None) -> Iterator[str]:
+    """Отвечает на вопрос, выдавая токены по мере генерации
+
+    Поиск контекста идет в фоне параллельно со сборкой истории для промпта.
+    Статистика записывается в переданный turn.
+    """
+    if turn is None:
+        turn = ChatTurn(question)
+    if backend is None:
+        backend = chat_backend_resource.get()
+
+    start = time.perf_counter()
+
+    def timed_retrieval():
+        retrieval_start = time.perf_counter()
+        context = retrieve_context(question)
+        turn.retrieval_ms = (time.perf_counter() - retrieval_start) * 1000
+        return context
+
+    retrieval = _executor.submit(timed_retrieval)
+
+    # Пока идет поиск, готовим остальные части промпта
+    history_text = format_history(history_window(history))
+
+    turn.context = retrieval.result()
+    prompt = "\n\n".join(part for part in (
+        SYSTEM_PROMPT,
+        "Сведения об университетах:\n" + (format_context(turn.context) or "нет данных"),
+        "История диалога:\n" + history_text if history_text else "",
+        f"Абитуриент: {question}\nКонсультант:",
+    ) if part)
+
+    pieces = []
+    for token in backend.stream(prompt, turn.context):
+        if turn.time_to_first_token_ms is None:
+            turn.time_to_first_token_ms = (time.perf_counter() - start) * 1000
+        pieces.append(token)
+        yield token
+
+    turn.answer = "".join(pieces)
+    turn.total_ms = (time.perf_counter() - start) * 1000
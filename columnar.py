@@ -0,0 +1,206 @@
+"""
+Колоночное представление каталога университетов для векторных операций
+"""
+
+from typing import TYPE_CHECKING, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from dataset_versions import ChangeSet
+    from universities_data import University
+
+
+# Порядок колонок совпадает с University.to_dict()
+COLUMNS = [
+    'id', 'name', 'name_eng', 'city', 'description', 'type', 'rating', 'founding_year',
+    'students_count', 'budget_places', 'contact_email', 'website', 'address', 'phone',
+    'specialties', 'photo_filename', 'features',
+]
+
+NUMERIC_COLUMNS = {
+    'rating': np.float64,
+    'founding_year': np.int64,
+    'students_count': np.int64,
+    'budget_places': np.int64,
+}
+
+CATEGORICAL_COLUMNS = ('city', 'type')
+
+
+def _explode_values(universities: Sequence["University"], field: str,
+                    positions: Sequence[int]) -> Tuple[List[int], List[str]]:
+    """Пары (позиция, значение) списочного поля для записей на указанных позициях"""
+    pair_positions: List[int] = []
+    values: List[str] = []
+    for position, uni in zip(positions, universities):
+        items = getattr(uni, field)
+        pair_positions.extend([position] * len(items))
+        values.extend(items)
+    return pair_positions, values
+
+
+def _explode(universities: Sequence["University"], field: str, column: str) -> pd.DataFrame:
+    """Строит таблицу "университет - значение" для списочного поля"""
+    positions, values = _explode_values(universities, field, range(len(universities)))
+
+    return pd.DataFrame({
+        'position': np.asarray(positions, dtype=np.int64),
+        'id': pd.Categorical([universities[i].id for i in positions]),
+        column: pd.Categorical(values),
+    })
+
+
+def _combine_categorical(old: pd.Categorical, old_rows: np.ndarray, values: Sequence[str],
+                         order: np.ndarray) -> pd.Categorical:
+    """Категориальная колонка из строк old_rows старой колонки и новых значений
+
+    Строки идут в порядке order по объединенному списку (сначала старые, затем
+    новые). Категории - отсортированные встречающиеся значения, как у
+    pd.Categorical(values) при сборке с нуля.
+    """
+    values = list(values)
+    categories = old.categories
+    fresh = categories.get_indexer(values)
+    missing = fresh < 0
+    if not missing.any():
+        # Новых значений нет: коды старых строк переносятся без пересчета
+        codes = np.concatenate([old.codes[old_rows], fresh])[order]
+    else:
+        # Новые значения вставляются в отсортированные категории без пересортировки
+        added = [values[i] for i in np.flatnonzero(missing)]
+        extra = pd.Index(added, dtype=object).unique().sort_values()
+        slots = categories.searchsorted(extra)
+        # Старая категория сдвигается на число вставленных перед ней
+        kept = np.arange(len(categories))
+        remap = kept + np.searchsorted(slots, kept, side='right')
+        fresh[~missing] = remap[fresh[~missing]]
+        fresh[missing] = (slots + np.arange(len(extra)))[extra.get_indexer(added)]
+        categories = pd.Index(np.insert(categories.to_numpy(), slots, extra.to_numpy()), dtype=object)
+        codes = np.concatenate([remap[old.codes[old_rows]], fresh])[order]
+    used = np.bincount(codes, minlength=len(categories)) > 0
+    if used.all() and categories is old.categories:
+        return pd.Categorical.from_codes(codes, dtype=old.dtype)
+    if not used.all():
+        codes = (np.cumsum(used) - 1)[codes]
+        categories = categories[used]
+    return pd.Categorical.from_codes(codes, categories)
+
+
+def _apply_exploded(table: pd.DataFrame, column: str, field: str, changes: "ChangeSet",
+                    changed: Sequence["University"]) -> pd.DataFrame:
+    """Развернутая таблица следующей версии: строки неизмененных записей переносятся"""
+    positions = table['position'].to_numpy()
+    old_rows = np.flatnonzero(~changes.stale[positions])
+    new_positions, values = _explode_values(changed, field, changes.changed.tolist())
+    targets = np.concatenate([changes.position_map[positions[old_rows]],
+                              np.asarray(new_positions, dtype=np.int64)])
+    # Строки по позициям записей, внутри записи - в порядке элементов списка
+    order = np.argsort(targets, kind='stable')
+    ids = [uni.id for uni in changed for _ in getattr(uni, field)]
+    return pd.DataFrame({
+        'position': targets[order],
+        'id': _combine_categorical(table['id'].array, old_rows, ids, order),
+        column: _combine_categorical(table[column].array, old_rows, values, order),
+    })
+
+
+class UniversityColumns:
+    """Колонки каталога, построенные один раз на версию данных
+
+    frame - таблица с одной строкой на университет (позиция строки совпадает
+    с позицией в каталоге), specialties и features - "развернутые" таблицы
+    со строкой на каждую пару университет-значение.
+    """
+
+    def __init__(self, universities: Sequence["University"]):
+        universities = list(universities)
+        self.size = len(universities)
+
+        data = {}
+        for column in COLUMNS:
+            values = [getattr(uni, column) for uni in universities]
+            if column in NUMERIC_COLUMNS:
+                data[column] = np.asarray(values, dtype=NUMERIC_COLUMNS[column])
+            elif column in CATEGORICAL_COLUMNS:
+                data[column] = pd.Categorical(values)
+            elif column in ('specialties', 'features'):
+                data[column] = [', '.join(items) for items in values]
+            else:
+                data[column] = values
+
+        self.frame = pd.DataFrame(data, columns=COLUMNS)
+        self.specialties = _explode(universities, 'specialties', 'specialty')
+        self.features = _explode(universities, 'features', 'feature')
+
+        self._set_arrays(data)
+
+    def _set_arrays(self, data):
+        # Массивы для масок и сортировок без обращения к DataFrame
+        self.rating = data['rating']
+        self.founding_year = data['founding_year']
+        self.students_count = data['students_count']
+        self.budget_places = data['budget_places']
+        self.city_codes = self.frame['city'].cat.codes.to_numpy()
+        self.type_codes = self.frame['type'].cat.codes.to_numpy()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def apply(self, universities: Sequence["University"], changes: "ChangeSet") -> "UniversityColumns":
+        """Колонки следующей версии каталога
+
+        Значения неизмененных записей переносятся из текущих колонок массивами,
+        из объектов University читаются только добавленные и измененные записи.
+        """
+        if not self.size:
+            return UniversityColumns(universities)
+        columns = UniversityColumns.__new__(UniversityColumns)
+        columns.size = changes.size
+        positions = changes.changed
+        changed = [universities[i] for i in positions.tolist()]
+
+        kept = changes.source.copy()
+        kept[positions] = -1
+        new_rows = np.flatnonzero(kept >= 0)
+        old_rows = kept[new_rows]
+        # order[позиция] - строка в объединенном списке (сначала перенесенные, затем новые)
+        order = np.empty(columns.size, dtype=np.int64)
+        order[np.concatenate([new_rows, positions])] = np.arange(columns.size)
+
+        # Строки переносятся одним take по блокам таблицы; строки измененных
+        # записей (здесь - копии нулевой) перезаписываются ниже
+        kept[positions] = 0
+        frame = self.frame.take(kept)
+        frame.index = pd.RangeIndex(columns.size)
+        for index, column in enumerate(COLUMNS):
+            values = [getattr(uni, column) for uni in changed]
+            if column in CATEGORICAL_COLUMNS:
+                # Категории могут измениться, колонка собирается целиком из кодов
+                frame[column] = _combine_categorical(self.frame[column].array, old_rows,
+                                                     values, order)
+                continue
+            if not len(positions):
+                continue
+            if column in NUMERIC_COLUMNS:
+                fresh = np.asarray(values, dtype=NUMERIC_COLUMNS[column])
+            else:
+                if column in ('specialties', 'features'):
+                    values = [', '.join(items) for items in values]
+                fresh = np.empty(len(values), dtype=object)
+                fresh[:] = values
+            frame.iloc[positions, index] = fresh
+
+        columns.frame = frame
+        columns.specialties = _apply_exploded(self.specialties, 'specialty', 'specialties',
+                                              changes, changed)
+        columns.features = _apply_exploded(self.features, 'feature', 'features', changes, changed)
+        columns._set_arrays({column: frame[column].to_numpy(copy=True) for column in NUMERIC_COLUMNS})
+        return columns
+
+    def category_codes(self, column: str, value: str) -> np.ndarray:
+        """Возвращает коды категорий, совпадающих со значением без учета регистра"""
+        value = value.lower()
+        categories = self.frame[column].cat.categories
+        return np.flatnonzero([category.lower() == value for category in categories])
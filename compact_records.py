@@ -0,0 +1,90 @@
+"""
+Компактное представление записей университетов
+
+CompactUniversity - неизменяемая запись со __slots__ (без __dict__ на экземпляр),
+повторяющиеся строки (город, тип, специальности, особенности) интернируются,
+а списки хранятся кортежами, одинаковые кортежи разделяются между записями.
+"""
+
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Пул одинаковых кортежей специальностей и особенностей
+_tuple_pool: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def intern_tuple(items: Iterable[str]) -> Tuple[str, ...]:
+    """Возвращает общий кортеж интернированных строк"""
+    key = tuple(sys.intern(item) for item in items)
+    return _tuple_pool.setdefault(key, key)
+
+
+@dataclass(frozen=True)
+class CompactUniversity:
+    """Неизменяемая запись об университете, совместимая с University по атрибутам"""
+    __slots__ = (
+        'id', 'name', 'name_eng', 'city', 'description', 'type', 'rating', 'founding_year',
+        'students_count', 'budget_places', 'contact_email', 'website', 'address', 'phone',
+        'specialties', 'photo_filename', 'features',
+    )
+
+    id: str
+    name: str
+    name_eng: str
+    city: str
+    description: str
+    type: str
+    rating: float
+    founding_year: int
+    students_count: int
+    budget_places: int
+    contact_email: str
+    website: str
+    address: str
+    phone: str
+    specialties: Tuple[str, ...]
+    photo_filename: str
+    features: Tuple[str, ...]
+
+    def __post_init__(self):
+        # Запись заморожена, поэтому нормализуем поля через object.__setattr__
+        object.__setattr__(self, 'city', sys.intern(self.city))
+        object.__setattr__(self, 'type', sys.intern(self.type))
+        object.__setattr__(self, 'specialties', intern_tuple(self.specialties))
+        object.__setattr__(self, 'features', intern_tuple(self.features))
+
+    def __reduce__(self):
+        # Стандартный pickle для замороженных классов со __slots__ не работает
+        return self.__class__, tuple(getattr(self, name) for name in self.__slots__)
+
+    @classmethod
+    def from_university(cls, university: Any) -> "CompactUniversity":
+        """Создает компактную запись из University"""
+        return cls(*(getattr(university, name) for name in cls.__slots__))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'name_eng': self.name_eng,
+            'city': self.city,
+            'description': self.description,
+            'type': self.type,
+            'rating': self.rating,
+            'founding_year': self.founding_year,
+            'students_count': self.students_count,
+            'budget_places': self.budget_places,
+            'contact_email': self.contact_email,
+            'website': self.website,
+            'address': self.address,
+            'phone': self.phone,
+            'specialties': ', '.join(self.specialties),
+            'photo_filename': self.photo_filename,
+            'features': ', '.join(self.features)
+        }
+
+
+def compact_universities(universities: Iterable[Any]) -> List[CompactUniversity]:
+    """Преобразует список University в компактные записи"""
+    return [CompactUniversity.from_university(uni) for uni in universities]
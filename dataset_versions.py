@@ -0,0 +1,228 @@
+"""
+Версии данных каталога: снимки, изменения между ними и подписчики на изменения
+
+Снимок версии - id записей по позициям и хэш содержимого каждой записи.
+Сравнение двух снимков по id и хэшу дает набор изменений: добавленные,
+удаленные и измененные записи и отображение старых позиций в новые.
+Производные структуры (колонки, поисковый индекс, кэши выдачи и ответов API)
+получают изменения и обновляют только затронутые записи.
+
+Хэши считаются заново для каждого снимка, поэтому правка полей записи "на
+месте" тоже попадает в изменения. Это единственный проход по всем записям на
+Python; hash() строк кэшируется в самих строках, и на 20 тыс. записей он
+занимает десятки миллисекунд.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass, field
+from functools import cached_property
+from operator import attrgetter
+from typing import (TYPE_CHECKING, Callable, Dict, Hashable, Iterator, List, Optional,
+                    Sequence)
+
+import numpy as np
+
+from columnar import COLUMNS
+
+if TYPE_CHECKING:
+    from universities_data import University
+
+logger = logging.getLogger(__name__)
+
+
+ADDED = "added"
+REMOVED = "removed"
+MODIFIED = "modified"
+
+LIST_FIELDS = ('specialties', 'features')
+
+_scalar_fields = attrgetter(*[column for column in COLUMNS if column not in LIST_FIELDS])
+_list_fields = attrgetter(*LIST_FIELDS)
+
+
+def record_hash(university: "University") -> int:
+    """64-битный хэш содержимого записи по всем полям
+
+    Строится на встроенном hash() и зависит от процесса (PYTHONHASHSEED):
+    снимки сравниваются только внутри одного процесса.
+    """
+    return hash((_scalar_fields(university), *map(tuple, _list_fields(university))))
+
+
+def _record_keys(ids: List[str]) -> List[Hashable]:
+    """Ключи сопоставления записей: id, а при повторах - (id, номер повтора)"""
+    if len(set(ids)) == len(ids):
+        return ids
+    seen: Dict[str, int] = {}
+    keys: List[Hashable] = []
+    for university_id in ids:
+        number = seen.get(university_id, 0)
+        seen[university_id] = number + 1
+        keys.append(university_id if number == 0 else (university_id, number))
+    return keys
+
+
+class DatasetSnapshot:
+    """Снимок версии каталога: записи, их id и хэши содержимого"""
+
+    def __init__(self, universities: Sequence["University"], version: int = 0):
+        self.records: List["University"] = list(universities)
+        self.version = version
+        self.ids: List[str] = [uni.id for uni in self.records]
+        self.hashes = np.fromiter(map(record_hash, self.records), dtype=np.int64,
+                                  count=len(self.records))
+        self._keys: Optional[List[Hashable]] = None
+        self._positions: Optional[Dict[Hashable, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def keys(self) -> List[Hashable]:
+        if self._keys is None:
+            self._keys = _record_keys(self.ids)
+        return self._keys
+
+    @property
+    def positions(self) -> Dict[Hashable, int]:
+        """Ключ записи -> позиция"""
+        if self._positions is None:
+            self._positions = {key: position for position, key in enumerate(self.keys)}
+        return self._positions
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """Изменение одной записи; позиция None - записи нет в этой версии"""
+    kind: str  # ADDED, REMOVED или MODIFIED
+    university_id: str
+    old_position: Optional[int]
+    new_position: Optional[int]
+
+
+@dataclass
+class ChangeSet:
+    """Изменения между двумя версиями каталога
+
+    added и modified - позиции в новой версии, removed - в старой.
+    position_map: старая позиция -> новая (-1 - запись удалена),
+    source: новая позиция -> старая (-1 - запись добавлена).
+    """
+    old_version: int
+    new_version: int
+    added: np.ndarray
+    removed: np.ndarray
+    modified: np.ndarray
+    position_map: np.ndarray
+    source: np.ndarray
+    old_ids: List[str] = field(repr=False)
+    new_ids: List[str] = field(repr=False)
+
+    def __len__(self) -> int:
+        """Число измененных записей"""
+        return len(self.added) + len(self.removed) + len(self.modified)
+
+    @property
+    def size(self) -> int:
+        """Число записей в новой версии"""
+        return len(self.source)
+
+    @cached_property
+    def changed(self) -> np.ndarray:
+        """Отсортированные новые позиции добавленных и измененных записей"""
+        return np.union1d(self.added, self.modified)
+
+    @cached_property
+    def stale(self) -> np.ndarray:
+        """Маска по старым позициям: запись удалена или изменена"""
+        mask = self.position_map < 0
+        mask[self.source[self.modified]] = True
+        return mask
+
+    @cached_property
+    def positions_kept(self) -> bool:
+        """Старые записи остались на своих местах, новые только дописаны в конец"""
+        kept = len(self.position_map)
+        return (not len(self.removed)
+                and bool(np.all(self.source[:kept] == np.arange(kept))))
+
+    @property
+    def same_positions(self) -> bool:
+        """Записи остались на своих местах: нет добавленных, удаленных и перемещенных"""
+        return self.positions_kept and not len(self.added)
+
+    def remap(self, positions: np.ndarray) -> np.ndarray:
+        """Переводит старые позиции неизмененных записей в новые, остальные отбрасывает"""
+        positions = np.asarray(positions, dtype=np.int64)
+        mapped = self.position_map[positions]
+        keep = ~self.stale[positions]
+        return mapped[keep]
+
+    def events(self) -> Iterator[ChangeEvent]:
+        """События по записям: удаленные, измененные, добавленные"""
+        for position in self.removed.tolist():
+            yield ChangeEvent(REMOVED, self.old_ids[position], position, None)
+        for position in self.modified.tolist():
+            yield ChangeEvent(MODIFIED, self.new_ids[position], int(self.source[position]), position)
+        for position in self.added.tolist():
+            yield ChangeEvent(ADDED, self.new_ids[position], None, position)
+
+
+def diff_snapshots(old: DatasetSnapshot, new: DatasetSnapshot) -> ChangeSet:
+    """Сравнивает снимки по id записей и хэшам содержимого"""
+    size = len(new)
+    if old.ids == new.ids:
+        # Частый случай: те же записи на тех же местах, меняется только содержимое
+        source = np.arange(size, dtype=np.int64)
+    else:
+        old_positions = old.positions
+        source = np.fromiter((old_positions.get(key, -1) for key in new.keys),
+                             dtype=np.int64, count=size)
+
+    matched = source >= 0
+    modified = np.flatnonzero(matched)
+    modified = modified[old.hashes[source[modified]] != new.hashes[modified]]
+    position_map = np.full(len(old), -1, dtype=np.int64)
+    position_map[source[matched]] = np.flatnonzero(matched)
+    return ChangeSet(
+        old_version=old.version,
+        new_version=new.version,
+        added=np.flatnonzero(~matched),
+        removed=np.flatnonzero(position_map < 0),
+        modified=modified,
+        position_map=position_map,
+        source=source,
+        old_ids=old.ids,
+        new_ids=new.ids,
+    )
+
+
+_listeners: List[Callable[[ChangeSet], None]] = []
+_listeners_lock = threading.Lock()
+
+
+def subscribe(listener: Callable[[ChangeSet], None]) -> Callable[[ChangeSet], None]:
+    """Добавляет подписчика на изменения; можно использовать как декоратор"""
+    with _listeners_lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+    return listener
+
+
+def unsubscribe(listener: Callable[[ChangeSet], None]):
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def notify(changes: ChangeSet):
+    """Рассылает изменения подписчикам; ошибка подписчика не мешает остальным"""
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(changes)
+        except Exception:
+            logger.exception("Подписчик %r не обработал изменения версии %d",
+                             listener, changes.new_version)
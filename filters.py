@@ -0,0 +1,149 @@
+"""
+Векторный многокритериальный фильтр и ранжирование университетов
+"""
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from catalog import UniversityCatalog
+    from universities_data import University
+
+
+# Диапазон значений: (минимум, максимум), любая граница может быть None
+Range = Optional[Tuple[Optional[float], Optional[float]]]
+
+# Поля, по которым можно задавать диапазон и сортировать
+SORT_FIELDS = ('rating', 'founding_year', 'students_count', 'budget_places')
+
+# Значение фильтра типа, означающее "без ограничений"
+ANY_TYPE = "любой"
+
+
+@dataclass
+class UniversityFilter:
+    """Критерии отбора и сортировки университетов"""
+    query: str = ""
+    city: str = ""
+    uni_type: str = ""
+    rating: Range = None
+    founding_year: Range = None
+    students_count: Range = None
+    budget_places: Range = None
+    specialties: Sequence[str] = field(default_factory=tuple)
+    match_all_specialties: bool = False  # True - нужны все специальности, False - любая
+    sort_by: Optional[str] = None  # одно из SORT_FIELDS, None - порядок каталога
+    descending: bool = True
+    limit: Optional[int] = None
+
+
+def _apply_range(mask: np.ndarray, values: np.ndarray, bounds: Range):
+    """Сужает маску по диапазону значений"""
+    if bounds is None:
+        return
+    low, high = bounds
+    if low is not None:
+        mask &= values >= low
+    if high is not None:
+        mask &= values <= high
+
+
+def _specialty_mask(catalog: "UniversityCatalog", specialties: Sequence[str],
+                    match_all: bool) -> np.ndarray:
+    """Маска университетов, у которых есть выбранные специальности"""
+    columns = catalog.columns
+    table = columns.specialties
+    categories = table['specialty'].cat.categories
+    names = sorted({specialty.lower() for specialty in specialties})
+    wanted = {name: number for number, name in enumerate(names)}
+
+    # Код категории -> номер выбранной специальности
+    selected = np.full(len(categories), -1, dtype=np.int64)
+    for code, category in enumerate(categories):
+        selected[code] = wanted.get(category.lower(), -1)
+
+    codes = table['specialty'].cat.codes.to_numpy()
+    hits = selected[codes] >= 0 if len(codes) else np.zeros(0, dtype=bool)
+    positions = table['position'].to_numpy()[hits]
+
+    if not match_all:
+        return np.bincount(positions, minlength=len(columns)) > 0
+
+    # Считаем различные выбранные специальности у каждого университета
+    pairs = np.unique(positions * len(wanted) + selected[codes[hits]])
+    counts = np.bincount(pairs // len(wanted), minlength=len(columns))
+    return counts == len(wanted)
+
+
+def filter_mask(catalog: "UniversityCatalog", criteria: UniversityFilter) -> np.ndarray:
+    """Вычисляет булеву маску университетов, подходящих под критерии"""
+    columns = catalog.columns
+    mask = np.ones(len(columns), dtype=bool)
+
+    if criteria.query:
+        text_mask = np.zeros(len(columns), dtype=bool)
+        text_mask[catalog.search_positions(criteria.query)] = True
+        mask &= text_mask
+
+    if criteria.city:
+        mask &= np.isin(columns.city_codes, columns.category_codes('city', criteria.city))
+
+    if criteria.uni_type and criteria.uni_type != ANY_TYPE:
+        mask &= np.isin(columns.type_codes, columns.category_codes('type', criteria.uni_type))
+
+    for name in SORT_FIELDS:
+        _apply_range(mask, getattr(columns, name), getattr(criteria, name))
+
+    if criteria.specialties:
+        mask &= _specialty_mask(catalog, criteria.specialties, criteria.match_all_specialties)
+
+    return mask
+
+
+def rank_positions(catalog: "UniversityCatalog", positions: np.ndarray, sort_by: str,
+                   descending: bool = True, limit: Optional[int] = None) -> np.ndarray:
+    """Сортирует позиции по полю; при limit выбирает top-k без полной сортировки
+
+    При равных значениях сохраняется порядок каталога.
+    """
+    if sort_by not in SORT_FIELDS:
+        raise ValueError(f"Нельзя сортировать по полю {sort_by!r}, доступны: {', '.join(SORT_FIELDS)}")
+
+    keys = getattr(catalog.columns, sort_by)[positions].astype(np.float64)
+    if descending:
+        keys = -keys
+
+    if limit is not None and limit < len(keys):
+        if limit <= 0:
+            return positions[:0]
+        # Частичная сортировка: граница k-го элемента и только те, кто не хуже
+        kth = np.partition(keys, limit - 1)[limit - 1]
+        chosen = np.flatnonzero(keys <= kth)
+        order = chosen[np.lexsort((chosen, keys[chosen]))][:limit]
+    else:
+        order = np.lexsort((np.arange(len(keys)), keys))
+
+    return positions[order]
+
+
+def filter_positions(catalog: "UniversityCatalog", criteria: UniversityFilter) -> np.ndarray:
+    """Возвращает позиции подходящих университетов в порядке выдачи"""
+    positions = np.flatnonzero(filter_mask(catalog, criteria))
+    if criteria.sort_by:
+        return rank_positions(catalog, positions, criteria.sort_by,
+                              criteria.descending, criteria.limit)
+    if criteria.limit is not None:
+        return positions[:max(criteria.limit, 0)]
+    return positions
+
+
+def filter_universities(criteria: UniversityFilter,
+                        catalog: Optional["UniversityCatalog"] = None) -> List["University"]:
+    """Возвращает университеты, подходящие под критерии"""
+    if catalog is None:
+        from universities_data import get_catalog
+        catalog = get_catalog()
+
+    return catalog.records(filter_positions(catalog, criteria).tolist())
@@ -0,0 +1,180 @@
+"""
+Нечеткий поиск с транслитерацией: опечатки и латиница вместо кириллицы
+
+Все тексты приводятся к латинскому "скелету" (кириллица, включая казахские
+буквы, транслитерируется, похожие по звучанию сочетания сворачиваются),
+после чего слова сравниваются по общим триграммам. Триграммный индекс строится
+по словарю слов каталога, поэтому запрос не сравнивается с каждой записью.
+"""
+
+import re
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from universities_data import University
+
+
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya',
+    # Казахские буквы
+    'ә': 'a', 'ғ': 'g', 'қ': 'k', 'ң': 'n', 'ө': 'o', 'ұ': 'u', 'ү': 'u', 'һ': 'h',
+    'і': 'i',
+}
+
+# Сворачивание вариантов латинской записи к одному виду
+LATIN_FOLDS = {'q': 'k', 'x': 'ks', 'w': 'v', 'y': 'i', 'j': 'i'}
+
+_C_RE = re.compile(r"c(?!h)")
+_DOUBLE_RE = re.compile(r"(\w)\1+")
+
+
+def _fold_digraphs(text: str) -> str:
+    """Сворачивает латинские сочетания: ck, ph, c (не ch), kh"""
+    if "c" in text:
+        text = _C_RE.sub("k", text.replace("ck", "k"))
+    return text.replace("ph", "f").replace("kh", "h")
+
+
+# Одна таблица: транслитерация кириллицы и замены отдельных латинских букв
+_SKELETON_TABLE = str.maketrans({
+    **LATIN_FOLDS,
+    **{letter: _fold_digraphs(latin).translate(str.maketrans(LATIN_FOLDS))
+       for letter, latin in CYRILLIC_TO_LATIN.items()},
+})
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+# Минимальная близость слова запроса к слову каталога
+TERM_THRESHOLD = 0.3
+
+# Минимальная итоговая оценка записи
+MIN_SCORE = 0.35
+
+
+@lru_cache(maxsize=100_000)
+def skeleton(text: str) -> str:
+    """Приводит текст к латинскому скелету для нечеткого сравнения"""
+    text = _fold_digraphs(text.lower()).translate(_SKELETON_TABLE)
+    return _DOUBLE_RE.sub(r"\1", text)
+
+
+def skeleton_words(text: str) -> List[str]:
+    """Разбивает текст на слова-скелеты"""
+    return _WORD_RE.findall(skeleton(text))
+
+
+def trigrams(word: str) -> Set[str]:
+    """Триграммы слова с отступами, как в pg_trgm: начало слова весит больше"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def acronyms(name: str) -> Set[str]:
+    """Сокращения названия: "Kazakh National University" -> knu, kaznu"""
+    words = [word for word in re.split(r"[\s\-.]+", name) if word[:1].isupper()]
+    result = set()
+    for start in range(len(words)):
+        rest = words[start + 1:]
+        if not rest:
+            break
+        initials = "".join(word[0] for word in rest)
+        result.add((words[start][0] + initials).lower())
+        result.add((words[start][:3] + initials).lower())
+    return result
+
+
+def fuzzy_terms(university: "University") -> Set[str]:
+    """Слова-скелеты записи: name, name_eng, city, specialties, id и сокращения"""
+    words = set()
+    for text in (university.name, university.name_eng, university.city, *university.specialties):
+        words.update(skeleton_words(text))
+    words.update(skeleton_words(university.id.replace("_", " ")))
+    words.add(skeleton(university.id))
+    for acronym in acronyms(university.name_eng):
+        words.add(skeleton(acronym))
+    return words
+
+
+class FuzzySearchIndex:
+    """Триграммный индекс по словарю слов каталога"""
+
+    def __init__(self, universities: Sequence["University"], term_threshold: float = TERM_THRESHOLD):
+        self.universities = list(universities)
+        self.term_threshold = term_threshold
+
+        term_ids: Dict[str, int] = {}
+        term_records: List[List[int]] = []
+        for position, uni in enumerate(self.universities):
+            for word in fuzzy_terms(uni):
+                term_id = term_ids.setdefault(word, len(term_ids))
+                if term_id == len(term_records):
+                    term_records.append([])
+                term_records[term_id].append(position)
+
+        self.terms = list(term_ids)
+        self._term_records = [np.asarray(records, dtype=np.int64) for records in term_records]
+
+        gram_terms: Dict[str, List[int]] = {}
+        self._term_sizes = np.zeros(len(self.terms), dtype=np.float64)
+        for term_id, term in enumerate(self.terms):
+            grams = trigrams(term)
+            self._term_sizes[term_id] = len(grams)
+            for gram in grams:
+                gram_terms.setdefault(gram, []).append(term_id)
+        self._gram_terms = {gram: np.asarray(ids, dtype=np.int64) for gram, ids in gram_terms.items()}
+
+    def similar_terms(self, word: str) -> List[Tuple[int, float]]:
+        """Слова каталога, близкие к слову (коэффициент Жаккара по триграммам)"""
+        grams = trigrams(word)
+        postings = [self._gram_terms[gram] for gram in grams if gram in self._gram_terms]
+        if not postings:
+            return []
+
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.terms))
+        candidates = np.flatnonzero(shared)
+        similarity = shared[candidates] / (len(grams) + self._term_sizes[candidates] - shared[candidates])
+        keep = similarity >= self.term_threshold
+        return list(zip(candidates[keep].tolist(), similarity[keep].tolist()))
+
+    def scores(self, query: str) -> np.ndarray:
+        """Оценка каждой записи: средняя по словам запроса лучшая близость"""
+        words = skeleton_words(query)
+        scores = np.zeros(len(self.universities), dtype=np.float64)
+        if not words:
+            return scores
+
+        for word in words:
+            best = np.zeros(len(self.universities), dtype=np.float64)
+            for term_id, similarity in self.similar_terms(word):
+                records = self._term_records[term_id]
+                best[records] = np.maximum(best[records], similarity)
+            scores += best
+        return scores / len(words)
+
+    def search_positions(self, query: str, k: Optional[int] = None,
+                         min_score: float = MIN_SCORE) -> List[Tuple[int, float]]:
+        """Возвращает пары (позиция, оценка) по убыванию оценки"""
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores >= min_score)
+        if k is not None and len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        order = matched[np.lexsort((matched, -scores[matched]))]
+        return [(position, float(scores[position])) for position in order.tolist()]
+
+    def search(self, query: str, k: Optional[int] = None,
+               min_score: float = MIN_SCORE) -> List["University"]:
+        """Возвращает университеты, похожие на запрос, от лучшего к худшему"""
+        return [self.universities[position] for position, _ in self.search_positions(query, k, min_score)]
+
+
+def fuzzy_search_universities(query: str, k: Optional[int] = None) -> List["University"]:
+    """Нечеткий поиск по каталогу с учетом опечаток и транслитерации"""
+    from universities_data import get_catalog
+    return get_catalog().fuzzy_index.search(query, k)
@@ -0,0 +1,127 @@
+"""
+Гибридный поиск: BM25 и векторный поиск, объединенные через reciprocal rank fusion
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from filters import UniversityFilter, filter_mask
+
+if TYPE_CHECKING:
+    from catalog import UniversityCatalog
+    from universities_data import University
+
+
+# Константа RRF: чем больше, тем меньше вес верхних позиций
+RRF_K = 60
+
+# Сколько кандидатов берет каждая стадия перед слиянием
+STAGE_CANDIDATES = 50
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Общий пул потоков для стадий поиска"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-search")
+    return _executor
+
+
+@dataclass
+class HybridResult:
+    """Результат гибридного поиска с временем каждой стадии в миллисекундах"""
+    universities: List["University"] = field(default_factory=list)
+    scores: List[float] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    stages: List[str] = field(default_factory=list)  # стадии, давшие результат
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], rrf_k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Объединяет ранжированные списки позиций: score = sum(1 / (rrf_k + rank))"""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking, start=1):
+            fused[position] = fused.get(position, 0.0) + 1.0 / (rrf_k + rank)
+    # При равной оценке сохраняется порядок каталога
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+
+
+def _timed(func, *args):
+    """Выполняет функцию и возвращает (результат, время в мс)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _bm25_stage(catalog: "UniversityCatalog", query: str, mask: Optional[np.ndarray],
+                candidates: int) -> List[int]:
+    return [position for position, _ in catalog.bm25_index.top(query, candidates, mask)]
+
+
+def _vector_stage(catalog: "UniversityCatalog", query: str, mask: Optional[np.ndarray],
+                  candidates: int) -> Optional[List[int]]:
+    """Позиции из семантического индекса; None, если модель еще не загружена"""
+    from resources import get_semantic_index, is_ai_ready
+
+    if not is_ai_ready():
+        return None
+
+    # При фильтре берем кандидатов с запасом, часть отсеется
+    k = candidates if mask is None else candidates * 5
+    positions = []
+    for uni, _ in get_semantic_index().search(query, k):
+        position = catalog.position(uni.id)
+        if position is not None and (mask is None or mask[position]):
+            positions.append(position)
+    return positions[:candidates]
+
+
+def hybrid_search(query: str, k: int = 10, city: str = "", uni_type: str = "",
+                  rrf_k: int = RRF_K, candidates: int = STAGE_CANDIDATES,
+                  catalog: Optional["UniversityCatalog"] = None) -> HybridResult:
+    """Ищет университеты по BM25 и по смыслу одновременно и объединяет результаты
+
+    city и uni_type работают как предварительный фильтр для обеих стадий.
+    Если модель эмбеддингов еще не готова, используется только BM25.
+    """
+    if catalog is None:
+        from universities_data import get_catalog
+        catalog = get_catalog()
+
+    result = HybridResult()
+    total_start = time.perf_counter()
+    if not query.strip():
+        return result
+
+    mask = None
+    if city or uni_type:
+        mask, result.timings["prefilter"] = _timed(
+            filter_mask, catalog, UniversityFilter(city=city, uni_type=uni_type))
+
+    # Обе стадии выполняются параллельно
+    executor = _get_executor()
+    bm25_future = executor.submit(_timed, _bm25_stage, catalog, query, mask, candidates)
+    vector_future = executor.submit(_timed, _vector_stage, catalog, query, mask, candidates)
+    bm25_positions, result.timings["bm25"] = bm25_future.result()
+    vector_positions, result.timings["vector"] = vector_future.result()
+
+    rankings = [bm25_positions]
+    result.stages.append("bm25")
+    if vector_positions is not None:
+        rankings.append(vector_positions)
+        result.stages.append("vector")
+
+    fused, result.timings["fusion"] = _timed(reciprocal_rank_fusion, rankings, rrf_k)
+    universities = catalog.universities
+    for position, score in fused[:k]:
+        result.universities.append(universities[position])
+        result.scores.append(score)
+
+    result.timings["total"] = (time.perf_counter() - total_start) * 1000
+    return result
@@ -0,0 +1,240 @@
+"""
+Метрики производительности: время вызовов, счетчики, экспорт для Prometheus
+
+Включаются переменной окружения METRICS=1 при запуске. В выключенном режиме
+декоратор timed возвращает функцию без обертки, поэтому инструментирование
+ничего не стоит. Во включенном режиме для каждой функции копится гистограмма
+времени, а вызовы текущего перезапуска страницы собираются в RerunTimings:
+полное время и собственное (без вложенных инструментированных вызовов).
+
+Экспорт в текстовом формате Prometheus: HTTP на METRICS_PORT (путь /metrics)
+и/или файл METRICS_FILE, который перезаписывается после каждого перезапуска.
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+ENABLED = os.environ.get("METRICS", "0") == "1"
+
+PREFIX = "universities"
+
+# Границы корзин гистограммы времени (секунды)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Histogram:
+    __slots__ = ("buckets", "count", "total")
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+
+class Registry:
+    """Накопленные метрики процесса"""
+
+    def __init__(self):
+        self._histograms: Dict[str, _Histogram] = {}
+        self._counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, function: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(function)
+            if histogram is None:
+                histogram = self._histograms[function] = _Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        name = f"{PREFIX}_call_duration_seconds"
+        lines = [f"# HELP {name} Время вызова инструментированных функций",
+                 f"# TYPE {name} histogram"]
+        with self._lock:
+            for function, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{function="{function}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{function="{function}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{function="{function}"}} {histogram.total:.6f}')
+                lines.append(f'{name}_count{{function="{function}"}} {histogram.count}')
+            for counter, value in sorted(self._counters.items()):
+                metric = f"{PREFIX}_{counter}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value:g}"]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+@dataclass
+class RerunTimings:
+    """Вызовы за один перезапуск страницы: функция -> [вызовов, всего с, собственное с]"""
+    started: float = field(default_factory=time.perf_counter)
+    finished: Optional[float] = None
+    calls: Dict[str, List[float]] = field(default_factory=dict)
+
+    def record(self, function: str, seconds: float, self_seconds: float):
+        entry = self.calls.get(function)
+        if entry is None:
+            entry = self.calls[function] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += self_seconds
+
+    @property
+    def total_ms(self) -> float:
+        return ((self.finished or time.perf_counter()) - self.started) * 1000
+
+    def breakdown(self) -> List[Tuple[str, int, float, float]]:
+        """(функция, вызовов, всего мс, собственное мс) по убыванию собственного времени"""
+        rows = [(function, int(count), total * 1000, own * 1000)
+                for function, (count, total, own) in self.calls.items()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+
+# Streamlit выполняет каждый перезапуск скрипта в своем потоке
+_local = threading.local()
+
+
+def timed(name: Optional[str] = None) -> Callable:
+    """Декоратор: время вызова в гистограмму и в разбивку текущего перезапуска"""
+    def decorator(func):
+        if not ENABLED:
+            return func
+        function = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = getattr(_local, "stack", None)
+            if stack is None:
+                stack = _local.stack = []
+            stack.append(0.0)  # время вложенных вызовов
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                children = stack.pop()
+                if stack:
+                    stack[-1] += seconds
+                registry.observe(function, seconds)
+                rerun = getattr(_local, "rerun", None)
+                if rerun is not None:
+                    rerun.record(function, seconds, seconds - children)
+
+        return wrapper
+
+    return decorator
+
+
+def increment(name: str, value: float = 1):
+    """Увеличивает счетчик (экспортируется как universities_<name>_total)"""
+    if ENABLED:
+        registry.increment(name, value)
+
+
+def begin_rerun() -> Optional[RerunTimings]:
+    """Начинает сбор разбивки для перезапуска, выполняемого в этом потоке"""
+    if not ENABLED:
+        return None
+    _local.rerun = RerunTimings()
+    _local.stack = []
+    registry.increment("reruns")
+    return _local.rerun
+
+
+def end_rerun() -> Optional[RerunTimings]:
+    """Завершает сбор разбивки и обновляет файл с метриками"""
+    rerun = getattr(_local, "rerun", None)
+    if rerun is None:
+        return None
+    rerun.finished = time.perf_counter()
+    _local.rerun = None
+    registry.observe("rerun", rerun.finished - rerun.started)
+
+    path = os.environ.get("METRICS_FILE")
+    if path:
+        write_prometheus(path)
+    return rerun
+
+
+_write_lock = threading.Lock()
+
+
+def write_prometheus(path: str):
+    """Записывает метрики в файл (атомарно, для textfile-коллектора node_exporter)
+
+    Запись из разных потоков идет по очереди, а временный файл у каждого
+    потока свой, поэтому os.replace не подхватит чужой или уже перенесенный файл.
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with _write_lock:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(registry.render())
+        os.replace(temp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_exporter(port: Optional[int] = None, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Запускает HTTP-экспортер /metrics один раз на процесс (порт из METRICS_PORT)"""
+    global _server
+    if not ENABLED:
+        return None
+    if port is None:
+        if not os.environ.get("METRICS_PORT"):
+            return None
+        port = int(os.environ["METRICS_PORT"])
+
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as error:
+                logger.warning("Не удалось запустить экспортер метрик на порту %s: %s", port, error)
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-exporter",
+                             daemon=True).start()
+    return _server
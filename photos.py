@@ -0,0 +1,193 @@
+"""
+Фотографии университетов: индекс файлов и кэш уменьшенных копий
+
+Каталог university_photos сканируется не чаще раза в SCAN_INTERVAL: для
+каждого файла запоминаются время изменения и размер, поэтому замечаются и
+новые или удаленные файлы, и перезапись на месте. Выдача фото - поиск в
+словарях, без обращений к файловой системе. Для карточек и страниц
+отдаются уменьшенные JPEG, которые хранятся на диске под именем из хэша
+содержимого оригинала; хэш и уменьшенная копия готовятся при первом
+запросе, под блокировкой только этого файла. Копии замененных и удаленных
+фото убираются при сканировании.
+"""
+
+import contextlib
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+PHOTOS_DIR = "university_photos"
+THUMBNAILS_DIRNAME = ".thumbnails"
+
+# Максимальные размеры (ширина, высота) для каждого варианта
+VARIANTS: Dict[str, Tuple[int, int]] = {
+    "card": (480, 320),
+    "page": (1200, 800),
+}
+
+JPEG_QUALITY = 82
+
+# Как часто проверять каталог на изменения (секунды)
+SCAN_INTERVAL = 2.0
+
+
+class PhotoStore:
+    """Индекс фотографий и генератор уменьшенных копий"""
+
+    def __init__(self, photos_dir: str = PHOTOS_DIR, scan_interval: float = SCAN_INTERVAL):
+        self.photos_dir = photos_dir
+        self.thumbnails_dir = os.path.join(photos_dir, THUMBNAILS_DIRNAME)
+        self.scan_interval = scan_interval
+
+        self._files: Dict[str, Tuple[int, int]] = {}  # имя -> (mtime_ns, размер)
+        self._hashes: Dict[Tuple[str, int, int], str] = {}  # (имя, mtime_ns, размер) -> хэш
+        self._variants: Dict[Tuple[str, str], str] = {}  # (хэш, вариант) -> путь
+        self._file_locks: Dict[Tuple[str, str], threading.Lock] = {}  # (имя, вариант)
+        self._checked_at = float("-inf")
+        self._scan_lock = threading.Lock()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """Список файлов каталога с временем изменения и размером"""
+        files = {}
+        try:
+            with os.scandir(self.photos_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.startswith("."):
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            pass
+        return files
+
+    def refresh(self, force: bool = False):
+        """Пересканирует каталог (не чаще scan_interval) и убирает копии замененных фото
+
+        Сканирует один поток, остальные тем временем работают с прежним индексом.
+        """
+        if not force and time.monotonic() - self._checked_at < self.scan_interval:
+            return
+        if not self._scan_lock.acquire(blocking=force):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            files = self._scan()
+            # list(): другие потоки тем временем дописывают хэши
+            stale = [key for key in list(self._hashes) if files.get(key[0]) != key[1:]]
+            self._files = files
+            self._prune(stale)
+        finally:
+            self._scan_lock.release()
+
+    def _prune(self, stale):
+        """Забывает хэши устаревших версий файлов и удаляет копии, на которые больше никто не ссылается"""
+        digests: Set[str] = {self._hashes.pop(key) for key in stale if key in self._hashes}
+        digests -= set(self._hashes.values())
+        for name in {key[0] for key in stale} - set(self._files):
+            for variant in VARIANTS:
+                self._file_locks.pop((name, variant), None)
+        for digest in digests:
+            for variant in VARIANTS:
+                self._variants.pop((digest, variant), None)
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(self.thumbnails_dir, f"{digest}_{variant}.jpg"))
+
+    def exists(self, filename: str) -> bool:
+        """Есть ли фото с таким именем"""
+        self.refresh()
+        return filename in self._files
+
+    def original_path(self, filename: str) -> Optional[str]:
+        """Путь к оригиналу или None"""
+        return os.path.join(self.photos_dir, filename) if self.exists(filename) else None
+
+    def _content_hash(self, filename: str) -> str:
+        hasher = hashlib.sha1()
+        with open(os.path.join(self.photos_dir, filename), "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(block)
+        return hasher.hexdigest()[:20]
+
+    def _make_thumbnail(self, source: str, target: str, size: Tuple[int, int]):
+        """Создает уменьшенную копию; запись атомарная"""
+        from PIL import Image, ImageOps
+
+        metrics.increment("thumbnails_generated")
+        os.makedirs(self.thumbnails_dir, exist_ok=True)
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(size, Image.LANCZOS)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            temp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            image.save(temp_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        os.replace(temp_path, target)
+
+    def get(self, filename: str, variant: str = "card") -> Optional[str]:
+        """Возвращает путь к фото нужного размера или None, если фото нет
+
+        Если уменьшить изображение не удалось, возвращается оригинал.
+        """
+        if not filename:
+            return None
+        if variant not in VARIANTS:
+            raise ValueError(f"Неизвестный вариант фото {variant!r}, доступны: {', '.join(VARIANTS)}")
+        self.refresh()
+        stat = self._files.get(filename)
+        if stat is None:
+            return None
+
+        key = (filename, *stat)
+        digest = self._hashes.get(key)
+        path = self._variants.get((digest, variant)) if digest is not None else None
+        if path is not None:
+            return path
+
+        # Первый запрос этой версии файла: хэш и уменьшенная копия готовятся
+        # под блокировкой только этого файла, остальные фото выдаются без ожидания
+        try:
+            with self._file_locks.setdefault((filename, variant), threading.Lock()):
+                digest = self._hashes.get(key)
+                if digest is None:
+                    digest = self._content_hash(filename)
+                    self._hashes[key] = digest
+                path = self._variants.get((digest, variant))
+                if path is None:
+                    path = os.path.join(self.thumbnails_dir, f"{digest}_{variant}.jpg")
+                    if not os.path.exists(path):
+                        self._make_thumbnail(os.path.join(self.photos_dir, filename), path,
+                                             VARIANTS[variant])
+                    self._variants[(digest, variant)] = path
+            return path
+        except (OSError, KeyError) as error:
+            # Файл пропал между сканированиями или не читается как изображение
+            logger.warning("Не удалось подготовить фото %s: %s", filename, error)
+            original = os.path.join(self.photos_dir, filename)
+            return original if os.path.exists(original) else None
+
+
+_store: Optional[PhotoStore] = None
+_store_lock = threading.Lock()
+
+
+def get_photo_store() -> PhotoStore:
+    """Общий для процесса индекс фотографий"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PhotoStore()
+    return _store
+
+
+@metrics.timed()
+def get_photo(filename: str, variant: str = "card") -> Optional[str]:
+    """Путь к фото университета нужного размера или None"""
+    return get_photo_store().get(filename, variant)
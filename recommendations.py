@@ -0,0 +1,335 @@
+"""
+Пакетный подбор университетов для абитуриентов
+
+Профиль абитуриента - желаемые специальности с весами, город, минимальный
+рейтинг и требование к числу бюджетных мест. Профили читаются из CSV или
+JSONL порциями и оцениваются сразу против всего каталога матричными
+операциями: веса специальностей профилей (профили x специальности)
+умножаются на one-hot матрицу специальностей университетов
+(специальности x университеты). Порции распределяются по процессам.
+
+Оценка = доля веса желаемых специальностей, которые есть в университете,
++ RATING_WEIGHT * рейтинг / 10 + CITY_BONUS за совпадение города.
+Минимальный рейтинг и бюджетные места - жесткие условия; если у профиля
+есть специальности, университет без единой из них не рекомендуется.
+
+Запуск: python recommendations.py profiles.csv recommendations.jsonl --top-k 5 --workers 4
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from catalog import UniversityCatalog
+
+
+TOP_K = 5
+CHUNK_SIZE = 2000
+
+RATING_WEIGHT = 0.2
+CITY_BONUS = 0.1
+
+# Сколько ячеек матрицы оценок (профили x университеты) считать за раз
+MAX_SCORE_CELLS = 2_000_000
+
+# Пары (позиция университета в каталоге, оценка)
+Ranking = List[Tuple[int, float]]
+
+
+@dataclass
+class ApplicantProfile:
+    """Запрос одного абитуриента"""
+    applicant_id: str
+    specialties: Dict[str, float] = field(default_factory=dict)  # специальность -> вес
+    city: str = ""
+    min_rating: float = 0.0
+    min_budget_places: int = 0
+
+
+def parse_specialties(value: Any) -> Dict[str, float]:
+    """Специальности с весами из словаря, списка или строки "IT:2; Математика"
+
+    Без явного веса специальность получает вес 1.
+    """
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return {str(name).strip(): float(weight) for name, weight in value.items()}
+    if isinstance(value, str):
+        value = [item for item in re.split(r"[;|]", value) if item.strip()]
+
+    weights: Dict[str, float] = {}
+    for item in value:
+        name, separator, weight = str(item).rpartition(":")
+        if not separator:
+            name, weight = weight, ""
+        weights[name.strip()] = float(weight) if weight.strip() else 1.0
+    return weights
+
+
+def profile_from_record(record: Dict[str, Any]) -> ApplicantProfile:
+    """Профиль из строки CSV или объекта JSONL"""
+    budget = record.get("min_budget_places")
+    if budget in (None, "") and str(record.get("needs_budget", "")).lower() in ("1", "true", "да", "yes"):
+        budget = 1
+    return ApplicantProfile(
+        applicant_id=str(record["applicant_id"]),
+        specialties=parse_specialties(record.get("specialties")),
+        city=(record.get("city") or "").strip(),
+        min_rating=float(record.get("min_rating") or 0),
+        min_budget_places=int(float(budget or 0)),
+    )
+
+
+def read_profiles(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[List[ApplicantProfile]]:
+    """Читает профили из .csv или .jsonl порциями, не загружая файл целиком"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            records: Iterable[Dict[str, Any]] = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+
+        chunk: List[ApplicantProfile] = []
+        for record in records:
+            chunk.append(profile_from_record(record))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class RecommendationModel:
+    """Массивы каталога для оценки профилей; передается в процессы целиком"""
+
+    def __init__(self, ids: Sequence[str], specialty_codes: Dict[str, int],
+                 specialty_matrix: np.ndarray, rating: np.ndarray, budget_places: np.ndarray,
+                 city_codes: np.ndarray, city_index: Dict[str, int]):
+        self.ids = list(ids)
+        self.specialty_codes = specialty_codes  # специальность в нижнем регистре -> строка матрицы
+        self.specialty_matrix = specialty_matrix  # специальности x университеты, float32
+        self.rating = rating
+        self.budget_places = budget_places
+        self.city_codes = city_codes
+        self.city_index = city_index  # город в нижнем регистре -> код
+
+        # Постоянные части оценки и условия в float32 для операций над блоком
+        self._rating_bonus = (RATING_WEIGHT * rating / 10).astype(np.float32)
+        self._budget = budget_places.astype(np.float32)
+        self._city_matrix = np.zeros((len(city_index), len(self.ids)), dtype=np.float32)
+        self._city_matrix[city_codes, np.arange(len(self.ids))] = CITY_BONUS
+
+    @classmethod
+    def from_catalog(cls, catalog: "UniversityCatalog") -> "RecommendationModel":
+        columns = catalog.columns
+        table = columns.specialties
+        specialty = table['specialty']
+        categories = [name.lower() for name in specialty.cat.categories]
+
+        # Одинаковые без учета регистра специальности сводятся к одной строке
+        specialty_codes: Dict[str, int] = {}
+        rows = np.asarray([specialty_codes.setdefault(name, len(specialty_codes))
+                           for name in categories], dtype=np.int64)
+        matrix = np.zeros((len(specialty_codes), len(columns)), dtype=np.float32)
+        matrix[rows[specialty.cat.codes.to_numpy()], table['position'].to_numpy()] = 1.0
+
+        cities = columns.frame['city'].cat.categories
+        return cls(
+            ids=columns.frame['id'].tolist(),
+            specialty_codes=specialty_codes,
+            specialty_matrix=matrix,
+            rating=columns.rating,
+            budget_places=columns.budget_places,
+            city_codes=columns.city_codes,
+            city_index={city.lower(): code for code, city in enumerate(cities)},
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _profile_arrays(self, profiles: Sequence[ApplicantProfile]):
+        weights = np.zeros((len(profiles), len(self.specialty_codes)), dtype=np.float32)
+        totals = np.zeros(len(profiles), dtype=np.float32)
+        cities = np.zeros((len(profiles), len(self.city_index)), dtype=np.float32)
+        for row, profile in enumerate(profiles):
+            for name, weight in profile.specialties.items():
+                totals[row] += weight
+                column = self.specialty_codes.get(name.lower())
+                if column is not None:
+                    weights[row, column] += weight
+            code = self.city_index.get(profile.city.lower()) if profile.city else None
+            if code is not None:
+                cities[row, code] = 1.0
+        min_rating = np.asarray([profile.min_rating for profile in profiles], dtype=np.float64)
+        min_budget = np.asarray([profile.min_budget_places for profile in profiles], dtype=np.float32)
+        return weights, totals, min_rating, min_budget, cities
+
+    def scores(self, profiles: Sequence[ApplicantProfile]) -> np.ndarray:
+        """Матрица оценок профили x университеты; неподходящие - -inf"""
+        weights, totals, min_rating, min_budget, cities = self._profile_arrays(profiles)
+
+        # Операции на месте над одной матрицей float32: блок профилей x весь каталог
+        scores = weights @ self.specialty_matrix  # вес совпавших специальностей
+        has_specialties = totals > 0
+        excluded = (scores == 0) & has_specialties[:, None]
+        excluded |= self.rating[None, :] < min_rating[:, None]
+        excluded |= self._budget[None, :] < min_budget[:, None]
+
+        scores /= np.where(has_specialties, totals, 1)[:, None]
+        scores += self._rating_bonus
+        scores += cities @ self._city_matrix
+        np.putmask(scores, excluded, -np.inf)
+        return scores
+
+    def top_k(self, profiles: Sequence[ApplicantProfile], k: int = TOP_K) -> List[Ranking]:
+        """Лучшие k университетов для каждого профиля"""
+        if not len(self):
+            return [[] for _ in profiles]
+        k = min(k, len(self))
+        block = max(1, MAX_SCORE_CELLS // len(self))
+        rankings: List[Ranking] = []
+        for start in range(0, len(profiles), block):
+            scores = self.scores(profiles[start:start + block])
+            kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+            for row, threshold in zip(scores, kth):
+                # Все, кто не хуже k-й оценки: при равной оценке выше университет,
+                # стоящий раньше в каталоге
+                positions = np.flatnonzero(row >= threshold) if threshold > -np.inf \
+                    else np.flatnonzero(row > -np.inf)
+                order = positions[np.lexsort((positions, -row[positions]))][:k]
+                rankings.append([(position, round(float(row[position]), 6)) for position in order.tolist()])
+        return rankings
+
+
+def recommend(profiles: Sequence[ApplicantProfile], k: int = TOP_K,
+              model: Optional[RecommendationModel] = None) -> Dict[str, List[Tuple[str, float]]]:
+    """Рекомендации в текущем процессе: id абитуриента -> [(id университета, оценка)]"""
+    if model is None:
+        from universities_data import get_catalog
+        model = RecommendationModel.from_catalog(get_catalog())
+    return {profile.applicant_id: [(model.ids[position], score) for position, score in ranking]
+            for profile, ranking in zip(profiles, model.top_k(profiles, k))}
+
+
+# Модель в процессе-обработчике, передается один раз при запуске процесса
+_worker_model: Optional[RecommendationModel] = None
+
+
+def _init_worker(model: RecommendationModel):
+    global _worker_model
+    _worker_model = model
+
+
+def _score_chunk(profiles: List[ApplicantProfile], k: int) -> List[Ranking]:
+    return _worker_model.top_k(profiles, k)
+
+
+def score_chunks(chunks: Iterable[List[ApplicantProfile]], model: RecommendationModel,
+                 k: int = TOP_K, workers: int = 1) -> Iterator[Tuple[List[ApplicantProfile], List[Ranking]]]:
+    """Оценивает порции профилей, сохраняя порядок
+
+    Обрабатывается не больше 2 * workers порций одновременно, поэтому
+    входной файл читается по мере обработки.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield chunk, model.top_k(chunk, k)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model,)) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, executor.submit(_score_chunk, chunk, k)))
+            if len(pending) >= 2 * workers:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+
+
+class RecommendationWriter:
+    """Пишет рекомендации в .csv (строка на рекомендацию) или .jsonl (строка на профиль)"""
+
+    def __init__(self, path: str, model: RecommendationModel, names: Sequence[str]):
+        self.path = path
+        self.model = model
+        self.names = names
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._csv = None
+        if path.endswith(".csv"):
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(["applicant_id", "rank", "university_id", "university_name", "score"])
+
+    def write(self, profile: ApplicantProfile, ranking: Ranking):
+        if self._csv is not None:
+            for rank, (position, score) in enumerate(ranking, start=1):
+                self._csv.writerow([profile.applicant_id, rank, self.model.ids[position],
+                                    self.names[position], f"{score:.4f}"])
+        else:
+            self._file.write(json.dumps({
+                "applicant_id": profile.applicant_id,
+                "recommendations": [
+                    {"id": self.model.ids[position], "name": self.names[position],
+                     "score": round(score, 4)}
+                    for position, score in ranking
+                ],
+            }, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def recommend_file(input_path: str, output_path: str, k: int = TOP_K, workers: int = 1,
+                   chunk_size: int = CHUNK_SIZE) -> int:
+    """Подбирает университеты для всех профилей файла; возвращает число профилей"""
+    from universities_data import get_catalog
+
+    catalog = get_catalog()
+    model = RecommendationModel.from_catalog(catalog)
+    names = catalog.columns.frame['name'].tolist()
+
+    processed = 0
+    with RecommendationWriter(output_path, model, names) as writer:
+        for chunk, rankings in score_chunks(read_profiles(input_path, chunk_size), model, k, workers):
+            for profile, ranking in zip(chunk, rankings):
+                writer.write(profile, ranking)
+            processed += len(chunk)
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный подбор университетов для абитуриентов")
+    parser.add_argument("input", help="профили: .csv или .jsonl")
+    parser.add_argument("output", help="рекомендации: .csv или .jsonl")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="число процессов (1 - без пула)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = recommend_file(args.input, args.output, args.top_k, args.workers, args.chunk_size)
+    seconds = time.perf_counter() - start
+    print(f"Профилей: {count}, время: {seconds:.1f} с ({count / max(seconds, 1e-9):.0f} профилей/с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Общие ресурсы процесса: модель эмбеддингов и семантический индекс
+
+Ресурсы загружаются один раз на процесс и используются всеми сессиями
+Streamlit только для чтения. В отличие от st.cache_resource, загрузку
+можно запустить в фоновом потоке при старте, не блокируя первую отрисовку.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from dataset_versions import ChangeSet, subscribe
+from semantic_search import DEFAULT_INDEX_DIR, DEFAULT_MODEL_NAME, SemanticIndex, SentenceTransformerEncoder
+
+logger = logging.getLogger(__name__)
+
+# Прогрев можно отключить (например, в тестах): AI_WARMUP=0
+WARMUP_ENABLED = os.environ.get("AI_WARMUP", "1") != "0"
+
+# Состояния ресурса
+NOT_STARTED = "not_started"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class SharedResource:
+    """Ресурс процесса, который загружается ровно один раз"""
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self._loader = loader
+        self._value = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.state = NOT_STARTED
+        self.error: Optional[BaseException] = None
+        self.started_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def get(self) -> Any:
+        """Возвращает ресурс, при необходимости загружая его в текущем потоке
+
+        Неудачная загрузка запоминается: до reset() ресурс сразу сообщает
+        прежнюю ошибку, а не пытается загрузиться на каждом запросе.
+        """
+        if self.state == READY:
+            return self._value
+        if self.state != FAILED:
+            with self._lock:
+                if self.state not in (READY, FAILED):
+                    self._load()
+        if self.state == FAILED:
+            raise RuntimeError(f"Не удалось загрузить ресурс {self.name}") from self.error
+        return self._value
+
+    def _load(self):
+        """Загружает ресурс; вызывается под блокировкой"""
+        self.state = LOADING
+        self.started_at = time.monotonic()
+        try:
+            self._value = self._loader()
+        except Exception as error:
+            logger.exception("Ошибка загрузки ресурса %s", self.name)
+            self.error = error
+            self.state = FAILED
+        else:
+            self.error = None
+            self.state = READY
+        self.load_seconds = time.monotonic() - self.started_at
+
+    def reset(self):
+        """Разрешает повторную загрузку после ошибки"""
+        with self._lock:
+            if self.state == FAILED:
+                self.state = NOT_STARTED
+                self.error = None
+                self._thread = None
+
+    def start_background(self):
+        """Запускает загрузку в фоновом потоке, если она еще не начата"""
+        with self._lock:
+            if self.state != NOT_STARTED or self._thread is not None:
+                return
+            self.state = LOADING
+            self.started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._background_load,
+                                            name=f"warmup-{self.name}", daemon=True)
+            self._thread.start()
+
+    def _background_load(self):
+        with self._lock:
+            # get() мог загрузить ресурс (или не загрузить), пока поток ждал блокировку
+            if self.state not in (READY, FAILED):
+                self._load()
+
+    def status(self) -> Dict[str, Any]:
+        """Состояние ресурса для отображения в интерфейсе"""
+        elapsed = self.load_seconds
+        if elapsed is None and self.started_at is not None:
+            elapsed = time.monotonic() - self.started_at
+        return {
+            "name": self.name,
+            "state": self.state,
+            "seconds": elapsed,
+            "error": str(self.error) if self.error else None,
+        }
+
+
+def _load_encoder() -> SentenceTransformerEncoder:
+    encoder = SentenceTransformerEncoder(DEFAULT_MODEL_NAME)
+    encoder.model  # загружаем веса сразу, а не при первом запросе
+    return encoder
+
+
+def _load_semantic_index() -> SemanticIndex:
+    from universities_data import get_catalog
+
+    index = SemanticIndex(encoder_resource.get(), DEFAULT_INDEX_DIR)
+    catalog = get_catalog()
+    index.sync(catalog.universities, catalog.version)
+    return index
+
+
+def _load_similar_graph():
+    from similar import build_graph
+    return build_graph()
+
+
+encoder_resource = SharedResource("embedding_model", _load_encoder)
+semantic_index_resource = SharedResource("semantic_index", _load_semantic_index)
+similar_graph_resource = SharedResource("similar_graph", _load_similar_graph)
+
+
+def start_warmup():
+    """Запускает фоновую загрузку модели и индекса (повторные вызовы ничего не делают)"""
+    if WARMUP_ENABLED:
+        semantic_index_resource.start_background()
+
+
+def retry_warmup():
+    """Повторяет прогрев после ошибки загрузки модели или индекса"""
+    encoder_resource.reset()
+    semantic_index_resource.reset()
+    start_warmup()
+
+
+def is_ai_ready() -> bool:
+    """Готовы ли модель и семантический индекс"""
+    return semantic_index_resource.ready
+
+
+def warmup_status() -> Dict[str, Any]:
+    """Сводное состояние прогрева"""
+    resources = [encoder_resource.status(), semantic_index_resource.status()]
+    if all(item["state"] == READY for item in resources):
+        state = READY
+    elif any(item["state"] == FAILED for item in resources):
+        state = FAILED
+    elif any(item["state"] == LOADING for item in resources):
+        state = LOADING
+    else:
+        state = NOT_STARTED
+    return {"state": state, "resources": resources}
+
+
+def get_semantic_index() -> SemanticIndex:
+    """Возвращает общий семантический индекс, синхронизированный с каталогом"""
+    from universities_data import get_catalog
+
+    index = semantic_index_resource.get()
+    catalog = get_catalog()
+    if index.version != catalog.version:
+        index.sync(catalog.universities, catalog.version)
+    return index
+
+
+@subscribe
+def _sync_semantic_index(changes: ChangeSet):
+    """Досчитывает эмбеддинги измененных записей в фоне сразу после обновления каталога"""
+    if semantic_index_resource.ready:
+        threading.Thread(target=get_semantic_index, name="semantic-resync", daemon=True).start()
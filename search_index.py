@@ -0,0 +1,294 @@
+"""
+Инвертированный n-граммный индекс для быстрого поиска университетов
+
+Запросы до NGRAM_SIZE символов отвечаются одним постинг-листом. Для более
+длинных листы n-грамм пересекаются, а каждый кандидат проверяется по тексту
+в цикле на Python, примерно 0.3-0.5 мкс на документ. Поэтому время длинного
+запроса растет с числом найденных: на 20 тыс. записей запрос, который
+находит тысячи университетов ("алматы", "университет"), занимает единицы
+миллисекунд, а не доли.
+"""
+
+from typing import TYPE_CHECKING, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from dataset_versions import ChangeSet
+    from universities_data import University
+
+
+# Максимальная длина n-граммы в индексе. Все подстроки длиной до NGRAM_SIZE
+# индексируются целиком, поэтому короткие запросы не требуют проверки.
+NGRAM_SIZE = 3
+
+# Разделитель полей и документов: не встречается в запросах, поэтому
+# подстрока не может "склеить" конец одного поля с началом другого
+FIELD_SEPARATOR = "\x00"
+
+# Символ Unicode занимает не больше 21 бита, n-грамма упаковывается в int64
+_CHAR_BITS = 21
+
+# Сколько символов корпуса обрабатывать за раз при построении индекса
+_BUILD_CHUNK_CHARS = 2_000_000
+
+# Доля каталога, измененная с последней полной сборки, после которой индекс
+# собирается заново, а не дополняется дельтой
+DELTA_REBUILD_FRACTION = 0.1
+
+
+def normalize_text(text: str) -> str:
+    """Приводит текст к нижнему регистру и заменяет ё на е"""
+    return text.lower().replace("ё", "е")
+
+
+def university_search_text(university: "University") -> str:
+    """Собирает нормализованный текст полей, по которым ведется поиск"""
+    return normalize_text(FIELD_SEPARATOR.join((
+        university.name,
+        university.description,
+        university.city,
+        ' '.join(university.specialties),
+    )))
+
+
+def scan_positions(universities: Sequence["University"], query: str,
+                   positions: Optional[Iterable[int]] = None) -> List[int]:
+    """Линейный поиск подстроки с той же семантикой, что и у индекса
+
+    Нужен, пока индекс строится: один проход дешевле ожидания сборки.
+    positions - проверять только эти позиции.
+    """
+    query = normalize_text(query)
+    if positions is None:
+        positions = range(len(universities))
+    if not query:
+        return list(positions)
+    if FIELD_SEPARATOR in query:
+        return []
+    return [i for i in positions if query in university_search_text(universities[i])]
+
+
+def gram_key(gram: str) -> int:
+    """Упаковывает n-грамму в целое число"""
+    key = 0
+    for char in gram:
+        key = (key << _CHAR_BITS) | ord(char)
+    return key
+
+
+def _chunk_grams(documents: Sequence[str], positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Возвращает уникальные пары (n-грамма, документ) для части корпуса
+
+    positions - позиции документов в каталоге. Результат - массив ключей
+    n-грамм и массив позиций документов.
+    """
+    corpus = FIELD_SEPARATOR.join(documents) + FIELD_SEPARATOR
+    codes = np.frombuffer(corpus.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    lengths = np.fromiter((len(doc) + 1 for doc in documents), dtype=np.int64,
+                          count=len(documents))
+    owners = np.repeat(np.asarray(positions, dtype=np.int64), lengths)
+
+    size = len(codes)
+    keys, key_owners = [], []
+    for gram_size in range(1, NGRAM_SIZE + 1):
+        count = size - gram_size + 1
+        if count <= 0:
+            break
+        key = codes[:count].copy()
+        valid = key != 0
+        for offset in range(1, gram_size):
+            chars = codes[offset:offset + count]
+            key = (key << _CHAR_BITS) | chars
+            valid &= chars != 0
+        keys.append(key[valid])
+        key_owners.append(owners[:count][valid])
+
+    keys = np.concatenate(keys)
+    key_owners = np.concatenate(key_owners)
+
+    # Убираем повторы n-граммы внутри одного документа
+    local_keys, dense = np.unique(keys, return_inverse=True)
+    pairs = np.unique((dense.astype(np.int64) << 32) | key_owners)
+    return local_keys[pairs >> 32], pairs & 0xFFFFFFFF
+
+
+class Postings(NamedTuple):
+    """Постинг-листы CSR: отсортированные ключи n-грамм, смещения, позиции документов"""
+    keys: np.ndarray
+    offsets: np.ndarray
+    postings: np.ndarray
+
+
+def build_postings(documents: Sequence[str], positions: Optional[np.ndarray] = None) -> Postings:
+    """Строит постинг-листы по частям, чтобы ограничить пиковую память"""
+    if positions is None:
+        positions = np.arange(len(documents), dtype=np.int64)
+    chunk_keys, chunk_owners = [], []
+    start = 0
+    while start < len(documents):
+        stop, chars = start, 0
+        while stop < len(documents) and (chars < _BUILD_CHUNK_CHARS or stop == start):
+            chars += len(documents[stop]) + 1
+            stop += 1
+        keys, owners = _chunk_grams(documents[start:stop], positions[start:stop])
+        chunk_keys.append(keys)
+        chunk_owners.append(owners)
+        start = stop
+
+    if not chunk_keys:
+        return Postings(np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64),
+                        np.empty(0, dtype=np.int32))
+
+    keys = np.concatenate(chunk_keys)
+    owners = np.concatenate(chunk_owners)
+    unique_keys = np.unique(keys)
+    dense = np.searchsorted(unique_keys, keys)
+    pairs = np.unique((dense.astype(np.int64) << 32) | owners)
+
+    counts = np.bincount(pairs >> 32, minlength=len(unique_keys))
+    offsets = np.zeros(len(unique_keys) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return Postings(unique_keys, offsets, (pairs & 0xFFFFFFFF).astype(np.int32))
+
+
+def _posting(postings: Postings, gram: str) -> np.ndarray:
+    """Возвращает отсортированные позиции документов, содержащих n-грамму"""
+    keys, offsets, positions = postings
+    key = gram_key(gram)
+    slot = int(np.searchsorted(keys, key))
+    if slot == len(keys) or keys[slot] != key:
+        return positions[:0]
+    return positions[offsets[slot]:offsets[slot + 1]]
+
+
+def _candidates(postings: Postings, query: str) -> np.ndarray:
+    """Позиции документов, где есть все n-граммы запроса (без проверки по тексту)"""
+    if len(query) <= NGRAM_SIZE:
+        return _posting(postings, query)
+
+    lists = []
+    for start in range(len(query) - NGRAM_SIZE + 1):
+        posting = _posting(postings, query[start:start + NGRAM_SIZE])
+        if not len(posting):
+            return posting
+        lists.append(posting)
+
+    lists.sort(key=len)
+    size = max(int(posting[-1]) for posting in lists) + 1
+    if len(lists[0]) * 8 >= size:
+        # Плотные листы: документ подходит, если встретился во всех листах
+        # (внутри листа позиции не повторяются)
+        counts = np.bincount(np.concatenate(lists), minlength=size)
+        return np.flatnonzero(counts == len(lists)).astype(lists[0].dtype)
+
+    # Пересекаем начиная с самого короткого списка
+    candidates = lists[0]
+    for posting in lists[1:]:
+        slots = np.searchsorted(posting, candidates)
+        slots[slots == len(posting)] = 0
+        candidates = candidates[posting[slots] == candidates]
+        if not len(candidates):
+            break
+    return candidates
+
+
+class SearchIndex:
+    """Индекс подстрок по полям name, description, city и specialties
+
+    Основные постинг-листы строятся по всему каталогу. При обновлении по
+    изменениям (apply) они не перестраиваются: записи, измененные с момента
+    сборки, индексируются отдельной небольшой дельтой, а их старые вхождения
+    в основных листах отбрасываются через отображение позиций. Когда дельта
+    вырастает до DELTA_REBUILD_FRACTION каталога, индекс собирается заново.
+    """
+
+    def __init__(self, universities: Sequence["University"]):
+        self.universities: List["University"] = list(universities)
+        self._documents: List[str] = [university_search_text(uni) for uni in self.universities]
+        self._set_base(build_postings(self._documents))
+
+    def _set_base(self, base: Postings):
+        self._keys, self._offsets, self._postings = base
+        # Позиция документа основных листов -> текущая позиция (-1 - устарел);
+        # None - позиции совпадают
+        self._base_map: Optional[np.ndarray] = None
+        self._delta: Optional[Postings] = None
+        self._delta_positions = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.universities)
+
+    def apply(self, universities: Sequence["University"], changes: "ChangeSet") -> "SearchIndex":
+        """Индекс следующей версии каталога; тексты строятся только для измененных записей"""
+        index = SearchIndex.__new__(SearchIndex)
+        index.universities = list(universities)
+        changed = changes.changed
+        documents = self._documents
+        if changes.same_positions:
+            index._documents = list(documents)
+        else:
+            index._documents = [documents[i] if i >= 0 else "" for i in changes.source.tolist()]
+        for position in changed.tolist():
+            index._documents[position] = university_search_text(index.universities[position])
+
+        # Старые вхождения в дельте и в основных листах переводим в новые позиции
+        delta_positions = np.union1d(changes.remap(self._delta_positions), changed)
+        if len(delta_positions) > DELTA_REBUILD_FRACTION * len(index.universities):
+            index._set_base(build_postings(index._documents))
+            return index
+
+        index._keys, index._offsets, index._postings = self._keys, self._offsets, self._postings
+        base_map = self._base_map
+        if base_map is None:
+            base_map = np.arange(len(changes.position_map), dtype=np.int64)
+        live = base_map >= 0
+        index._base_map = np.full(len(base_map), -1, dtype=np.int64)
+        index._base_map[live] = np.where(changes.stale[base_map[live]], -1,
+                                         changes.position_map[base_map[live]])
+        index._delta_positions = delta_positions
+        index._delta = build_postings([index._documents[i] for i in delta_positions.tolist()],
+                                      delta_positions)
+        return index
+
+    def _posting(self, gram: str) -> np.ndarray:
+        """Возвращает отсортированные позиции документов, содержащих n-грамму"""
+        return _posting(Postings(self._keys, self._offsets, self._postings), gram)
+
+    def search_positions(self, query: str) -> List[int]:
+        """Возвращает позиции подходящих университетов в исходном порядке"""
+        query = normalize_text(query)
+        if not query:
+            return list(range(len(self.universities)))
+        if FIELD_SEPARATOR in query:
+            return []
+
+        candidates = _candidates(Postings(self._keys, self._offsets, self._postings), query)
+        if self._base_map is not None:
+            candidates = self._base_map[candidates]
+            candidates = np.sort(candidates[candidates >= 0])
+        if self._delta is not None:
+            candidates = np.union1d(candidates, _candidates(self._delta, query))
+
+        if len(query) <= NGRAM_SIZE:
+            return candidates.tolist()
+        # n-граммы дают кандидатов, точное совпадение проверяем по тексту
+        documents = self._documents
+        return [i for i in candidates.tolist() if query in documents[i]]
+
+    def filter_positions(self, query: str, positions: Sequence[int]) -> List[int]:
+        """Оставляет из переданных позиций те, что содержат запрос
+
+        Используется для сужения предыдущей выдачи, когда новый запрос
+        продолжает старый.
+        """
+        query = normalize_text(query)
+        if not query:
+            return list(positions)
+        documents = self._documents
+        return [i for i in positions if query in documents[i]]
+
+    def search(self, query: str) -> List["University"]:
+        """Возвращает университеты, содержащие запрос как подстроку"""
+        universities = self.universities
+        return [universities[i] for i in self.search_positions(query)]
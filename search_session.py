@@ -0,0 +1,146 @@
+"""
+Инкрементальный поиск по мере ввода с кэшем результатов и подавлением дребезга
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+import numpy as np
+
+from filters import ANY_TYPE, UniversityFilter, filter_positions
+from search_index import normalize_text
+
+if TYPE_CHECKING:
+    from catalog import UniversityCatalog
+    from dataset_versions import ChangeSet
+    from universities_data import University
+
+
+CACHE_SIZE = 256
+
+# Ввод чаще, чем раз в DEBOUNCE_SECONDS, не запускает новый поиск
+DEBOUNCE_SECONDS = 0.3
+
+# Сужаем предыдущую выдачу перебором, только если она не больше этого размера;
+# иначе индекс быстрее
+NARROW_LIMIT = 5000
+
+# (нормализованный запрос, город, тип)
+SearchKey = Tuple[str, str, str]
+
+
+@dataclass
+class SearchResult:
+    """Результат поиска и то, как он был получен"""
+    universities: List["University"] = field(default_factory=list)
+    source: str = "index"  # index, cache, narrowed или debounced
+    pending: bool = False  # True - показан прошлый результат, поиск отложен
+    retry_after: float = 0.0  # через сколько секунд повторить отложенный поиск
+
+
+def search_key(query: str, city: str = "", uni_type: str = "") -> SearchKey:
+    """Нормализованный ключ запроса для кэша"""
+    if uni_type == ANY_TYPE:
+        uni_type = ""
+    return normalize_text(query.strip()), city.lower(), uni_type.lower()
+
+
+class SearchSession:
+    """Состояние поиска одного пользователя
+
+    Хранит LRU-кэш "ключ запроса -> позиции в каталоге", привязанный к версии
+    данных, и последнюю выдачу, которую можно сузить при дописывании запроса.
+    """
+
+    def __init__(self, cache_size: int = CACHE_SIZE, debounce_seconds: float = DEBOUNCE_SECONDS):
+        self.cache_size = cache_size
+        self.debounce_seconds = debounce_seconds
+        self._cache: "OrderedDict[SearchKey, Tuple[int, ...]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._last_key: Optional[SearchKey] = None
+        self._last_positions: Tuple[int, ...] = ()
+        self._requested_key: Optional[SearchKey] = None
+        self._requested_at = float("-inf")
+
+    def _remember(self, key: SearchKey, positions: Tuple[int, ...]):
+        self._cache[key] = positions
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        self._last_key = key
+        self._last_positions = positions
+
+    def _apply(self, catalog: "UniversityCatalog", changes: "ChangeSet"):
+        """Переносит кэш на новую версию каталога
+
+        Позиции неизмененных записей пересчитываются, добавленные и измененные
+        записи проверяются по каждому ключу заново.
+        """
+        changed = changes.changed.tolist()
+        universities = catalog.universities
+        for key, positions in self._cache.items():
+            query, city, uni_type = key
+            matched = catalog.filter_positions(query, changed)
+            matched = [position for position in matched
+                       if (not city or universities[position].city.lower() == city)
+                       and (not uni_type or universities[position].type.lower() == uni_type)]
+            kept = changes.remap(np.asarray(positions, dtype=np.int64))
+            self._cache[key] = tuple(np.union1d(kept, matched).astype(np.int64).tolist())
+
+    def _compute(self, catalog: "UniversityCatalog", key: SearchKey) -> Tuple[Tuple[int, ...], str]:
+        """Ищет через сужение прошлой выдачи или через индекс"""
+        query, city, uni_type = key
+        last = self._last_key
+        if (last is not None and last[0] and last[0] in query and last[1:] == key[1:]
+                and len(self._last_positions) <= NARROW_LIMIT):
+            # Все, что содержит новый запрос, содержит и старый
+            positions = catalog.filter_positions(query, self._last_positions)
+            return tuple(positions), "narrowed"
+
+        criteria = UniversityFilter(query=query, city=city, uni_type=uni_type)
+        return tuple(filter_positions(catalog, criteria).tolist()), "index"
+
+    def search(self, query: str, city: str = "", uni_type: str = "",
+               catalog: Optional["UniversityCatalog"] = None,
+               now: Optional[float] = None) -> SearchResult:
+        """Выполняет поиск с учетом кэша, сужения и подавления дребезга"""
+        if catalog is None:
+            from universities_data import get_catalog
+            catalog = get_catalog()
+        if now is None:
+            now = time.monotonic()
+
+        if catalog.version != self._version:
+            changes = catalog.changes
+            if changes is not None and changes.old_version == self._version:
+                self._apply(catalog, changes)
+            else:
+                self._cache.clear()
+            self._last_key = None
+            self._last_positions = ()
+            self._version = catalog.version
+
+        key = search_key(query, city, uni_type)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self._last_key, self._last_positions = key, cached
+            self._requested_key, self._requested_at = key, now
+            return SearchResult(catalog.records(cached), source="cache")
+
+        # Новый запрос пришел слишком быстро после предыдущего: показываем
+        # прошлый результат и откладываем поиск
+        since_last = now - self._requested_at
+        if (key != self._requested_key and since_last < self.debounce_seconds
+                and self._last_key is not None):
+            self._requested_key, self._requested_at = key, now
+            return SearchResult(catalog.records(self._last_positions),
+                                source="debounced", pending=True,
+                                retry_after=self.debounce_seconds)
+
+        self._requested_key, self._requested_at = key, now
+        positions, source = self._compute(catalog, key)
+        self._remember(key, positions)
+        return SearchResult(catalog.records(positions), source=source)
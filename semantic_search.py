@@ -0,0 +1,214 @@
+"""
+Семантический поиск по университетам: эмбеддинги sentence-transformers в индексе FAISS
+
+Эмбеддинги хранятся на диске в индексе FAISS, где идентификатор вектора -
+хэш текста записи. При запуске индекс загружается с диска, и заново
+вычисляются эмбеддинги только новых и измененных записей.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics import timed
+
+if TYPE_CHECKING:
+    from universities_data import University
+
+
+# Небольшая многоязычная модель, работает на CPU и понимает русский
+DEFAULT_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+# Каталог для индекса; можно переопределить переменной окружения
+DEFAULT_INDEX_DIR = os.environ.get("SEMANTIC_INDEX_DIR", ".semantic_index")
+
+BATCH_SIZE = 64
+
+_INDEX_FILE = "universities.faiss"
+_META_FILE = "meta.json"
+
+
+def semantic_text(university: "University") -> str:
+    """Собирает текст записи для эмбеддинга"""
+    return "\n".join((
+        f"{university.name}, {university.city}",
+        university.description,
+        "Специальности: " + ", ".join(university.specialties),
+        "Особенности: " + ", ".join(university.features),
+    ))
+
+
+def content_id(text: str) -> int:
+    """Возвращает неотрицательный 63-битный идентификатор текста для FAISS"""
+    digest = hashlib.sha1(text.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little") & ((1 << 63) - 1)
+
+
+class SentenceTransformerEncoder:
+    """Кодировщик текстов на sentence-transformers, модель загружается лениво"""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu"):
+        self.name = model_name
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.name, device=self.device)
+        return self._model
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    @timed("encode_texts")
+    def encode(self, texts: Sequence[str], batch_size: int = BATCH_SIZE) -> np.ndarray:
+        """Возвращает нормализованные эмбеддинги float32 формы (len(texts), dimension)"""
+        embeddings = self.model.encode(list(texts), batch_size=batch_size,
+                                       convert_to_numpy=True, normalize_embeddings=True,
+                                       show_progress_bar=False)
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+class SemanticIndex:
+    """Индекс эмбеддингов университетов с сохранением на диск
+
+    Векторы нормализованы, поэтому скалярное произведение в IndexFlatIP
+    равно косинусной близости.
+    """
+
+    def __init__(self, encoder=None, index_dir: Optional[str] = DEFAULT_INDEX_DIR,
+                 batch_size: int = BATCH_SIZE):
+        self.encoder = encoder if encoder is not None else SentenceTransformerEncoder()
+        self.index_dir = index_dir
+        self.batch_size = batch_size
+        self.version: Optional[int] = None  # версия каталога, с которой синхронизирован индекс
+        self._index = None
+        self._by_id: Dict[int, List["University"]] = {}
+        self._lock = threading.RLock()  # индекс FAISS и _by_id
+        self._sync_lock = threading.Lock()  # синхронизации идут по одной
+
+    def _new_index(self):
+        import faiss
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.encoder.dimension))
+
+    def _load(self):
+        """Загружает индекс с диска, если он построен той же моделью"""
+        import faiss
+
+        if self.index_dir:
+            index_path = os.path.join(self.index_dir, _INDEX_FILE)
+            meta_path = os.path.join(self.index_dir, _META_FILE)
+            if os.path.exists(index_path) and os.path.exists(meta_path):
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                if meta.get("model") == self.encoder.name:
+                    return faiss.read_index(index_path)
+        return self._new_index()
+
+    def _save(self):
+        """Атомарно записывает индекс и метаданные на диск"""
+        import faiss
+
+        if not self.index_dir:
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        index_path = os.path.join(self.index_dir, _INDEX_FILE)
+        meta_path = os.path.join(self.index_dir, _META_FILE)
+
+        faiss.write_index(self._index, index_path + ".tmp")
+        os.replace(index_path + ".tmp", index_path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"model": self.encoder.name, "dimension": self._index.d}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _stored_ids(self) -> np.ndarray:
+        import faiss
+        return faiss.vector_to_array(self._index.id_map).astype(np.int64)
+
+    def sync(self, universities: Sequence["University"], version: Optional[int] = None) -> int:
+        """Приводит индекс в соответствие со списком университетов
+
+        Возвращает число записей, для которых пришлось вычислить эмбеддинги.
+        Эмбеддинги считаются без блокировки индекса: поиск до конца
+        синхронизации идет по прежним векторам.
+        """
+        with self._sync_lock:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._load()
+                stored = set(self._stored_ids().tolist())
+
+            texts: Dict[int, str] = {}
+            by_id: Dict[int, List["University"]] = {}
+            for uni in universities:
+                text = semantic_text(uni)
+                text_id = content_id(text)
+                texts[text_id] = text
+                by_id.setdefault(text_id, []).append(uni)
+
+            stale = [text_id for text_id in stored if text_id not in texts]
+            missing = [text_id for text_id in texts if text_id not in stored]
+
+            batches = []
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start:start + self.batch_size]
+                batches.append((self.encoder.encode([texts[text_id] for text_id in batch],
+                                                    batch_size=self.batch_size),
+                                np.asarray(batch, dtype=np.int64)))
+
+            with self._lock:
+                if stale:
+                    self._index.remove_ids(np.asarray(stale, dtype=np.int64))
+                for embeddings, batch_ids in batches:
+                    self._index.add_with_ids(embeddings, batch_ids)
+                self._by_id = by_id
+                self.version = version
+
+            if stale or missing:
+                self._save()
+            return len(missing)
+
+    def vectors(self, universities: Sequence["University"]) -> Optional[np.ndarray]:
+        """Сохраненные эмбеддинги записей или None, если индекс с ними не синхронизирован"""
+        with self._lock:
+            if self._index is None:
+                return None
+            try:
+                return np.vstack([self._index.reconstruct(content_id(semantic_text(uni)))
+                                  for uni in universities]).astype(np.float32)
+            except (RuntimeError, ValueError):
+                return None
+
+    def search(self, query: str, k: int = 10) -> List[Tuple["University", float]]:
+        """Возвращает до k университетов, наиболее близких к запросу, с оценкой"""
+        if self._index is None or not query.strip():
+            return []
+        # Запрос кодируется вне блокировки, чтобы поиски не ждали друг друга и синхронизацию
+        embedding = self.encoder.encode([query], batch_size=1)
+        with self._lock:
+            if not self._index.ntotal:
+                return []
+            scores, ids = self._index.search(embedding, min(k, self._index.ntotal))
+
+            results = []
+            for text_id, score in zip(ids[0].tolist(), scores[0].tolist()):
+                for uni in self._by_id.get(text_id, ()):
+                    results.append((uni, float(score)))
+            return results[:k]
+
+
+@timed()
+def semantic_search_universities(query: str, k: int = 10) -> List["University"]:
+    """Семантический поиск: университеты, близкие к запросу по смыслу"""
+    from resources import get_semantic_index
+    return [uni for uni, _ in get_semantic_index().search(query, k)]
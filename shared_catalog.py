@@ -0,0 +1,512 @@
+"""
+Каталог университетов, общий для нескольких процессов одного хоста
+
+Один процесс-загрузчик строит массивы каталога (числовые колонки, коды
+категорий, таблицы специальностей и особенностей, поисковый n-граммный
+индекс) и записывает их сегментом в каталог SHARED_CATALOG_DIR - по
+умолчанию в /dev/shm, то есть в оперативную память, а не на диск. Записи
+сохраняются файлом Arrow IPC.
+
+Остальные процессы подключаются к сегменту только для чтения через mmap:
+массивы NumPy и буферы Arrow ссылаются на одни и те же страницы памяти,
+поэтому RSS процесса почти не растет с числом процессов. Объекты University
+создаются по требованию из таблицы Arrow, последние RECORD_CACHE_SIZE
+записей кэшируются в процессе.
+
+Публикация атомарна: сегмент пишется во временный каталог, переименовывается,
+после чего обновляется файл CURRENT с именем сегмента. Подключенные процессы
+замечают новый CURRENT и переходят на новый сегмент; старые файлы остаются
+доступны через открытые отображения, пока их не отпустят. Кроме текущего и
+предыдущего, сегмент удаляется не раньше SEGMENT_GRACE_SECONDS после
+публикации следующего. Если подключиться все же не удалось, процесс без
+подключенного сегмента читает каталог из файла данных сам.
+
+Включается в приложении переменной окружения UNIVERSITIES_SHARED=1. Если
+сегмента еще нет, его под файловой блокировкой строит первый процесс.
+Отдельный загрузчик, который перепубликует каталог при изменении файла данных:
+    python shared_catalog.py publish [--watch]
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence as SequenceABC
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from catalog import UniversityCatalog
+from catalog_store import RELOAD_CHECK_INTERVAL, SCHEMA, read_table, write_catalog
+from columnar import COLUMNS, NUMERIC_COLUMNS, UniversityColumns
+from search_index import Postings, SearchIndex
+
+if TYPE_CHECKING:
+    from universities_data import University
+
+logger = logging.getLogger(__name__)
+
+
+SHARED_CATALOG_DIR = os.environ.get(
+    'SHARED_CATALOG_DIR',
+    '/dev/shm/universities_catalog' if os.path.isdir('/dev/shm')
+    else os.path.join(os.path.dirname(os.path.abspath(__file__)), '.shared_catalog'),
+)
+
+# Сколько созданных записей University держать в кэше процесса
+RECORD_CACHE_SIZE = 4096
+
+# Сколько последних сегментов оставлять при публикации нового
+KEEP_SEGMENTS = 2
+
+# Сколько секунд после замены более новым сегментом старый еще не удаляется:
+# процесс мог прочитать CURRENT, но еще не успеть подключиться
+SEGMENT_GRACE_SECONDS = 60.0
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+RECORDS_FILE = "records.arrow"
+
+
+def id_hashes(ids: Iterable[str]) -> np.ndarray:
+    """64-битные хэши id, одинаковые во всех процессах (в отличие от hash())"""
+    return np.fromiter((int.from_bytes(hashlib.blake2b(university_id.encode("utf-8"),
+                                                       digest_size=8).digest(), "little")
+                        for university_id in ids), dtype=np.uint64)
+
+
+def _categories(values: pd.Categorical) -> List[str]:
+    return [str(category) for category in values.categories]
+
+
+def _segment_arrays(catalog: UniversityCatalog) -> Dict[str, np.ndarray]:
+    """Массивы сегмента: колонки, развернутые таблицы, поисковый индекс, индекс id"""
+    columns = catalog.columns
+    index = catalog.search_index
+    arrays = {name: getattr(columns, name) for name in NUMERIC_COLUMNS}
+    arrays['city_codes'] = columns.city_codes
+    arrays['type_codes'] = columns.type_codes
+    for table, column in ((columns.specialties, 'specialty'), (columns.features, 'feature')):
+        positions = table['position'].to_numpy()
+        arrays[f'{column}_positions'] = positions
+        arrays[f'{column}_codes'] = table[column].cat.codes.to_numpy()
+        # Строки таблицы идут по порядку записей: границы списка каждой записи
+        arrays[f'{column}_offsets'] = np.searchsorted(positions, np.arange(len(catalog) + 1))
+
+    arrays['search_keys'] = index._keys
+    arrays['search_offsets'] = index._offsets
+    arrays['search_postings'] = index._postings
+    # Тексты для проверки длинных запросов: UTF-8 подряд и смещения документов
+    encoded = [document.encode("utf-8") for document in index._documents]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(document) for document in encoded], out=offsets[1:])
+    arrays['documents'] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    arrays['document_offsets'] = offsets
+
+    # При повторе id побеждает первая запись: сортируем по (хэш, позиция)
+    hashes = id_hashes(uni.id for uni in catalog.universities)
+    order = np.lexsort((np.arange(len(hashes)), hashes))
+    arrays['id_hashes'] = hashes[order]
+    arrays['id_positions'] = order.astype(np.int64)
+    return arrays
+
+
+def publish(universities: Sequence["University"], directory: str = SHARED_CATALOG_DIR) -> str:
+    """Записывает сегмент каталога и делает его текущим; возвращает имя сегмента"""
+    catalog = UniversityCatalog(universities)
+    columns = catalog.columns
+    name = f"{time.time_ns():x}-{os.getpid()}"
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".tmp-{name}")
+    os.makedirs(temp_path)
+
+    for array_name, array in _segment_arrays(catalog).items():
+        np.save(os.path.join(temp_path, f"{array_name}.npy"), np.ascontiguousarray(array))
+    write_catalog(catalog.universities, os.path.join(temp_path, RECORDS_FILE))
+
+    # Отпечаток содержимого считается так же, как ETag в api.py
+    hashes = pd.util.hash_pandas_object(columns.frame, index=False).to_numpy()
+    manifest = {
+        'size': len(catalog),
+        'fingerprint': hashlib.sha1(hashes.tobytes()).hexdigest()[:16],
+        'cities': catalog.cities,
+        'types': catalog.types,
+        'categories': {
+            'city': _categories(columns.frame['city'].cat),
+            'type': _categories(columns.frame['type'].cat),
+            'specialty': _categories(columns.specialties['specialty'].cat),
+            'feature': _categories(columns.features['feature'].cat),
+        },
+    }
+    with open(os.path.join(temp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    os.rename(temp_path, os.path.join(directory, name))
+    current_temp = os.path.join(directory, f"{CURRENT_FILE}.tmp")
+    with open(current_temp, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(current_temp, os.path.join(directory, CURRENT_FILE))
+    _remove_old_segments(directory, name)
+    logger.info("Опубликован сегмент каталога %s: %d записей", name, len(catalog))
+    return name
+
+
+def _published_at(segment: str) -> float:
+    """Время публикации сегмента в секундах (из имени)"""
+    return int(segment.split("-", 1)[0], 16) / 1e9
+
+
+def _remove_old_segments(directory: str, current: str):
+    """Удаляет старые сегменты; процессы, которые их отобразили, читают их дальше
+
+    Сегмент удаляется, только если после него опубликовано не меньше
+    KEEP_SEGMENTS новых и следующий за ним заменил его больше
+    SEGMENT_GRACE_SECONDS назад.
+    """
+    segments = sorted((entry for entry in os.listdir(directory)
+                       if not entry.startswith(".") and entry != CURRENT_FILE
+                       and os.path.isdir(os.path.join(directory, entry))),
+                      key=_published_at)
+    now = time.time()
+    for entry, successor in zip(segments[:-KEEP_SEGMENTS], segments[1:]):
+        if entry != current and now - _published_at(successor) > SEGMENT_GRACE_SECONDS:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+def current_segment(directory: str = SHARED_CATALOG_DIR) -> Optional[str]:
+    """Имя текущего сегмента или None, если каталог еще не опубликован"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def ensure_published(load: Callable[[], Sequence["University"]],
+                     directory: str = SHARED_CATALOG_DIR) -> str:
+    """Возвращает текущий сегмент; если его нет, публикует load() под блокировкой
+
+    Блокировка файловая, поэтому из нескольких одновременно стартующих
+    процессов загружает данные только один, остальные ждут и подключаются.
+    """
+    name = current_segment(directory)
+    if name is not None:
+        return name
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        name = current_segment(directory)
+        if name is None:
+            name = publish(load(), directory)
+    return name
+
+
+def _load_array(path: str) -> np.ndarray:
+    # view(np.ndarray) - обычный массив над отображением, pandas не копирует его
+    return np.load(path, mmap_mode="r").view(np.ndarray)
+
+
+class SharedRecords(SequenceABC):
+    """Записи каталога над сегментом; объекты создаются при обращении
+
+    Поля читаются без промежуточных буферов Arrow: строки - из отображенной
+    таблицы, числа - из массивов колонок, город, тип и списки - по кодам
+    категорий из развернутых таблиц.
+    """
+
+    version = 0  # сегмент неизменяем
+
+    def __init__(self, table: pa.Table, record_type, arrays: Dict[str, np.ndarray],
+                 categories: Dict[str, List[str]]):
+        self.table = table
+        self.record_type = record_type
+        self._size = table.num_rows
+        self._fields: List[Callable[[int], Any]] = [
+            self._field(column, table, arrays, categories) for column in COLUMNS
+        ]
+        self._cache: "OrderedDict[int, Any]" = OrderedDict()
+        self._cache_lock = threading.Lock()  # записи добавляют потоки всех сессий
+
+    @staticmethod
+    def _field(column: str, table: pa.Table, arrays: Dict[str, np.ndarray],
+               categories: Dict[str, List[str]]) -> Callable[[int], Any]:
+        if column in NUMERIC_COLUMNS:
+            values = arrays[column]
+            return lambda position: values[position].item()
+        if column in ('city', 'type'):
+            codes, names = arrays[f'{column}_codes'], categories[column]
+            return lambda position: names[codes[position]]
+        if column in ('specialties', 'features'):
+            item = 'specialty' if column == 'specialties' else 'feature'
+            offsets, codes, names = (arrays[f'{item}_offsets'], arrays[f'{item}_codes'],
+                                     categories[item])
+            return lambda position: [names[code] for code in
+                                     codes[offsets[position]:offsets[position + 1]].tolist()]
+        chunks = table.column(column).chunks
+        # Файл пишется одним пакетом; combine_chunks копировал бы даже один кусок
+        values = chunks[0] if len(chunks) == 1 else table.column(column).combine_chunks()
+        return lambda position: values[position].as_py()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _create(self, position: int):
+        return self.record_type(*(field(position) for field in self._fields))
+
+    def _record(self, position: int):
+        record = self._cache.get(position)
+        if record is None:
+            record = self._create(position)
+            with self._cache_lock:
+                while len(self._cache) >= RECORD_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+                self._cache[position] = record
+        return record
+
+    def take(self, positions: Iterable[int]) -> List["University"]:
+        """Записи по позициям каталога"""
+        return [self._record(position) for position in positions]
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self.take(range(*item.indices(self._size)))
+        position = int(item)
+        if position < 0:
+            position += self._size
+        if not 0 <= position < self._size:
+            raise IndexError("индекс записи вне каталога")
+        return self._record(position)
+
+    def __iter__(self) -> Iterator["University"]:
+        # Проход по всему каталогу не кэшируется, чтобы не раздувать память процесса
+        cache = self._cache
+        for position in range(self._size):
+            record = cache.get(position)
+            yield record if record is not None else self._create(position)
+
+
+class SharedDocuments(SequenceABC):
+    """Нормализованные тексты поискового индекса, декодируются по одному"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, position: int) -> str:
+        start, stop = self._offsets[position], self._offsets[position + 1]
+        return self._data[start:stop].tobytes().decode("utf-8")
+
+
+class SharedSearchIndex(SearchIndex):
+    """SearchIndex над массивами сегмента, без построения в процессе"""
+
+    def __init__(self, universities: SharedRecords, arrays: Dict[str, np.ndarray]):
+        self.universities = universities
+        self._documents = SharedDocuments(arrays['documents'], arrays['document_offsets'])
+        self._set_base(Postings(arrays['search_keys'], arrays['search_offsets'],
+                                arrays['search_postings']))
+
+    def search(self, query: str) -> List["University"]:
+        return self.universities.take(self.search_positions(query))
+
+
+class SharedColumns(UniversityColumns):
+    """Колонки каталога над массивами сегмента
+
+    Массивы для фильтров и сортировок отображены из сегмента. Таблицы pandas
+    собираются при первом обращении: числа и коды категорий не копируются,
+    строки - колонки Arrow над тем же отображением.
+    """
+
+    def __init__(self, table: pa.Table, arrays: Dict[str, np.ndarray],
+                 categories: Dict[str, List[str]]):
+        self.size = table.num_rows
+        self._table = table
+        self._arrays = arrays
+        self._categories = categories
+        self._frame: Optional[pd.DataFrame] = None
+        self._specialties: Optional[pd.DataFrame] = None
+        self._features: Optional[pd.DataFrame] = None
+
+        self.rating = arrays['rating']
+        self.founding_year = arrays['founding_year']
+        self.students_count = arrays['students_count']
+        self.budget_places = arrays['budget_places']
+        self.city_codes = arrays['city_codes']
+        self.type_codes = arrays['type_codes']
+
+    def _categorical(self, codes: np.ndarray, column: str) -> pd.Categorical:
+        return pd.Categorical.from_codes(codes, self._categories[column])
+
+    def _strings(self, name: str) -> pd.arrays.ArrowExtensionArray:
+        return pd.arrays.ArrowExtensionArray(self._table.column(name))
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        if self._frame is None:
+            data = {}
+            for column in COLUMNS:
+                if column in NUMERIC_COLUMNS:
+                    data[column] = self._arrays[column]
+                elif column in ('city', 'type'):
+                    data[column] = self._categorical(self._arrays[f'{column}_codes'], column)
+                elif column in ('specialties', 'features'):
+                    joined = pc.binary_join(self._table.column(column), ', ')
+                    data[column] = pd.arrays.ArrowExtensionArray(joined)
+                else:
+                    data[column] = self._strings(column)
+            self._frame = pd.DataFrame(data, columns=COLUMNS, copy=False)
+        return self._frame
+
+    def _exploded(self, column: str) -> pd.DataFrame:
+        positions = self._arrays[f'{column}_positions']
+        ids = self._table.column('id').take(pa.array(positions))
+        return pd.DataFrame({
+            'position': positions,
+            'id': pd.Categorical(pd.arrays.ArrowExtensionArray(ids)),
+            column: self._categorical(self._arrays[f'{column}_codes'], column),
+        }, copy=False)
+
+    @property
+    def specialties(self) -> pd.DataFrame:
+        if self._specialties is None:
+            self._specialties = self._exploded('specialty')
+        return self._specialties
+
+    @property
+    def features(self) -> pd.DataFrame:
+        if self._features is None:
+            self._features = self._exploded('feature')
+        return self._features
+
+    def category_codes(self, column: str, value: str) -> np.ndarray:
+        value = value.lower()
+        return np.flatnonzero([category.lower() == value
+                               for category in self._categories[column]])
+
+
+class SharedCatalog(UniversityCatalog):
+    """Каталог, подключенный к опубликованному сегменту только для чтения"""
+
+    def __init__(self, segment: str, record_type, version: int = 0,
+                 directory: str = SHARED_CATALOG_DIR):
+        path = os.path.join(directory, segment)
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        arrays = {entry[:-len(".npy")]: _load_array(os.path.join(path, entry))
+                  for entry in os.listdir(path) if entry.endswith(".npy")}
+
+        table = read_table(os.path.join(path, RECORDS_FILE))
+        if table.schema != SCHEMA:
+            raise ValueError(f"Схема сегмента {segment} не совпадает с форматом каталога")
+
+        self.segment = segment
+        self.fingerprint: str = manifest['fingerprint']
+        self.universities = SharedRecords(table, record_type, arrays, manifest['categories'])
+        self.version = version
+        self.changes = None
+        self._snapshot = None
+        self._cities: List[str] = manifest['cities']
+        self._types: List[str] = manifest['types']
+        self._id_hashes = arrays['id_hashes']
+        self._id_positions = arrays['id_positions']
+        self._id = self.universities._fields[COLUMNS.index('id')]
+
+        self._search_index = SharedSearchIndex(self.universities, arrays)
+        self._search_index_lock = threading.Lock()
+        self._search_index_thread = None
+        self._columns = SharedColumns(table, arrays, manifest['categories'])
+        self._maps = None
+        self._bm25_index = None
+        self._fuzzy_index = None
+
+    def apply(self, universities: Iterable["University"], version: int) -> UniversityCatalog:
+        # Сегмент неизменяем: локальные данные процесса индексируются с нуля
+        return UniversityCatalog(universities, version)
+
+    def position(self, university_id: str) -> Optional[int]:
+        key = id_hashes([university_id])[0]
+        slot = int(np.searchsorted(self._id_hashes, key))
+        # Одинаковый хэш у разных id маловероятен, но проверяем сам id
+        while slot < len(self._id_hashes) and self._id_hashes[slot] == key:
+            position = int(self._id_positions[slot])
+            if self._id(position) == university_id:
+                return position
+            slot += 1
+        return None
+
+    def get(self, university_id: str) -> Optional["University"]:
+        position = self.position(university_id)
+        return None if position is None else self.universities[position]
+
+    def records(self, positions: Iterable[int]) -> List["University"]:
+        return self.universities.take(positions)
+
+    def _by_codes(self, codes: np.ndarray, column: str, value: str) -> List["University"]:
+        wanted = self._columns.category_codes(column, value)
+        return self.records(np.flatnonzero(np.isin(codes, wanted)).tolist())
+
+    def by_city(self, city: str) -> List["University"]:
+        return self._by_codes(self._columns.city_codes, 'city', city)
+
+    def by_type(self, uni_type: str) -> List["University"]:
+        return self._by_codes(self._columns.type_codes, 'type', uni_type)
+
+    @property
+    def cities(self) -> List[str]:
+        return list(self._cities)
+
+    @property
+    def types(self) -> List[str]:
+        return list(self._types)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Общий для процессов каталог университетов")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    publish_parser = subparsers.add_parser("publish", help="опубликовать каталог из файла данных")
+    publish_parser.add_argument("--watch", action="store_true",
+                                help="перепубликовывать при изменении файла данных")
+    subparsers.add_parser("show", help="показать текущий сегмент")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    from catalog_store import CatalogFile
+    from universities_data import DATA_PATH, University
+
+    if args.command == "show":
+        name = current_segment()
+        if name is None:
+            print(f"В {SHARED_CATALOG_DIR} каталог не опубликован")
+            return
+        catalog = SharedCatalog(name, University)
+        print(f"{os.path.join(SHARED_CATALOG_DIR, name)}: {len(catalog)} записей, "
+              f"отпечаток {catalog.fingerprint}")
+        return
+
+    source = CatalogFile(DATA_PATH, University)
+    print(publish(source.load()))
+    while args.watch:
+        time.sleep(RELOAD_CHECK_INTERVAL)
+        if source.changed():
+            try:
+                publish(source.load())
+            except Exception:
+                # Битый файл не должен ронять загрузчик: процессы остаются на старом сегменте
+                logger.exception("Не удалось перепубликовать каталог %s", DATA_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Похожие университеты: заранее посчитанный граф k ближайших соседей
+
+Запись описывается вектором из взвешенных частей: специальности (косинус
+по множествам), тип и город (совпадение) и эмбеддинг описания. Эмбеддинги
+берутся из семантического индекса, если модель загружена, иначе
+используется хэшированный мешок основ слов описания. Скалярное произведение
+векторов - взвешенная сумма близостей по частям.
+
+Граф хранится на диске компактно (соседи - int32, оценки - float16,
+подписи записей - uint64) и обновляется инкрементно: пересчитываются строки
+измененных записей, а у остальных в список соседей добавляются только
+измененные записи. Показ блока на странице - поиск в готовом графе.
+
+Запуск: python similar.py build
+        python similar.py show <id>
+"""
+
+import argparse
+import json
+import os
+import threading
+import zlib
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from bm25 import tokenize
+from dataset_versions import ChangeSet, subscribe
+from semantic_search import content_id
+
+if TYPE_CHECKING:
+    from universities_data import University
+
+
+SIMILAR_INDEX_DIR = os.environ.get("SIMILAR_INDEX_DIR", ".similar_index")
+_GRAPH_FILE = "neighbors.npz"
+
+NEIGHBORS = 8
+
+# Вес каждой части в итоговой близости (сумма - 1)
+WEIGHTS = {"specialties": 0.45, "description": 0.3, "type": 0.15, "city": 0.1}
+
+# Размерность хэшированного мешка слов, когда модели эмбеддингов нет
+HASH_DIMENSION = 256
+
+# Сколько ячеек матрицы близостей считать за раз
+MAX_BLOCK_CELLS = 4_000_000
+
+
+def record_signature(university: "University") -> int:
+    """Подпись полей, от которых зависит близость; меняется при их изменении"""
+    return content_id("\x00".join((
+        university.type.lower(), university.city.lower(),
+        "\x01".join(sorted(specialty.lower() for specialty in university.specialties)),
+        university.description,
+    )))
+
+
+def hashed_embeddings(texts: Sequence[str], dimension: int = HASH_DIMENSION) -> np.ndarray:
+    """Нормализованные векторы мешка основ слов (хэширование признаков)"""
+    buckets: Dict[str, Tuple[int, float]] = {}  # основа -> (ячейка, знак)
+    cells: List[int] = []
+    signs: List[float] = []
+    for row, text in enumerate(texts):
+        for token in tokenize(text):
+            bucket = buckets.get(token)
+            if bucket is None:
+                digest = zlib.crc32(token.encode("utf-8"))
+                bucket = buckets[token] = (digest % dimension, 1.0 if digest & 0x80000000 else -1.0)
+            cells.append(row * dimension + bucket[0])
+            signs.append(bucket[1])
+    vectors = np.bincount(np.asarray(cells, dtype=np.int64), weights=signs,
+                          minlength=len(texts) * dimension).astype(np.float32)
+    vectors = vectors.reshape(len(texts), dimension)
+    np.sqrt(np.abs(vectors), out=vectors, where=vectors != 0)  # частые слова не доминируют
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def description_embeddings(universities: Sequence["University"]) -> Tuple[np.ndarray, str]:
+    """Эмбеддинги описаний и имя их источника (меняется источник - граф строится заново)"""
+    from resources import semantic_index_resource
+
+    if semantic_index_resource.ready:
+        index = semantic_index_resource.get()
+        vectors = index.vectors(universities)
+        if vectors is not None:
+            return vectors, index.encoder.name
+    return hashed_embeddings([uni.description for uni in universities]), f"hashing-{HASH_DIMENSION}"
+
+
+def _one_hot(values: Sequence[str]) -> np.ndarray:
+    codes: Dict[str, int] = {}
+    columns = np.asarray([codes.setdefault(value.lower(), len(codes)) for value in values], dtype=np.int64)
+    matrix = np.zeros((len(values), len(codes)), dtype=np.float32)
+    matrix[np.arange(len(values)), columns] = 1.0
+    return matrix
+
+
+def feature_matrix(universities: Sequence["University"], embeddings: np.ndarray) -> np.ndarray:
+    """Векторы записей; скалярное произведение - взвешенная близость от 0 до 1"""
+    vocabulary: Dict[str, int] = {}
+    rows: List[int] = []
+    columns: List[int] = []
+    for row, uni in enumerate(universities):
+        for specialty in {specialty.lower() for specialty in uni.specialties}:
+            rows.append(row)
+            columns.append(vocabulary.setdefault(specialty, len(vocabulary)))
+    specialties = np.zeros((len(universities), len(vocabulary)), dtype=np.float32)
+    specialties[rows, columns] = 1.0
+    norms = np.linalg.norm(specialties, axis=1, keepdims=True)
+    specialties /= np.where(norms > 0, norms, 1)
+
+    parts = {
+        "specialties": specialties,
+        "description": embeddings.astype(np.float32, copy=False),
+        "type": _one_hot([uni.type for uni in universities]),
+        "city": _one_hot([uni.city for uni in universities]),
+    }
+    return np.hstack([np.sqrt(np.float32(WEIGHTS[name])) * part for name, part in parts.items()])
+
+
+def _top_k(scores: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Лучшие k кандидатов строки; при равной близости раньше стоящий в каталоге"""
+    keep = scores > -np.inf
+    if np.count_nonzero(keep) > k:
+        keep &= scores >= np.partition(scores[keep], -k)[-k]
+    scores, candidates = scores[keep], candidates[keep]
+    order = np.lexsort((candidates, -scores))[:k]
+    return candidates[order], scores[order]
+
+
+class SimilarityGraph:
+    """Соседи каждой записи: позиции в ids и близости, -1 - нет соседа"""
+
+    def __init__(self, k: int = NEIGHBORS, index_dir: Optional[str] = SIMILAR_INDEX_DIR):
+        self.k = k
+        self.index_dir = index_dir
+        self.ids: List[str] = []
+        self.signatures = np.zeros(0, dtype=np.uint64)
+        self.neighbors = np.zeros((0, k), dtype=np.int32)
+        self.scores = np.zeros((0, k), dtype=np.float16)
+        self.config: Optional[str] = None
+        self.version: Optional[int] = None  # версия каталога, с которой синхронизирован граф
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.RLock()  # чтение и подмена массивов графа
+        self._sync_lock = threading.Lock()  # пересчеты идут по одному
+
+    @property
+    def path(self) -> Optional[str]:
+        return os.path.join(self.index_dir, _GRAPH_FILE) if self.index_dir else None
+
+    def load(self) -> bool:
+        """Загружает граф с диска; False, если файла нет или он другого формата"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        with np.load(self.path, allow_pickle=False) as data:
+            if data["neighbors"].shape[1] != self.k:
+                return False
+            with self._lock:
+                self.ids = data["ids"].tolist()
+                self.signatures = data["signatures"]
+                self.neighbors = data["neighbors"]
+                self.scores = data["scores"]
+                self.config = str(data["config"])
+                self._positions = {uni_id: position for position, uni_id in enumerate(self.ids)}
+        return True
+
+    def save(self):
+        """Атомарно записывает граф на диск"""
+        if not self.path:
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        temp_path = self.path + ".tmp.npz"
+        np.savez(temp_path, ids=np.asarray(self.ids, dtype=str), signatures=self.signatures,
+                 neighbors=self.neighbors, scores=self.scores, config=np.asarray(self.config))
+        os.replace(temp_path, self.path)
+
+    def _exact_rows(self, features: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Соседи строк перебором по всем записям, блоками"""
+        size = len(features)
+        neighbors = np.full((len(rows), self.k), -1, dtype=np.int32)
+        scores = np.zeros((len(rows), self.k), dtype=np.float32)
+        block = max(1, MAX_BLOCK_CELLS // max(size, 1))
+        candidates = np.arange(size)
+        for start in range(0, len(rows), block):
+            chunk = rows[start:start + block]
+            similarity = features[chunk] @ features.T
+            similarity[np.arange(len(chunk)), chunk] = -np.inf  # сама запись не сосед
+            for i, row_scores in enumerate(similarity):
+                found, values = _top_k(row_scores, candidates, self.k)
+                neighbors[start + i, :len(found)] = found
+                scores[start + i, :len(found)] = values
+        return neighbors, scores
+
+    def sync(self, universities: Sequence["University"], embeddings: np.ndarray, config: str,
+             version: Optional[int] = None) -> int:
+        """Приводит граф в соответствие с каталогом; возвращает число пересчитанных строк
+
+        Пересчет идет без блокировки чтения: similar() до замены отдает
+        старый граф, новые массивы подменяются целиком под _lock.
+        """
+        with self._sync_lock:
+            with self._lock:
+                current_ids, current_signatures = self.ids, self.signatures
+                current_neighbors, current_scores = self.neighbors, self.scores
+                current_config, current_positions = self.config, self._positions
+
+            # При повторе id учитывается первая запись, как в каталоге
+            unique: Dict[str, int] = {}
+            for position, uni in enumerate(universities):
+                unique.setdefault(uni.id, position)
+            order = np.fromiter(unique.values(), dtype=np.int64, count=len(unique))
+            universities = [universities[position] for position in order]
+            ids = list(unique)
+            signatures = np.fromiter((record_signature(uni) for uni in universities),
+                                     dtype=np.uint64, count=len(universities))
+            features = feature_matrix(universities, embeddings[order])
+            config = json.dumps({"embeddings": config, "weights": WEIGHTS}, sort_keys=True)
+
+            # Позиция записи в старом графе, если запись не изменилась, иначе -1
+            old_positions = np.asarray([current_positions.get(uni_id, -1) for uni_id in ids], dtype=np.int64)
+            if config != current_config or not len(current_ids):
+                old_positions[:] = -1
+            unchanged = old_positions >= 0
+            unchanged[unchanged] = current_signatures[old_positions[unchanged]] == signatures[unchanged]
+
+            # Старая позиция -> новая для неизмененных записей
+            old_to_new = np.full(len(current_ids) + 1, -1, dtype=np.int64)
+            old_to_new[old_positions[unchanged]] = np.flatnonzero(unchanged)
+
+            neighbors = np.full((len(ids), self.k), -1, dtype=np.int32)
+            scores = np.zeros((len(ids), self.k), dtype=np.float32)
+            changed = np.flatnonzero(~unchanged)
+
+            # У неизмененной записи список остается верным, если в нем нет
+            # измененных и удаленных соседей; тогда достаточно сравнить ее
+            # только с измененными записями
+            kept = np.flatnonzero(unchanged)
+            old_lists = current_neighbors[old_positions[kept]] if len(kept) else np.zeros((0, self.k), np.int32)
+            translated = old_to_new[np.where(old_lists >= 0, old_lists, len(current_ids))]
+            lost = ((translated < 0) & (old_lists >= 0)).any(axis=1)
+            merge = kept[~lost]
+            translated = translated[~lost]
+
+            recompute = np.concatenate([changed, kept[lost]])
+            if len(recompute):
+                neighbors[recompute], scores[recompute] = self._exact_rows(features, recompute)
+
+            if len(merge) and not len(changed):
+                # Новых кандидатов нет: списки те же, меняются только позиции
+                neighbors[merge] = translated
+                scores[merge] = current_scores[old_positions[merge]]
+            elif len(merge):
+                block = max(1, MAX_BLOCK_CELLS // (self.k * features.shape[1] + len(changed)))
+                for start in range(0, len(merge), block):
+                    rows = merge[start:start + block]
+                    old = translated[start:start + block]
+                    # Близости к старым соседям пересчитываются точно (на диске float16)
+                    old_scores = np.einsum("ij,ikj->ik", features[rows], features[np.maximum(old, 0)])
+                    old_scores[old < 0] = -np.inf
+                    new_scores = features[rows] @ features[changed].T
+                    for i, row in enumerate(rows):
+                        candidates = np.concatenate([old[i], changed])
+                        values = np.concatenate([old_scores[i], new_scores[i]])
+                        found, values = _top_k(values, np.where(candidates >= 0, candidates, 0), self.k)
+                        neighbors[row, :len(found)] = found
+                        scores[row, :len(found)] = values
+
+            moved = len(ids) != len(current_ids) or not np.array_equal(old_positions, np.arange(len(ids)))
+            positions = {uni_id: position for position, uni_id in enumerate(ids)}
+            scores = scores.astype(np.float16)
+            with self._lock:
+                self.ids = ids
+                self.signatures = signatures
+                self.neighbors = neighbors
+                self.scores = scores
+                self.config = config
+                self.version = version
+                self._positions = positions
+            if len(recompute) or moved:
+                self.save()
+            return len(recompute)
+
+    def similar(self, university_id: str, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Соседи записи: пары (id, близость) по убыванию близости"""
+        with self._lock:
+            position = self._positions.get(university_id)
+            if position is None:
+                return []
+            row = self.neighbors[position][:k]
+            return [(self.ids[neighbor], float(score))
+                    for neighbor, score in zip(row.tolist(), self.scores[position][:k].tolist())
+                    if neighbor >= 0]
+
+
+def build_graph(graph: Optional[SimilarityGraph] = None) -> SimilarityGraph:
+    """Загружает граф с диска и синхронизирует его с текущим каталогом"""
+    from universities_data import get_catalog
+
+    if graph is None:
+        graph = SimilarityGraph()
+        graph.load()
+    catalog = get_catalog()
+    embeddings, source = description_embeddings(catalog.universities)
+    graph.sync(catalog.universities, embeddings, source, catalog.version)
+    return graph
+
+
+_resync_thread: Optional[threading.Thread] = None
+_resync_lock = threading.Lock()
+
+
+def _resync_in_background(graph: SimilarityGraph):
+    """Догоняет новую версию каталога в фоне; пока идет пересчет, отдается старый граф"""
+    global _resync_thread
+    with _resync_lock:
+        if _resync_thread is not None and _resync_thread.is_alive():
+            return
+        _resync_thread = threading.Thread(target=build_graph, args=(graph,),
+                                          name="similar-resync", daemon=True)
+        _resync_thread.start()
+
+
+@subscribe
+def _resync_on_changes(changes: ChangeSet):
+    """Начинает пересчет графа сразу после обновления каталога, а не при следующем показе"""
+    from resources import similar_graph_resource
+
+    if similar_graph_resource.ready:
+        _resync_in_background(similar_graph_resource.get())
+
+
+def similar_universities(university_id: str, k: int = 4) -> List["University"]:
+    """Похожие университеты из готового графа; пустой список, пока граф строится"""
+    from resources import similar_graph_resource
+    from universities_data import get_catalog
+
+    if not similar_graph_resource.ready:
+        similar_graph_resource.start_background()
+        return []
+
+    graph = similar_graph_resource.get()
+    catalog = get_catalog()
+    if graph.version != catalog.version:
+        _resync_in_background(graph)
+
+    result = []
+    for neighbor_id, _ in graph.similar(university_id):
+        uni = catalog.get(neighbor_id)
+        if uni is not None:
+            result.append(uni)
+            if len(result) == k:
+                break
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Граф похожих университетов")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build", help="построить или обновить граф")
+    show = subparsers.add_parser("show", help="показать соседей записи")
+    show.add_argument("id")
+    args = parser.parse_args()
+
+    graph = SimilarityGraph()
+    graph.load()
+    if args.command == "build":
+        from universities_data import get_catalog
+
+        catalog = get_catalog()
+        embeddings, source = description_embeddings(catalog.universities)
+        recomputed = graph.sync(catalog.universities, embeddings, source, catalog.version)
+        print(f"Записей: {len(graph.ids)}, пересчитано строк: {recomputed}, эмбеддинги: {source}")
+    else:
+        for neighbor_id, score in graph.similar(args.id):
+            print(f"{score:.3f}  {neighbor_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,21 @@
 Модель данных для университетов Казахстана
 """
 
+import logging
+import os
+import threading
+import time
 from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
 import pandas as pd
 
+from catalog import TrackedList, UniversityCatalog
+from dataset_versions import notify
+from metrics import increment, timed
+from search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class University:
@@ -50,355 +61,261 @@ class University:
         }
 
 
-# Данные университетов
-UNIVERSITIES = [
-    University(
-        id="enu",
-        name="Евразийский национальный университет имени Л.Н. Гумилева",
-        name_eng="L.N. Gumilyov Eurasian National University",
-        city="Астана",
-        description="Ведущий национальный исследовательский университет Казахстана, основанный в 1996 году. Университет сочетает в себе лучшие традиции евразийской науки и образования.",
-        type="национальный",
-        rating=9.2,
-        founding_year=1996,
-        students_count=17000,
-        budget_places=4500,
-        contact_email="info@enu.kz",
-        website="https://enu.kz",
-        address="г. Астана, ул. Сатпаева, 2",
-        phone="+7 (7172) 70-95-00",
-        specialties=["Инженерия", "IT", "Международные отношения", "Филология", "Юриспруденция"],
-        photo_filename="enu.jpg",
-        features=["Ведущий национальный вуз", "Сильная исследовательская база", "Международные партнерства"]
-    ),
-    University(
-        id="nu",
-        name="Назарбаев Университет",
-        name_eng="Nazarbayev University",
-        city="Астана",
-        description="Международный исследовательский университет мирового уровня, основанный в 2010 году. Является флагманом высшего образования в Казахстане.",
-        type="международный",
-        rating=9.8,
-        founding_year=2010,
-        students_count=6000,
-        budget_places=2000,
-        contact_email="admissions@nu.edu.kz",
-        website="https://nu.edu.kz",
-        address="г. Астана, пр. Кабанбай батыра, 53",
-        phone="+7 (7172) 70-60-00",
-        specialties=["Инженерия", "Медицина", "Бизнес", "Гуманитарные науки", "IT"],
-        photo_filename="nu.jpg",
-        features=["Обучение на английском", "Международный преподавательский состав", "Исследовательский фокус"]
-    ),
-    University(
-        id="astana_med",
-        name="Медицинский университет Астана",
-        name_eng="Astana Medical University",
-        city="Астана",
-        description="Современный медицинский университет, готовящий высококвалифицированных специалистов для системы здравоохранения Казахстана.",
-        type="медицинский",
-        rating=8.5,
-        founding_year=1964,
-        students_count=5000,
-        budget_places=1200,
-        contact_email="rector@amu.kz",
-        website="https://amu.kz",
-        address="г. Астана, ул. Бейбитшилик, 49А",
-        phone="+7 (7172) 53-94-19",
-        specialties=["Лечебное дело", "Стоматология", "Фармация", "Общественное здравоохранение"],
-        photo_filename="astana_med.jpg",
-        features=["Современные лаборатории", "Клиническая база", "Международные программы"]
-    ),
-    University(
-        id="kazguu",
-        name="Университет КАЗГЮУ имени М.С. Нарикбаева",
-        name_eng="KazGUU University named after M.S. Narikbayev",
-        city="Астана",
-        description="Ведущий юридический университет Казахстана, специализирующийся на подготовке юристов международного уровня.",
-        type="гуманитарный",
-        rating=8.7,
-        founding_year=1994,
-        students_count=7000,
-        budget_places=1800,
-        contact_email="info@kazguu.kz",
-        website="https://kazguu.kz",
-        address="г. Астана, пр. Кошкарбаева, 39",
-        phone="+7 (7172) 70-30-30",
-        specialties=["Юриспруденция", "Международное право", "Государственное управление", "Бизнес"],
-        photo_filename="kazguu.jpg",
-        features=["Юридическая специализация", "Английские программы", "Партнерства с зарубежными вузами"]
-    ),
-    University(
-        id="kaznu",
-        name="Казахский национальный университет имени аль-Фараби",
-        name_eng="Al-Farabi Kazakh National University",
-        city="Алматы",
-        description="Старейший и крупнейший университет Казахстана, основанный в 1934 году. Входит в топ-500 мировых университетов.",
-        type="национальный",
-        rating=9.5,
-        founding_year=1934,
-        students_count=20000,
-        budget_places=6000,
-        contact_email="info@kaznu.kz",
-        website="https://www.kaznu.kz",
-        address="г. Алматы, ул. аль-Фараби, 71",
-        phone="+7 (727) 377-33-33",
-        specialties=["Естественные науки", "IT", "Медицина", "Гуманитарные науки", "Юриспруденция"],
-        photo_filename="kaznu.jpg",
-        features=["Ведущий классический вуз", "Широкий спектр специальностей", "Сильная исследовательская база"]
-    ),
-    University(
-        id="kaznmu",
-        name="Казахский национальный медицинский университет имени С. Д. Асфендиярова",
-        name_eng="Asfendiyarov Kazakh National Medical University",
-        city="Алматы",
-        description="Ведущий медицинский университет страны с богатой историей и современными образовательными стандартами.",
-        type="медицинский",
-        rating=9.0,
-        founding_year=1931,
-        students_count=10000,
-        budget_places=2500,
-        contact_email="info@kaznmu.kz",
-        website="https://kaznmu.kz",
-        address="г. Алматы, ул. Толе би, 94",
-        phone="+7 (727) 338-70-70",
-        specialties=["Лечебное дело", "Педиатрия", "Стоматология", "Фармация", "Сестринское дело"],
-        photo_filename="kaznmu.jpg",
-        features=["Исторический медицинский вуз", "Современные симуляционные центры", "Международные связи"]
-    ),
-    University(
-        id="kbtu",
-        name="Казахстанско-Британский технический университет",
-        name_eng="Kazakh-British Technical University",
-        city="Алматы",
-        description="Ведущий технический университет, созданный в партнерстве с британскими университетами. Специализируется на IT и инженерии.",
-        type="технический",
-        rating=9.1,
-        founding_year=2001,
-        students_count=8000,
-        budget_places=2200,
-        contact_email="info@kbtu.kz",
-        website="https://kbtu.edu.kz",
-        address="г. Алматы, ул. Толе би, 59",
-        phone="+7 (727) 272-50-00",
-        specialties=["Информационные технологии", "Нефтегазовое дело", "Электроника", "Бизнес-информатика"],
-        photo_filename="kbtu.jpg",
-        features=["Британские образовательные стандарты", "IT-специализация", "Тесные связи с индустрией"]
-    ),
-    University(
-        id="kimep",
-        name="Университет КИМЭП",
-        name_eng="KIMEP University",
-        city="Алматы",
-        description="Ведущий университет в области бизнеса и социальных наук, основанный по американской модели образования.",
-        type="международный",
-        rating=8.9,
-        founding_year=1992,
-        students_count=4000,
-        budget_places=1000,
-        contact_email="admissions@kimep.kz",
-        website="https://kimep.kz",
-        address="г. Алматы, ул. Абая, 4",
-        phone="+7 (727) 270-44-00",
-        specialties=["Бизнес-администрирование", "Экономика", "Государственное управление", "Переводческое дело"],
-        photo_filename="kimep.jpg",
-        features=["Американская модель образования", "Обучение на английском", "Сильная бизнес-школа"]
-    ),
-    University(
-        id="narxoz",
-        name="Narxoz University",
-        name_eng="Narxoz University",
-        city="Алматы",
-        description="Ведущий экономический университет Казахстана, специализирующийся на бизнесе, экономике и финансах.",
-        type="экономический",
-        rating=8.6,
-        founding_year=1963,
-        students_count=9000,
-        budget_places=2000,
-        contact_email="info@narxoz.kz",
-        website="https://narxoz.kz",
-        address="г. Алматы, ул. Жандосова, 55",
-        phone="+7 (727) 377-11-11",
-        specialties=["Экономика", "Финансы", "Маркетинг", "Менеджмент", "Бухгалтерский учет"],
-        photo_filename="narxoz.jpg",
-        features=["Экономическая специализация", "Партнерства с бизнесом", "Современные образовательные программы"]
-    ),
-    University(
-        id="kainar",
-        name="Казахский национальный аграрный исследовательский университет",
-        name_eng="Kazakh National Agrarian Research University",
-        city="Алматы",
-        description="Ведущий аграрный университет страны, специализирующийся на сельском хозяйстве и пищевых технологиях.",
-        type="аграрный",
-        rating=8.4,
-        founding_year=1929,
-        students_count=12000,
-        budget_places=3000,
-        contact_email="info@kaznaru.kz",
-        website="https://kaznaru.edu.kz",
-        address="г. Алматы, пр. Абая, 8",
-        phone="+7 (727) 291-23-23",
-        specialties=["Агрономия", "Ветеринария", "Пищевые технологии", "Лесное хозяйство"],
-        photo_filename="kainar.jpg",
-        features=["Аграрная специализация", "Исследовательские лаборатории", "Связь с сельским хозяйством"]
-    ),
-    University(
-        id="skou",
-        name="Южно-Казахстанский университет имени М. О. Ауэзова",
-        name_eng="M.O. Auezov South Kazakhstan University",
-        city="Шымкент",
-        description="Крупнейший университет южного региона Казахстана, предлагающий широкий спектр образовательных программ.",
-        type="универсальный",
-        rating=8.2,
-        founding_year=1943,
-        students_count=15000,
-        budget_places=3500,
-        contact_email="info@ukgu.kz",
-        website="https://ukgu.kz",
-        address="г. Шымкент, пр. Тауке хана, 5",
-        phone="+7 (7252) 21-34-56",
-        specialties=["Педагогика", "Технические науки", "Медицина", "Гуманитарные науки"],
-        photo_filename="skou.jpg",
-        features=["Крупнейший вуз юга", "Разнообразные специальности", "Региональный центр науки"]
-    ),
-    University(
-        id="kasgu",
-        name="Каспийский государственный университет технологий и инжиниринга имени Ш. Есенова",
-        name_eng="Sh. Yessenov Caspian University of Technologies and Engineering",
-        city="Актау",
-        description="Ведущий технический университет западного Казахстана, специализирующийся на нефтегазовых и инженерных технологиях.",
-        type="технический",
-        rating=8.0,
-        founding_year=1963,
-        students_count=6000,
-        budget_places=1500,
-        contact_email="info@kasgu.kz",
-        website="https://kasgu.kz",
-        address="г. Актау, 32 микрорайон",
-        phone="+7 (7292) 50-60-70",
-        specialties=["Нефтегазовое дело", "Инженерия", "IT", "Морские технологии"],
-        photo_filename="kasgu.jpg",
-        features=["Техническая специализация", "Фокус на нефтегаз", "Прибрежное расположение"]
-    ),
-    University(
-        id="argu",
-        name="Актюбинский региональный государственный университет имени К. Жубанова",
-        name_eng="K. Zhubanov Aktobe Regional State University",
-        city="Актобе",
-        description="Крупный региональный университет, предлагающий классическое образование по различным направлениям.",
-        type="универсальный",
-        rating=7.9,
-        founding_year=1966,
-        students_count=8000,
-        budget_places=2000,
-        contact_email="rector@argu.kz",
-        website="https://argu.kz",
-        address="г. Актобе, пр. А. Молдагуловой, 34",
-        phone="+7 (7132) 56-78-90",
-        specialties=["Педагогика", "Естественные науки", "Технические науки", "Медицина"],
-        photo_filename="argu.jpg",
-        features=["Классическое образование", "Развитая инфраструктура", "Региональный лидер"]
-    ),
-    University(
-        id="atyrau_uni",
-        name="Атырауский университет имени Х. Досмухамедова",
-        name_eng="K. Dosmukhamedov Atyrau University",
-        city="Атырау",
-        description="Крупнейший университет нефтегазового региона, готовящий специалистов для нефтяной промышленности.",
-        type="технический",
-        rating=8.1,
-        founding_year=1950,
-        students_count=7000,
-        budget_places=1800,
-        contact_email="info@atyrauuniversity.kz",
-        website="https://atyrauuniversity.kz",
-        address="г. Атырау, ул. Студенческая, 1",
-        phone="+7 (7122) 31-45-67",
-        specialties=["Нефтегазовое дело", "Химическая технология", "Экология", "Экономика"],
-        photo_filename="atyrau_uni.jpg",
-        features=["Нефтегазовая специализация", "Тесные связи с промышленностью", "Современные лаборатории"]
-    ),
-    University(
-        id="karaganda_uni",
-        name="Карагандинский университет имени академика Е.А. Букетова",
-        name_eng="E.A. Buketov Karaganda University",
-        city="Караганда",
-        description="Крупный классический университет центрального Казахстана с богатой историей и традициями.",
-        type="универсальный",
-        rating=8.3,
-        founding_year=1972,
-        students_count=11000,
-        budget_places=2800,
-        contact_email="info@ksu.kz",
-        website="https://ksu.kz",
-        address="г. Караганда, ул. Университетская, 28",
-        phone="+7 (7212) 77-03-52",
-        specialties=["История", "Филология", "Математика", "Биология", "Химия"],
-        photo_filename="karaganda_uni.jpg",
-        features=["Классическое образование", "Сильные гуманитарные программы", "Исследовательская деятельность"]
-    ),
-    University(
-        id="kokshe_uni",
-        name="Кокшетауский университет имени Ш. Уалиханова",
-        name_eng="Sh. Ualikhanov Kokshetau University",
-        city="Кокшетау",
-        description="Ведущий университет северного Казахстана, сочетающий классическое образование с современными технологиями.",
-        type="универсальный",
-        rating=7.8,
-        founding_year=1962,
-        students_count=6000,
-        budget_places=1600,
-        contact_email="rector@ku.kz",
-        website="https://ku.kz",
-        address="г. Кокшетау, ул. Абая, 76",
-        phone="+7 (7162) 25-13-24",
-        specialties=["Педагогика", "Сельское хозяйство", "Технические науки", "Экономика"],
-        photo_filename="kokshe_uni.jpg",
-        features=["Многопрофильный вуз", "Развитая материальная база", "Региональные исследования"]
-    ),
-]
+# Данные загружаются из файла каталога при первом обращении, а не при импорте.
+# Путь задается переменной окружения UNIVERSITIES_DATA_PATH.
+DATA_PATH = os.environ.get(
+    'UNIVERSITIES_DATA_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'universities.arrow'),
+)
+
+# UNIVERSITIES_COMPACT_RECORDS=1 - хранить записи как CompactUniversity
+# (неизменяемые, со __slots__ и интернированными строками)
+COMPACT_RECORDS = os.environ.get('UNIVERSITIES_COMPACT_RECORDS', '0') == '1'
+
+# UNIVERSITIES_SHARED=1 - подключаться к каталогу, опубликованному в общей памяти
+# (shared_catalog.py), вместо отдельной копии данных и индексов в каждом процессе
+SHARED_CATALOG = os.environ.get('UNIVERSITIES_SHARED', '0') == '1'
+
+_universities: Optional[TrackedList] = None
+_catalog_file = None
+_load_lock = threading.Lock()
+
+# Общий каталог используется, пока процесс не заменил данные set_universities
+_use_shared = SHARED_CATALOG
+
+
+def _record_type():
+    if COMPACT_RECORDS:
+        from compact_records import CompactUniversity
+        return CompactUniversity
+    return University
+
+
+def _load_universities() -> TrackedList:
+    """Читает каталог из файла, а если его нет - из исходных данных"""
+    global _catalog_file
+    if os.path.exists(DATA_PATH):
+        from catalog_store import CatalogFile
+        _catalog_file = CatalogFile(DATA_PATH, _record_type())
+        return TrackedList(_catalog_file.load())
+
+    from universities_seed import SEED_UNIVERSITIES
+    if COMPACT_RECORDS:
+        from compact_records import compact_universities
+        return TrackedList(compact_universities(SEED_UNIVERSITIES))
+    return TrackedList(SEED_UNIVERSITIES)
+
+
+def _current_universities() -> TrackedList:
+    """Возвращает текущий список, перечитывая файл каталога при его изменении"""
+    global _universities
+    if _use_shared:
+        return get_catalog().universities
+    catalog_file = _catalog_file
+    if _universities is None:
+        with _load_lock:
+            if _universities is None:
+                _universities = _load_universities()
+    elif catalog_file is not None and catalog_file.changed():
+        with _load_lock:
+            try:
+                _universities = TrackedList(catalog_file.load())
+            except Exception:
+                # Битый файл не должен ронять приложение: остаемся на старых данных
+                logger.exception("Не удалось перечитать каталог %s", catalog_file.path)
+    return _universities
+
+
+def __getattr__(name: str):
+    # UNIVERSITIES остается доступным как атрибут модуля, но загружается лениво
+    if name == 'UNIVERSITIES':
+        return _current_universities()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def set_universities(universities: List[University]):
+    """Заменяет список университетов; каталог и индексы перестроятся при обращении"""
+    global _universities, _catalog_file, _use_shared
+    with _load_lock:
+        _use_shared = False
+        _catalog_file = None
+        _universities = universities if isinstance(universities, TrackedList) else TrackedList(universities)
+
+
+def reload_universities():
+    """Перечитывает каталог из файла"""
+    global _universities, _shared_checked_at
+    with _load_lock:
+        if _use_shared:
+            _shared_checked_at = 0.0
+            return
+        _universities = _load_universities()
+
+
+# Каталог строится лениво и перестраивается при изменении UNIVERSITIES
+_catalog: Optional[UniversityCatalog] = None
+_catalog_source = None
+_catalog_source_version = None
+_dataset_version = 0
+_catalog_lock = threading.Lock()
+_shared_checked_at = 0.0
+
 
+def _shared_catalog() -> UniversityCatalog:
+    """Каталог из общего сегмента; новый сегмент проверяется не чаще RELOAD_CHECK_INTERVAL"""
+    global _catalog, _dataset_version, _shared_checked_at
+    from catalog_store import RELOAD_CHECK_INTERVAL
+    from shared_catalog import SharedCatalog, ensure_published
 
+    catalog = _catalog
+    now = time.monotonic()
+    if catalog is not None and now - _shared_checked_at < RELOAD_CHECK_INTERVAL:
+        return catalog
+    _shared_checked_at = now
+
+    segment = ensure_published(_load_universities)
+    if catalog is not None and getattr(catalog, 'segment', None) == segment:
+        return catalog
+    with _catalog_lock:
+        if _catalog is None or getattr(_catalog, 'segment', None) != segment:
+            try:
+                _catalog = SharedCatalog(segment, _record_type(), _dataset_version + 1)
+            except Exception:
+                # Недописанный или уже удаленный сегмент: остаемся на подключенном,
+                # а если подключения еще нет - читаем каталог из файла данных сами
+                # и пробуем подключиться при следующей проверке
+                logger.exception("Не удалось подключиться к сегменту каталога %s", segment)
+                if _catalog is None:
+                    _dataset_version += 1
+                    _catalog = UniversityCatalog(_load_universities(), _dataset_version)
+                    increment("catalog_rebuilds")
+                return _catalog
+            _dataset_version += 1
+            increment("catalog_rebuilds")
+        return _catalog
+
+
+def get_catalog() -> UniversityCatalog:
+    """Возвращает индексированный каталог, обновляя его при изменении данных
+
+    Новая версия каталога получается из предыдущей по изменениям (сравнение
+    записей по id и хэшу содержимого), индексы обновляются только для
+    затронутых записей. После обновления изменения получают подписчики
+    dataset_versions.subscribe: кэши разметки карточек (utils) и аналитики,
+    снимок ответов API, семантический индекс и граф похожих (resources,
+    similar). В режиме общего каталога изменений нет, и эти кэши
+    сбрасываются по номеру версии.
+    """
+    if _use_shared:
+        return _shared_catalog()
+    universities = _current_universities()
+    catalog = _catalog
+    if (catalog is not None and _catalog_source is universities
+            and _catalog_source_version == getattr(universities, 'version', None)):
+        return catalog
+    return _update_catalog(universities)
+
+
+def _update_catalog(universities: TrackedList, force: bool = False) -> UniversityCatalog:
+    """Строит следующую версию каталога из предыдущей и рассылает изменения
+
+    force - новая версия, даже если список тот же (записи правились на месте).
+    """
+    global _catalog, _catalog_source, _catalog_source_version, _dataset_version
+    source_version = getattr(universities, 'version', None)
+    with _catalog_lock:
+        changes = None
+        if (force or _catalog is None or _catalog_source is not universities
+                or _catalog_source_version != source_version):
+            _dataset_version += 1
+            if _catalog is None:
+                increment("catalog_rebuilds")
+                _catalog = UniversityCatalog(universities, _dataset_version)
+                # Поисковый индекс строится секунды: собираем его в фоне,
+                # первые запросы тем временем ищут линейным проходом
+                _catalog.start_search_index()
+            else:
+                _catalog = _catalog.apply(universities, _dataset_version)
+                changes = _catalog.changes
+                increment("catalog_updates")
+                increment("catalog_changed_records", len(changes) if changes is not None else 0)
+            _catalog_source = universities
+            _catalog_source_version = source_version
+        catalog = _catalog
+
+    if changes is not None:
+        # Вне блокировки: подписчик может сам обратиться к каталогу
+        notify(changes)
+    return catalog
+
+
+def refresh_catalog() -> UniversityCatalog:
+    """Обновляет каталог после изменения полей записей на месте
+
+    Как и при любом другом обновлении, записи сравниваются с прошлой версией
+    по хэшу содержимого, индексы обновляются только для измененных, а
+    изменения получают подписчики.
+    """
+    global _shared_checked_at
+    if _use_shared:
+        _shared_checked_at = 0.0
+        return _shared_catalog()
+    return _update_catalog(_current_universities(), force=True)
+
+
+def get_dataset_version() -> int:
+    """Возвращает номер версии данных, меняется при каждой перестройке каталога"""
+    return get_catalog().version
+
+
+@timed()
 def get_all_universities() -> List[University]:
     """Возвращает список всех университетов"""
-    return UNIVERSITIES
+    return _current_universities()
 
 
+@timed()
 def get_university_by_id(university_id: str) -> Optional[University]:
     """Находит университет по ID"""
-    for uni in UNIVERSITIES:
-        if uni.id == university_id:
-            return uni
-    return None
+    return get_catalog().get(university_id)
 
 
+@timed()
 def get_universities_by_city(city: str) -> List[University]:
     """Возвращает университеты в указанном городе"""
-    return [uni for uni in UNIVERSITIES if uni.city.lower() == city.lower()]
+    return get_catalog().by_city(city)
 
 
+@timed()
 def get_universities_by_type(uni_type: str) -> List[University]:
     """Возвращает университеты указанного типа"""
-    return [uni for uni in UNIVERSITIES if uni.type.lower() == uni_type.lower()]
+    return get_catalog().by_type(uni_type)
 
 
+@timed()
 def get_universities_dataframe() -> pd.DataFrame:
-    """Возвращает DataFrame со всеми университетами"""
-    data = [uni.to_dict() for uni in UNIVERSITIES]
-    return pd.DataFrame(data)
+    """Возвращает DataFrame со всеми университетами
 
+    Таблица строится один раз на версию данных; city и type - категории,
+    числовые поля - массивы NumPy. Возвращается копия, чтобы изменения
+    на стороне вызывающего кода не портили кэш.
+    """
+    return get_catalog().columns.frame.copy()
+
+
+@timed()
+def get_specialties_dataframe() -> pd.DataFrame:
+    """Возвращает таблицу пар университет-специальность (position, id, specialty)"""
+    return get_catalog().columns.specialties.copy()
 
-def search_universities(query: str) -> List[University]:
-    """Простой поиск по названию и описанию"""
-    query = query.lower()
-    results = []
 
-    for uni in UNIVERSITIES:
-        if (query in uni.name.lower() or
-                query in uni.description.lower() or
-                query in uni.city.lower() or
-                query in ' '.join(uni.specialties).lower()):
-            results.append(uni)
+def get_search_index() -> SearchIndex:
+    """Возвращает поисковый индекс текущей версии каталога"""
+    return get_catalog().search_index
 
 
-    return results
+@timed()
+def search_universities(query: str) -> List[University]:
+    """Простой поиск по названию и описанию"""
+    catalog = get_catalog()
+    return catalog.records(catalog.search_positions(query))
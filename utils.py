@@ -3,50 +3,148 @@
 """
 
 import streamlit as st
-from typing import List, Optional
-from universities_data import University
-import os
-
-
+from typing import Dict, List, Optional, Sequence
+from universities_data import University, get_catalog, get_dataset_version
+from dataset_versions import ChangeSet, subscribe
+from filters import Range, UniversityFilter, filter_mask, filter_universities
+from photos import get_photo
+import metrics
+from search_session import SearchSession
+from similar import similar_universities
+import analytics
+from chat import ASSISTANT, USER, ChatTurn, stream_answer
+from resources import (FAILED, LOADING, READY, is_ai_ready, retry_warmup, start_warmup,
+                       warmup_status)
+from dataclasses import replace
+import threading
+import time
+
+
+# Сколько результатов возвращает семантический поиск без явного limit
+SEMANTIC_TOP_K = 20
+
+# Сколько карточек показывать на одной странице результатов
+RESULTS_PAGE_SIZE = 10
+
+# Сколько похожих университетов показывать на странице университета
+SIMILAR_COUNT = 4
+
+
+# Разметка карточек по id университета. При обновлении каталога из кэша
+# убираются только измененные записи (_forget_changed_cards); если версия
+# сменилась без изменений (общий каталог), кэш сбрасывается целиком
+_card_markup_cache: Dict[str, str] = {}
+_card_markup_version: Optional[int] = None
+_card_markup_lock = threading.Lock()
+
+
+@subscribe
+def _forget_changed_cards(changes: ChangeSet):
+    """Переносит кэш разметки на новую версию, убирая удаленные, измененные и добавленные id"""
+    global _card_markup_version
+    with _card_markup_lock:
+        if _card_markup_version == changes.old_version:
+            for event in changes.events():
+                _card_markup_cache.pop(event.university_id, None)
+        else:
+            _card_markup_cache.clear()
+        _card_markup_version = changes.new_version
+
+
+def _card_markup(university: University) -> str:
+    """Статическая разметка карточки, кэшируется по id университета"""
+    global _card_markup_version
+    version = get_dataset_version()
+    if _card_markup_version is None or version > _card_markup_version:
+        with _card_markup_lock:
+            if _card_markup_version is None or version > _card_markup_version:
+                _card_markup_cache.clear()
+                _card_markup_version = version
+
+    markup = _card_markup_cache.get(university.id)
+    if markup is None:
+        metrics.increment("card_markup_misses")
+        stars = "⭐" * int(university.rating)
+        markup = "\n\n".join((
+            f"### {university.name}",
+            f"{stars} {university.rating}/10 | 🏙️ {university.city} | 🎓 {university.type}",
+            university.description[:150] + "...",
+            f"📞 {university.phone} · 🌐 [{university.website}]({university.website}) · "
+            f"📧 {university.contact_email}",
+        ))
+        if _card_markup_version == version:
+            _card_markup_cache[university.id] = markup
+    return markup
+
+
+@metrics.timed()
 def display_university_card(university: University, cols=None):
     """Отображает карточку университета"""
     if cols is None:
         cols = st.columns([1, 2])
 
     with cols[0]:
-        # Проверяем наличие фото
-        photo_path = f"university_photos/{university.photo_filename}"
-        if os.path.exists(photo_path):
+        # Уменьшенная копия из индекса фото, без обращения к диску на каждый рендер
+        photo_path = get_photo(university.photo_filename, "card")
+        if photo_path:
             st.image(photo_path, use_column_width=True)
         else:
             st.image("https://via.placeholder.com/300x200?text=University+Photo",
                      caption="Фото будет загружено", use_column_width=True)
 
     with cols[1]:
-        st.subheader(university.name)
-
-        # Рейтинг звездочками
-        stars = "⭐" * int(university.rating)
-        st.caption(f"{stars} {university.rating}/10 | 🏙️ {university.city} | 🎓 {university.type}")
-
-        # Краткое описание
-        st.write(university.description[:150] + "...")
+        # Название, рейтинг, описание и контакты - одним блоком разметки
+        st.markdown(_card_markup(university))
 
         # Кнопка для перехода на страницу университета
         if st.button("Подробнее", key=f"btn_{university.id}"):
             st.session_state.selected_university = university.id
             st.rerun()
 
-        # Быстрые ссылки
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.markdown(f"📞 {university.phone}")
-        with col2:
-            st.markdown(f"🌐 [{university.website}]({university.website})")
-        with col3:
-            st.markdown(f"📧 {university.contact_email}")
 
+@metrics.timed()
+def display_university_list(universities: List[University], page_size: int = RESULTS_PAGE_SIZE,
+                            key: str = "results") -> List[University]:
+    """Отображает результаты постранично: виджеты создаются только для видимой страницы
+
+    Возвращает показанные университеты.
+    """
+    page_key = f"{key}_page"
+    signature_key = f"{key}_signature"
+
+    # Новый набор результатов - возвращаемся на первую страницу
+    signature = hash(tuple(uni.id for uni in universities))
+    if st.session_state.get(signature_key) != signature:
+        st.session_state[signature_key] = signature
+        st.session_state[page_key] = 0
+
+    total_pages = max(1, -(-len(universities) // page_size))
+    page = min(st.session_state.get(page_key, 0), total_pages - 1)
+    visible = universities[page * page_size:(page + 1) * page_size]
+
+    for university in visible:
+        display_university_card(university)
+        st.divider()
 
+    if total_pages > 1:
+        # Страница меняется в обработчике до перезапуска, без лишнего st.rerun()
+        def go_to(target: int):
+            st.session_state[page_key] = target
+
+        col_prev, col_info, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            st.button("← Назад", key=f"{key}_prev", disabled=page == 0,
+                      on_click=go_to, args=(page - 1,))
+        with col_info:
+            st.caption(f"Страница {page + 1} из {total_pages} · найдено {len(universities)}")
+        with col_next:
+            st.button("Вперед →", key=f"{key}_next", disabled=page == total_pages - 1,
+                      on_click=go_to, args=(page + 1,))
+
+    return visible
+
+
+@metrics.timed()
 def create_university_page(university: University):
     """Создает страницу для университета"""
     st.title(university.name)
@@ -55,8 +153,8 @@ def create_university_page(university: University):
     col1, col2 = st.columns([1, 2])
 
     with col1:
-        photo_path = f"university_photos/{university.photo_filename}"
-        if os.path.exists(photo_path):
+        photo_path = get_photo(university.photo_filename, "page")
+        if photo_path:
             st.image(photo_path, use_column_width=True)
         else:
             st.warning("Фото университета еще не загружено")
@@ -107,53 +205,240 @@ def create_university_page(university: University):
     st.subheader("📖 Подробное описание")
     st.write(university.description)
 
+    # Соседи берутся из заранее построенного графа, пока он строится - блока нет
+    similar = similar_universities(university.id, SIMILAR_COUNT)
+    if similar:
+        st.divider()
+        st.subheader("🔗 Похожие университеты")
+
+        def open_university(university_id: str):
+            st.session_state.selected_university = university_id
+
+        for col, other in zip(st.columns(len(similar)), similar):
+            with col:
+                st.markdown(f"**{other.name}**\n\n{other.city} · ⭐ {other.rating}/10")
+                st.button("Открыть", key=f"similar_{other.id}", on_click=open_university,
+                          args=(other.id,))
+
     # Кнопка для возврата
     if st.button("← Назад к поиску"):
         st.session_state.selected_university = None
         st.rerun()
 
 
-def search_universities_advanced(query: str, city: str = "", uni_type: str = "") -> List[University]:
-    """Расширенный поиск университетов"""
-    from universities_data import get_all_universities, search_universities
-
-    all_unis = get_all_universities()
-    results = []
+@metrics.timed()
+def display_comparison(university_ids: Sequence[str]):
+    """Сравнение выбранных университетов в одной таблице"""
+    if len(university_ids) < 2:
+        st.info("Выберите хотя бы два университета для сравнения")
+        return
+
+    st.subheader("⚖️ Сравнение университетов")
+    st.dataframe(analytics.compare_universities(list(university_ids)), use_container_width=True)
+
+    col_leaders, col_specialties = st.columns(2)
+    with col_leaders:
+        st.markdown("**🏆 Лидеры**")
+        st.dataframe(analytics.comparison_leaders(list(university_ids)),
+                     hide_index=True, use_container_width=True)
+    with col_specialties:
+        st.markdown("**🎯 Специальности**")
+        st.dataframe(analytics.common_specialties(list(university_ids)),
+                     hide_index=True, use_container_width=True)
+
+
+@metrics.timed()
+def display_catalog_stats():
+    """Сводная статистика каталога по городам, типам и специальностям"""
+    tab_city, tab_type, tab_specialty, tab_oldest = st.tabs(
+        ["🏙️ Города", "🎓 Типы", "🎯 Специальности", "🏛️ Старейшие"])
+
+    with tab_city:
+        stats = analytics.stats_by_city()
+        st.bar_chart(stats, x='city', y='avg_rating')
+        st.dataframe(stats, hide_index=True, use_container_width=True)
+    with tab_type:
+        st.dataframe(analytics.stats_by_type(), hide_index=True, use_container_width=True)
+    with tab_specialty:
+        st.dataframe(analytics.budget_places_by_specialty(), hide_index=True,
+                     use_container_width=True)
+    with tab_oldest:
+        st.dataframe(analytics.oldest_by_type(1), hide_index=True, use_container_width=True)
+
+
+@metrics.timed()
+def search_universities_advanced(query: str, city: str = "", uni_type: str = "",
+                                 rating: Range = None, founding_year: Range = None,
+                                 students_count: Range = None, budget_places: Range = None,
+                                 specialties: Sequence[str] = (), match_all_specialties: bool = False,
+                                 sort_by: Optional[str] = None, descending: bool = True,
+                                 limit: Optional[int] = None, semantic: bool = False,
+                                 fuzzy: bool = False) -> List[University]:
+    """Расширенный поиск университетов
+
+    Диапазоны задаются парами (минимум, максимум), sort_by - одно из полей
+    rating, founding_year, students_count, budget_places. При limit
+    возвращаются только первые limit результатов. При semantic=True запрос
+    ищется по смыслу, а результаты упорядочены по близости. При fuzzy=True
+    запрос сравнивается нечетко (опечатки, латиница вместо кириллицы),
+    результаты упорядочены по похожести.
+    """
+    criteria = UniversityFilter(
+        query=query, city=city, uni_type=uni_type,
+        rating=rating, founding_year=founding_year,
+        students_count=students_count, budget_places=budget_places,
+        specialties=specialties, match_all_specialties=match_all_specialties,
+        sort_by=sort_by, descending=descending, limit=limit,
+    )
+    if semantic and query:
+        return _semantic_search_filtered(criteria)
+    if fuzzy and query:
+        return _fuzzy_search_filtered(criteria)
+    return filter_universities(criteria)
+
+
+def _fuzzy_search_filtered(criteria: UniversityFilter) -> List[University]:
+    """Нечеткий поиск с применением структурных фильтров"""
+    catalog = get_catalog()
+    mask = filter_mask(catalog, replace(criteria, query=""))
+    positions = [position for position, _ in catalog.fuzzy_index.search_positions(criteria.query)
+                 if mask[position]]
+    if criteria.limit is not None:
+        positions = positions[:criteria.limit]
+    return catalog.records(positions)
+
+
+def _semantic_search_filtered(criteria: UniversityFilter) -> List[University]:
+    """Семантический поиск с применением структурных фильтров
+
+    Пока модель прогревается, используется обычный поиск по подстроке.
+    """
+    from semantic_search import semantic_search_universities
+
+    if not is_ai_ready():
+        return filter_universities(criteria)
+
+    structured = replace(criteria, query="", sort_by=None, limit=None)
+    allowed = {uni.id for uni in filter_universities(structured)}
+    top_k = criteria.limit or SEMANTIC_TOP_K
+
+    # Берем кандидатов с запасом, так как часть отсеется фильтрами
+    candidates = semantic_search_universities(criteria.query, k=top_k * 5)
+    return [uni for uni in candidates if uni.id in allowed][:top_k]
+
+
+@metrics.timed()
+def search_as_you_type(query: str, city: str = "", uni_type: str = "") -> List[University]:
+    """Поиск для поля ввода: кэш, сужение прошлой выдачи и подавление дребезга
+
+    Если ввод идет слишком часто, возвращается прошлая выдача, а поиск
+    повторяется автоматически после паузы.
+    """
+    if 'search_session' not in st.session_state:
+        st.session_state.search_session = SearchSession()
+
+    result = st.session_state.search_session.search(query, city, uni_type)
+    if result.pending:
+        # Новый ввод во время паузы прервет этот запуск скрипта
+        time.sleep(result.retry_after)
+        st.rerun()
+    return result.universities
 
-    for uni in all_unis:
-        matches = True
 
-        # Поиск по текстовому запросу
-        if query:
-            query_lower = query.lower()
-            text_match = (
-                    query_lower in uni.name.lower() or
-                    query_lower in uni.description.lower() or
-                    query_lower in ' '.join(uni.specialties).lower() or
-                    query_lower in uni.city.lower()
-            )
-            if not text_match:
-                matches = False
+@metrics.timed()
+def render_chat():
+    """Чат с консультантом: история, поле ввода и потоковый ответ"""
+    for message in st.session_state.chat_history:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
 
-        # Фильтр по городу
-        if city and uni.city.lower() != city.lower():
-            matches = False
+    question = st.chat_input("Спросите об университетах, например: где учиться на программиста в Алматы")
+    if not question:
+        return
 
-        # Фильтр по типу
-        if uni_type and uni_type != "любой" and uni.type.lower() != uni_type.lower():
-            matches = False
+    history = list(st.session_state.chat_history)
+    st.session_state.chat_history.append({"role": USER, "content": question})
+    with st.chat_message(USER):
+        st.markdown(question)
 
-        if matches:
-            results.append(uni)
+    with st.chat_message(ASSISTANT):
+        placeholder = st.empty()
+        turn = ChatTurn(question)
+        text = ""
+        for token in stream_answer(question, history, turn=turn):
+            text += token
+            placeholder.markdown(text + "▌")
+        placeholder.markdown(text)
+        if turn.time_to_first_token_ms is not None:
+            st.caption(f"Первый токен: {turn.time_to_first_token_ms:.0f} мс · "
+                       f"поиск: {turn.retrieval_ms:.0f} мс · всего: {turn.total_ms:.0f} мс")
 
-    return results
+    st.session_state.chat_history.append({"role": ASSISTANT, "content": turn.answer})
 
 
 def init_session_state():
     """Инициализация состояния сессии"""
+    # Разбивка времени по функциям собирается с начала перезапуска
+    metrics.begin_rerun()
+    metrics.start_exporter()
+
     if 'selected_university' not in st.session_state:
         st.session_state.selected_university = None
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
     if 'ai_initialized' not in st.session_state:
-        st.session_state.ai_initialized = False
\ No newline at end of file
+        st.session_state.ai_initialized = False
+
+    # Модель и индекс общие для процесса, загружаются в фоне один раз
+    start_warmup()
+    if not st.session_state.ai_initialized:
+        st.session_state.ai_initialized = is_ai_ready()
+
+
+def render_warmup_status():
+    """Показывает состояние загрузки AI-компонентов, не блокируя страницу"""
+    status = warmup_status()
+    if status["state"] == READY:
+        return
+
+    if status["state"] == FAILED:
+        errors = [item["error"] for item in status["resources"] if item["error"]]
+        st.warning(f"Умный поиск недоступен: {errors[0] if errors else 'ошибка загрузки'}")
+        if st.button("Повторить загрузку", key="retry_warmup"):
+            retry_warmup()
+    elif status["state"] == LOADING:
+        seconds = max((item["seconds"] or 0) for item in status["resources"])
+        st.info(f"⏳ Загружается модель для умного поиска ({seconds:.0f} с). "
+                "Пока работает обычный поиск.")
+
+
+# Сколько последних перезапусков показывать в панели метрик
+METRICS_HISTORY = 20
+
+
+def render_metrics_panel():
+    """Панель администратора в боковой панели: разбивка времени перезапуска
+
+    Вызывается в конце скрипта страницы. Показывается при METRICS=1 и
+    параметре адреса ?admin=1; метрики собираются и без панели.
+    """
+    rerun = metrics.end_rerun()
+    if rerun is None:
+        return
+
+    history = st.session_state.setdefault('metrics_history', [])
+    history.append(round(rerun.total_ms, 1))
+    del history[:-METRICS_HISTORY]
+
+    if st.experimental_get_query_params().get('admin', [''])[0] != '1':
+        return
+
+    with st.sidebar.expander("⏱️ Производительность", expanded=True):
+        st.metric("Перезапуск страницы", f"{rerun.total_ms:.0f} мс")
+        st.dataframe(
+            [{"функция": function, "вызовов": count, "всего, мс": round(total, 2),
+              "собственное, мс": round(own, 2)}
+             for function, count, total, own in rerun.breakdown()],
+            hide_index=True, use_container_width=True,
+        )
+        st.line_chart(history)